@@ -0,0 +1,244 @@
+"""
+answer_cache.py - Versioned cache of generated answers
+
+Answers are cached in a small SQLite database (shared by every worker process) under a
+bucket made of the search scope retrieve() uses (module, team or teams, or everything),
+the current index version of each scope in it, the answer-shaping user_config fields and
+the chat history window sent to the model. Ingest, clone and delete bump the versions of
+the scopes they touch, so a bucket - and every answer in it - becomes unreachable as soon
+as the indexed content it was generated from changes; stale buckets age out by LRU.
+
+Within a bucket an answer is found by its normalized question, or by the cosine similarity
+of its question embedding to the new one (near-duplicate phrasings).
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from query_cache import normalize_query
+
+log = logging.getLogger(__name__)
+
+ANSWER_CACHE_PATH = Path(os.getenv("ANSWER_CACHE_PATH", Path(__file__).parent / "answer_cache.db"))
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(7 * 86400)))  # seconds a cached answer may be served
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "50000"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # min cosine for a near-duplicate hit (>1 disables)
+ANSWER_CACHE_CANDIDATES = int(os.getenv("ANSWER_CACHE_CANDIDATES", "2000"))  # most recent answers compared per bucket
+
+# user_config fields that change the generated answer (see semantic_indexing._build_system_prompt)
+ANSWER_CONFIG_FIELDS = ("show_source", "chat_persona", "explanation_level", "language_tone",
+                        "step_by_step_mode", "follow_up_suggestions")
+GLOBAL_SCOPE = "*"  # part of every bucket; bumped when the affected scopes are not known
+ALL_SCOPE = "all"  # unscoped searches
+
+def search_scopes(module_id: int | None = None, team_id: int | None = None,
+                  user_team_ids: Sequence[int] | None = None) -> List[str]:
+    """Scopes an answer depends on, mirroring the access filter retrieve() applies"""
+    if module_id is not None:
+        return [f"module:{int(module_id)}"]
+    if team_id is not None:
+        return [f"team:{int(team_id)}"]
+    if user_team_ids:
+        return [f"team:{t}" for t in sorted({int(t) for t in user_team_ids})]
+    return [ALL_SCOPE]
+
+def content_scopes(module_id: int | None = None, team_id: int | None = None) -> List[str]:
+    """Scopes whose searches see points stored with this module_id/team_id"""
+    scopes = [ALL_SCOPE]
+    if module_id is not None:
+        scopes.append(f"module:{int(module_id)}")
+    if team_id is not None:
+        scopes.append(f"team:{int(team_id)}")
+    return scopes
+
+class AnswerCache:
+    """SQLite-backed answer cache with per-scope index versions"""
+
+    def __init__(self, path: Path = ANSWER_CACHE_PATH, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, similarity: float = ANSWER_CACHE_SIMILARITY):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.hits = self.semantic_hits = self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS index_versions (
+                scope TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key BLOB PRIMARY KEY,
+                bucket BLOB NOT NULL,
+                question TEXT NOT NULL,
+                vector BLOB,
+                answer TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_bucket ON answers (bucket, created)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers (last_used)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            self._local.conn = conn
+        return conn
+
+    def versions(self, scopes: Iterable[str]) -> dict:
+        scopes = sorted(set(scopes) | {GLOBAL_SCOPE})
+        rows = dict(self._conn().execute(
+            f"SELECT scope, version FROM index_versions WHERE scope IN ({','.join('?' * len(scopes))})", scopes
+        ).fetchall())
+        return {scope: rows.get(scope, 0) for scope in scopes}
+
+    def bump(self, scopes: Iterable[str]):
+        """Invalidate every answer generated from these scopes"""
+        scopes = sorted(set(scopes))
+        if not scopes:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO index_versions (scope, version) VALUES (?, 1) "
+                "ON CONFLICT(scope) DO UPDATE SET version = version + 1", [(s,) for s in scopes]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def bucket(self, scopes: Iterable[str], config: dict | None = None, chat_history: list | None = None) -> bytes:
+        """Key prefix for answers generated now for this scope, config and history.
+        Take it before retrieval, so an index change during generation makes the stored answer stale."""
+        context = {
+            "versions": self.versions(scopes),
+            "config": {field: (config or {}).get(field) for field in ANSWER_CONFIG_FIELDS},
+            "history": chat_history or [],
+        }
+        return hashlib.sha256(json.dumps(context, sort_keys=True, default=str).encode("utf-8")).digest()
+
+    @staticmethod
+    def _key(bucket: bytes, question: str) -> bytes:
+        return hashlib.sha256(bucket + normalize_query(question).encode("utf-8")).digest()
+
+    def lookup(self, bucket: bytes, question: str,
+               embed: Optional[Callable[[], Optional[Sequence[float]]]] = None) -> Optional[str]:
+        """Cached answer for the question: exact, else the nearest question above the similarity
+        threshold (`embed` returns the question's vector and is only called on an exact miss)"""
+        conn = self._conn()
+        cutoff = time.time() - self.ttl
+        key = self._key(bucket, question)
+        row = conn.execute("SELECT answer FROM answers WHERE key = ? AND created >= ?", (key, cutoff)).fetchone()
+        kind = "exact"
+        vector = embed() if row is None and embed is not None and self.similarity <= 1.0 else None
+        if vector is not None:
+            rows = conn.execute(
+                "SELECT key, vector FROM answers WHERE bucket = ? AND created >= ? AND vector IS NOT NULL "
+                "ORDER BY created DESC LIMIT ?", (bucket, cutoff, ANSWER_CACHE_CANDIDATES)
+            ).fetchall()
+            query = np.asarray(vector, dtype=np.float32)
+            rows = [r for r in rows if len(r[1]) == query.nbytes]  # e.g. after an embedding model change
+            if rows:
+                matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+                scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    key, kind = rows[best][0], "semantic"
+                    row = conn.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            if kind == "exact":
+                self.hits += 1
+            else:
+                self.semantic_hits += 1
+        conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), key))
+        log.info(f"Answer cache {kind} hit")
+        return row[0]
+
+    def store(self, bucket: bytes, question: str, answer: str, vector: Optional[Sequence[float]] = None):
+        blob = np.asarray(vector, dtype=np.float32).tobytes() if vector is not None else None
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO answers (key, bucket, question, vector, answer, created, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", (self._key(bucket, question), bucket, question, blob, answer, now, now)
+        )
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % 100 == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Drop expired answers, then least-recently-used ones beyond max_entries"""
+        conn = self._conn()
+        conn.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl,))
+        excess = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute("DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_used LIMIT ?)", (excess,))
+
+    def stats(self) -> dict:
+        entries = self._conn().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": ((self.hits + self.semantic_hits) / lookups) if lookups else 0.0,
+            }
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+def _open_answer_cache() -> AnswerCache:
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache()
+    return _answer_cache
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Process-wide answer cache (None when disabled or unavailable)"""
+    global ANSWER_CACHE_ENABLED
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    try:
+        return _open_answer_cache()
+    except Exception as e:
+        log.warning(f"Answer cache disabled - could not open {ANSWER_CACHE_PATH}: {e}")
+        ANSWER_CACHE_ENABLED = False
+        return None
+
+def bump_index_versions(scopes: Iterable[str]):
+    """Invalidate cached answers for these scopes. Versions are tracked even where serving from
+    the cache is disabled, so processes that do serve from it never return stale answers."""
+    scopes = list(scopes)
+    try:
+        _open_answer_cache().bump(scopes)
+    except Exception as e:
+        log.error(f"Could not bump index versions for {scopes}: {e}")
@@ -0,0 +1,110 @@
+"""
+answer_library.py - Curated per-team library of approved answers
+
+RFP questionnaires repeat the same questions across bids. Teams keep approved Q&A pairs in
+the answer_library table (db.py); the question embeddings live in a dedicated
+LIBRARY_COLL_NAME collection of the shared vector store (payload team_id/entry_id).
+/api/ask matches each question against the libraries of the teams it may search before
+running retrieval, and streams the approved answer as-is when the best match scores at
+least LIBRARY_MATCH_THRESHOLD - no retrieval and no LLM call. Disabled entries stay listed
+but never match.
+"""
+import os
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from qdrant_client.http import models as qmodels
+
+from db import (add_library_entry, update_library_entry, delete_library_entry, get_library_entry,
+                get_library_entries)
+from semantic_indexing import TXT_DIM, embed_query, openai_embed
+from vector_store import StoreProxy, store_manager
+
+log = logging.getLogger(__name__)
+
+LIBRARY_COLL_NAME = os.getenv("ANSWER_LIBRARY_COLLECTION", "answer_library")
+LIBRARY_MATCH_THRESHOLD = float(os.getenv("ANSWER_LIBRARY_THRESHOLD", "0.92"))  # min cosine similarity to answer from the library
+
+store = StoreProxy()
+
+@store_manager.on_open
+def _ensure_library_collection(client):
+    """Create the library collection (question vectors) and its team_id index"""
+    if not client.collection_exists(LIBRARY_COLL_NAME):
+        log.info(f"Creating {LIBRARY_COLL_NAME} collection...")
+        client.create_collection(
+            collection_name=LIBRARY_COLL_NAME,
+            vectors_config={"text": qmodels.VectorParams(size=TXT_DIM, distance="Cosine")},
+        )
+    if "team_id" not in (client.get_collection(LIBRARY_COLL_NAME).payload_schema or {}):
+        client.create_payload_index(collection_name=LIBRARY_COLL_NAME, field_name="team_id",
+                                    field_schema=qmodels.PayloadSchemaType.INTEGER, wait=False)
+
+def _embed_question(question: str) -> List[float]:
+    vector = openai_embed([question])[0]
+    if not vector:
+        raise RuntimeError("Could not embed the library question")
+    return vector
+
+def _library_point(entry_id: int, team_id: int, question: str, vector: Sequence[float],
+                   enabled: bool = True) -> qmodels.PointStruct:
+    return qmodels.PointStruct(id=int(entry_id), vector={"text": vector},
+                               payload={"entry_id": int(entry_id), "team_id": int(team_id), "question": question,
+                                        "enabled": bool(enabled)})
+
+def add_entry(team_id: int, question: str, answer: str, created_by: int | None = None) -> Dict:
+    """Add an approved Q&A pair and index its question"""
+    question, answer = question.strip(), answer.strip()
+    vector = _embed_question(question)  # before the insert, so a failed embedding leaves no orphan row
+    entry_id = add_library_entry(team_id, question, answer, created_by)
+    store.upsert(collection_name=LIBRARY_COLL_NAME, points=[_library_point(entry_id, team_id, question, vector)])
+    return get_library_entry(entry_id)
+
+def update_entry(entry_id: int, question: str | None = None, answer: str | None = None,
+                 enabled: bool | None = None) -> Optional[Dict]:
+    """Edit an entry; a changed question is re-embedded"""
+    entry = get_library_entry(entry_id)
+    if entry is None:
+        return None
+    question = question.strip() if question is not None else None
+    now_enabled = bool(entry["enabled"]) if enabled is None else bool(enabled)
+    if question is not None and question != entry["question"]:
+        store.upsert(collection_name=LIBRARY_COLL_NAME,
+                     points=[_library_point(entry_id, entry["team_id"], question, _embed_question(question), now_enabled)])
+    elif now_enabled != bool(entry["enabled"]):
+        store.set_payload(collection_name=LIBRARY_COLL_NAME, payload={"enabled": now_enabled}, points=[int(entry_id)])
+    update_library_entry(entry_id, question, answer.strip() if answer is not None else None, enabled)
+    return get_library_entry(entry_id)
+
+def delete_entry(entry_id: int):
+    store.delete(collection_name=LIBRARY_COLL_NAME, points_selector=qmodels.PointIdsList(points=[int(entry_id)]))
+    delete_library_entry(entry_id)
+
+def list_entries(team_id: int) -> List[Dict]:
+    return get_library_entries(team_id)
+
+def delete_team_library_vectors(team_id: int):
+    """Drop the question vectors of a team's library (db.delete_team removes the rows)"""
+    store.delete(collection_name=LIBRARY_COLL_NAME, points_selector=qmodels.FilterSelector(filter=qmodels.Filter(
+        must=[qmodels.FieldCondition(key="team_id", match=qmodels.MatchValue(value=int(team_id)))])))
+
+def match_library_answer(question: str, team_ids: Sequence[int] | None) -> Optional[Dict]:
+    """Best approved entry for the question among the given teams' libraries (None = every team),
+    if it scores at least LIBRARY_MATCH_THRESHOLD. The entry dict gains a `score`."""
+    if team_ids is not None and not team_ids:
+        return None
+    text_vector, _ = embed_query(str(question).strip())  # cached, so a miss costs retrieve() nothing
+    if text_vector is None:
+        return None
+    flt = qmodels.Filter(must_not=[qmodels.FieldCondition(key="enabled", match=qmodels.MatchValue(value=False))])
+    if team_ids is not None:
+        flt.must = [qmodels.FieldCondition(key="team_id", match=qmodels.MatchAny(any=[int(t) for t in team_ids]))]
+    hits = store.query_points(collection_name=LIBRARY_COLL_NAME, query=text_vector, using="text", query_filter=flt,
+                              limit=1, score_threshold=LIBRARY_MATCH_THRESHOLD, with_payload=["entry_id"]).points
+    if not hits:
+        return None
+    entry = get_library_entry(hits[0].payload["entry_id"])
+    if entry is None or not entry["enabled"]:
+        return None
+    log.info(f"Answer library match: entry {entry['entry_id']} (team {entry['team_id']}, score {hits[0].score:.3f})")
+    return {**entry, "score": hits[0].score}
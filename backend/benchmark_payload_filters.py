@@ -0,0 +1,104 @@
+"""
+benchmark_payload_filters.py - Filtered search latency with and without payload indexes
+
+    python benchmark_payload_filters.py --backend ann --teams 1,10,100,1000
+    QDRANT_URL=http://localhost:6333 python benchmark_payload_filters.py --backend server
+
+For each team count, loads --points synthetic chunks spread over that many teams (five
+modules per team, a handful of ents each) into a scratch collection and times the two
+filters retrieve() builds - team_id MatchAny over a user's teams, and module_id - first
+without payload indexes and then with the PAYLOAD_INDEXES semantic_indexing creates.
+Embedded Qdrant ignores payload indexes, so compare the ann and server backends.
+"""
+import time
+import uuid
+import argparse
+import tempfile
+
+import numpy as np
+from qdrant_client.http import models as qmodels
+
+from vector_store import LocalANNStore, QdrantStore, QDRANT_URL, QDRANT_API_KEY
+
+# Same schema as semantic_indexing.PAYLOAD_INDEXES (not imported: that loads the models)
+PAYLOAD_INDEXES = {
+    "module_id": qmodels.PayloadSchemaType.INTEGER,
+    "team_id": qmodels.PayloadSchemaType.INTEGER,
+    "doc_id": qmodels.PayloadSchemaType.KEYWORD,
+    "type": qmodels.PayloadSchemaType.KEYWORD,
+}
+VOCABULARY = [f"term{i}" for i in range(2000)]
+
+def _open(backend: str, directory: str):
+    if backend == "ann":
+        return LocalANNStore(directory)
+    if backend == "server":
+        if not QDRANT_URL:
+            raise SystemExit("QDRANT_URL is not set")
+        return QdrantStore(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    return QdrantStore(path=directory)
+
+def _load(store, name: str, points: int, dim: int, teams: int, rng: np.random.Generator):
+    if store.collection_exists(name):
+        store.delete_collection(name)
+    store.create_collection(name, vectors_config={"text": qmodels.VectorParams(size=dim, distance="Cosine")})
+    for field_name in list(getattr(store.get_collection(name), "payload_schema", None) or {}):
+        store.delete_payload_index(name, field_name)  # start unindexed (the ANN store has defaults)
+    for start in range(0, points, 1000):
+        count = min(1000, points - start)
+        vectors = rng.normal(size=(count, dim)).astype(np.float32)
+        store.upsert(name, [
+            qmodels.PointStruct(
+                id=str(uuid.UUID(int=start + i + 1)),
+                vector={"text": vectors[i].tolist()},
+                payload={"type": "text", "team_id": (start + i) % teams, "module_id": (start + i) % (teams * 5),
+                         "doc_id": str((start + i) // 50), "ents": list(rng.choice(VOCABULARY, 8, replace=False))},
+            )
+            for i in range(count)
+        ])
+
+def _time(store, name: str, dim: int, teams: int, queries: int, rng: np.random.Generator) -> dict:
+    timings = {"team": [], "module": []}
+    for _ in range(queries):
+        vector = rng.normal(size=dim).tolist()
+        user_teams = [int(t) for t in rng.choice(teams, min(3, teams), replace=False)]
+        filters = {
+            "team": qmodels.Filter(must=[qmodels.FieldCondition(key="team_id", match=qmodels.MatchAny(any=user_teams))]),
+            "module": qmodels.Filter(must=[qmodels.FieldCondition(key="module_id",
+                                                                  match=qmodels.MatchValue(value=int(rng.integers(teams * 5))))]),
+        }
+        for kind, flt in filters.items():
+            started = time.perf_counter()
+            store.search(name, query_vector=("text", vector), query_filter=flt, limit=24, with_payload=True)
+            timings[kind].append(time.perf_counter() - started)
+    return {kind: (np.percentile(t, 50) * 1000, np.percentile(t, 95) * 1000) for kind, t in timings.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", choices=["ann", "server", "embedded"], default="ann")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--teams", default="1,10,100,1000")
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{args.backend}: {args.points} points, p50/p95 ms per filtered search (limit 24)")
+    print(f"{'teams':>6}  {'team filter':>26}  {'module filter':>26}")
+    print(f"{'':>6}  {'no index':>12}{'indexed':>14}  {'no index':>12}{'indexed':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        store = _open(args.backend, directory)
+        for teams in (int(t) for t in args.teams.split(",")):
+            name = f"bench_filters_{teams}"
+            _load(store, name, args.points, args.dim, teams, rng)
+            plain = _time(store, name, args.dim, teams, args.queries, rng)
+            for field_name, schema in PAYLOAD_INDEXES.items():
+                store.create_payload_index(name, field_name, field_schema=schema, wait=True)
+            indexed = _time(store, name, args.dim, teams, args.queries, rng)
+            print(f"{teams:>6}  " + "  ".join(f"{plain[k][0]:>5.1f}/{plain[k][1]:<6.1f}{indexed[k][0]:>7.1f}/{indexed[k][1]:<6.1f}"
+                                             for k in ("team", "module")))
+            store.delete_collection(name)
+        store.close()
+
+if __name__ == "__main__":
+    main()
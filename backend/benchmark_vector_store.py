@@ -0,0 +1,128 @@
+"""
+benchmark_vector_store.py - Recall vs. latency of the local ANN index against exact search
+
+    python benchmark_vector_store.py --points 100000 --dim 1536 --nprobe 4,8,16,32,64
+
+Builds a LocalANNStore in a temporary directory from synthetic clustered embeddings
+(payloads carry module_id/team_id/doc_id like real chunks), computes exact float32
+top-k neighbours with numpy as ground truth, and reports recall@k and per-query latency
+for an exact scan of the store and for each nprobe, without a filter and with a
+module_id filter. Pass --qdrant to time embedded Qdrant's brute-force search as well.
+"""
+import time
+import uuid
+import argparse
+import tempfile
+
+import numpy as np
+from qdrant_client.http import models as qmodels
+
+from vector_store import LocalANNStore, ivf_list_count
+
+COLLECTION = "bench"
+
+def _dataset(n: int, dim: int, clusters: int, spread: float, rng: np.random.Generator):
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + spread * rng.normal(size=(n, dim)).astype(np.float32)
+    return centers, vectors
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _percentile_ms(samples, q) -> float:
+    return float(np.percentile(samples, q) * 1000)
+
+def _run(search, queries, truth, k):
+    latencies, recalls = [], []
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        hits = search(i, query)
+        latencies.append(time.perf_counter() - started)
+        recalls.append(len({h.id for h in hits[:k]} & truth[i]) / max(1, len(truth[i])))
+    return float(np.mean(recalls)), _percentile_ms(latencies, 50), _percentile_ms(latencies, 95)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="4,8,16,32,64")
+    parser.add_argument("--modules", type=int, default=20, help="distinct module_id values for the filtered runs")
+    parser.add_argument("--clusters", type=int, default=0, help="topic clusters in the synthetic data (default points/500)")
+    parser.add_argument("--spread", type=float, default=0.6, help="noise around each cluster centre")
+    parser.add_argument("--qdrant", action="store_true", help="also time embedded Qdrant brute-force search")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    _, vectors = _dataset(args.points, args.dim, args.clusters or max(16, args.points // 500), args.spread, rng)
+    modules = np.arange(args.points) % args.modules
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(args.points)]
+    queries = vectors[rng.integers(0, args.points, size=args.queries)] + args.spread * rng.normal(
+        size=(args.queries, args.dim)).astype(np.float32)
+
+    unit, unit_queries = _unit(vectors), _unit(queries)
+    truth, truth_filtered = [], []
+    for i, query in enumerate(unit_queries):
+        scores = unit @ query
+        truth.append({ids[j] for j in np.argsort(-scores)[:args.k]})
+        allowed = np.flatnonzero(modules == i % args.modules)
+        truth_filtered.append({ids[j] for j in allowed[np.argsort(-scores[allowed])[:args.k]]})
+
+    def module_filter(i):
+        return qmodels.Filter(must=[qmodels.FieldCondition(key="module_id", match=qmodels.MatchValue(value=int(i % args.modules)))])
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = LocalANNStore(directory)
+        store.create_collection(COLLECTION, {"text": qmodels.VectorParams(size=args.dim, distance="Cosine")})
+        store._collections[COLLECTION].auto_train = False  # train once, below, instead of while loading
+        started = time.perf_counter()
+        for start in range(0, args.points, 1000):
+            store.upsert(COLLECTION, [
+                qmodels.PointStruct(id=ids[j], vector={"text": vectors[j].tolist()},
+                                    payload={"type": "text", "module_id": int(modules[j]), "team_id": int(modules[j] % 3),
+                                             "doc_id": str(j // 40)})
+                for j in range(start, min(start + 1000, args.points))
+            ])
+        loaded = time.perf_counter() - started
+        store.build_index(COLLECTION)
+        trained = time.perf_counter() - started - loaded
+        print(f"{args.points} x {args.dim} vectors: load {loaded:.1f}s, train {ivf_list_count(args.points)} lists {trained:.1f}s")
+        print(f"{'search':<22}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}"
+              f"{'filtered recall':>18}{'p50 ms':>10}{'p95 ms':>10}")
+
+        def row(label, **search_kwargs):
+            plain = _run(lambda i, q: store.search(COLLECTION, ("text", q), limit=args.k, **search_kwargs),
+                         queries, truth, args.k)
+            filtered = _run(lambda i, q: store.search(COLLECTION, ("text", q), query_filter=module_filter(i), limit=args.k,
+                                                      **search_kwargs), queries, truth_filtered, args.k)
+            print(f"{label:<22}{plain[0]:>10.3f}{plain[1]:>10.2f}{plain[2]:>10.2f}"
+                  f"{filtered[0]:>18.3f}{filtered[1]:>10.2f}{filtered[2]:>10.2f}")
+
+        row("exact (store)", search_params=qmodels.SearchParams(exact=True))
+        for nprobe in (int(n) for n in args.nprobe.split(",")):
+            row(f"ivf nprobe={nprobe}", nprobe=nprobe)
+        store.close()
+
+        if args.qdrant:
+            from qdrant_client import QdrantClient
+            client = QdrantClient(path=f"{directory}/qdrant")
+            client.create_collection(COLLECTION, vectors_config={"text": qmodels.VectorParams(size=args.dim, distance="Cosine")})
+            for start in range(0, args.points, 1000):
+                client.upsert(COLLECTION, [
+                    qmodels.PointStruct(id=ids[j], vector={"text": vectors[j].tolist()}, payload={"module_id": int(modules[j])})
+                    for j in range(start, min(start + 1000, args.points))
+                ])
+
+            def qdrant_search(i, query, flt=None):
+                return client.query_points(COLLECTION, query=query.tolist(), using="text", query_filter=flt, limit=args.k).points
+
+            plain = _run(qdrant_search, queries, truth, args.k)
+            filtered = _run(lambda i, q: qdrant_search(i, q, module_filter(i)), queries, truth_filtered, args.k)
+            print(f"{'qdrant (embedded)':<22}{plain[0]:>10.3f}{plain[1]:>10.2f}{plain[2]:>10.2f}"
+                  f"{filtered[0]:>18.3f}{filtered[1]:>10.2f}{filtered[2]:>10.2f}")
+            client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+bm25.py - BM25 sparse vectors for lexical retrieval
+
+Every text chunk gets a sparse vector at ingest: one dimension per token (a stable 31-bit
+hash), weighted with BM25's saturated term frequency and document length normalisation.
+The store applies IDF at query time (Qdrant's Modifier.IDF; LocalANNStore computes it the
+same way from its postings), so a query vector just lists its tokens with weight 1 and the
+dot product of the two is the BM25 score.
+
+Tokens are lowercased words plus compound tokens that keep endpoint paths, product codes
+and versions whole: "/api/v2/users" yields api/v2/users, api, v2 and users; "XR-200B"
+yields xr-200b, xr and 200b.
+"""
+import os
+import re
+import hashlib
+from collections import Counter
+from typing import List, Optional
+
+from qdrant_client.http import models as qmodels
+
+BM25_VECTOR = "bm25"  # sparse vector name in the collection
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))  # term frequency saturation
+BM25_B = float(os.getenv("BM25_B", "0.75"))  # length normalisation strength
+BM25_AVG_DOC_TOKENS = float(os.getenv("BM25_AVG_DOC_TOKENS", "250"))  # typical chunk length in tokens
+
+_COMPOUND = re.compile(r"\w+(?:[-./:#]\w+)*")
+_PART = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does for from had has have how i if in into is it its
+me my of on or our so than that the their them then there these they this to us was we were what when
+where which who whom why will with would you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens, plus compound tokens (paths, codes, versions) kept whole"""
+    tokens = []
+    for match in _COMPOUND.finditer(str(text or "").lower()):
+        compound = match.group()
+        parts = _PART.findall(compound)
+        if len(parts) > 1:
+            tokens.append(compound)
+        tokens.extend(p for p in parts if p not in STOPWORDS and (len(p) > 1 or p.isdigit()))
+    return tokens
+
+def term_id(token: str) -> int:
+    """Stable sparse dimension of a token"""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little") & 0x7FFFFFFF
+
+def document_vector(text: str) -> Optional[qmodels.SparseVector]:
+    """BM25 term weights of a chunk (None when it has no tokens)"""
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    counts = Counter(term_id(t) for t in tokens)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_TOKENS)
+    indices = sorted(counts)
+    return qmodels.SparseVector(indices=indices,
+                                values=[counts[i] * (BM25_K1 + 1) / (counts[i] + norm) for i in indices])
+
+def query_vector(text: str) -> Optional[qmodels.SparseVector]:
+    """Sparse query: each distinct token with weight 1 (None when it has no tokens)"""
+    indices = sorted({term_id(t) for t in tokenize(text)})
+    if not indices:
+        return None
+    return qmodels.SparseVector(indices=indices, values=[1.0] * len(indices))
@@ -0,0 +1,266 @@
+"""
+bulk_ingest.py - Parallel bulk ingestion of directories and zip archives
+
+    python bulk_ingest.py --module 3 past_rfps/ archive_2023.zip --workers 8
+
+Every supported file is copied (and hashed) into uploads/<module_id>/, registered with
+add_document() and ingested by a pool of worker threads, each ingest recorded as an ingest job. Text embeddings from all workers go through one
+SharedEmbedder, so concurrent documents fill large embedding requests together instead of
+each sending small ones. Progress is appended to a JSONL checkpoint; re-running the same
+command skips finished files and resumes the rest under their existing document ids.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+import queue
+import zipfile
+import argparse
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from db import add_document, get_db_connection, update_document_file, create_ingest_job, finish_ingest_job
+from ingest_jobs import progress_reporter
+from upload_storage import claim_upload_path
+
+log = logging.getLogger(__name__)
+
+UPLOAD_DIR = Path(__file__).parent / "uploads"
+BULK_EXTENSIONS = {".pdf", ".docx", ".doc", ".txt", ".md"}
+BULK_INGEST_WORKERS = int(os.getenv("BULK_INGEST_WORKERS", "4"))
+EMBED_COALESCE_SECONDS = float(os.getenv("EMBED_COALESCE_SECONDS", "0.05"))  # how long to wait for more texts
+EMBED_COALESCE_INPUTS = int(os.getenv("EMBED_COALESCE_INPUTS", "1024"))  # texts per shared embedding round
+
+class SharedEmbedder:
+    """Coalesces openai_embed() calls from concurrent ingest workers into larger requests"""
+
+    def __init__(self, embed, max_inputs: int = EMBED_COALESCE_INPUTS, max_wait: float = EMBED_COALESCE_SECONDS):
+        self._embed = embed
+        self.max_inputs = max_inputs
+        self.max_wait = max_wait
+        self._requests: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="shared-embedder", daemon=True)
+        self._thread.start()
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        future: Future = Future()
+        self._requests.put((list(texts), future))
+        return future.result()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            pending, total = [first], len(first[0])
+            deadline = time.monotonic() + self.max_wait
+            while total < self.max_inputs:
+                try:
+                    request = self._requests.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                pending.append(request)
+                total += len(request[0])
+            try:
+                vectors = self._embed([text for texts, _ in pending for text in texts])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for texts, future in pending:
+                future.set_result(vectors[offset:offset + len(texts)])
+                offset += len(texts)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+class Checkpoint:
+    """Append-only JSONL record of each source's document id and status; last entry wins"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from an interrupted run
+                    self.entries[entry["key"]] = entry
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.entries.get(key)
+
+    def record(self, key: str, **fields):
+        with self._lock:
+            entry = {**self.entries.get(key, {}), "key": key, **fields, "at": time.time()}
+            self.entries[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+def iter_sources(paths: Sequence[str]) -> Iterator[tuple[str, str, str]]:
+    """Yield (key, fingerprint, display name) for every supported file in directories and zip archives"""
+    for raw in paths:
+        path = Path(raw).resolve()
+        if path.is_dir():
+            for file in sorted(p for p in path.rglob("*") if p.is_file()):
+                if file.suffix.lower() in BULK_EXTENSIONS:
+                    stat = file.stat()
+                    yield str(file), f"{stat.st_size}:{int(stat.st_mtime)}", file.name
+        elif path.suffix.lower() == ".zip":
+            with zipfile.ZipFile(path) as zf:
+                for member in zf.infolist():
+                    name = Path(member.filename)
+                    if member.is_dir() or "__MACOSX" in name.parts or name.suffix.lower() not in BULK_EXTENSIONS:
+                        continue
+                    yield f"{path}::{member.filename}", f"{member.file_size}:{member.CRC}", name.name
+        elif path.suffix.lower() in BULK_EXTENSIONS and path.is_file():
+            stat = path.stat()
+            yield str(path), f"{stat.st_size}:{int(stat.st_mtime)}", path.name
+        else:
+            log.warning(f"Skipping {raw}: not a directory, zip archive or supported file")
+
+def _stage_file(key: str, name: str, module_id: int, existing: Optional[str]) -> tuple[str, str]:
+    """Copy a source into uploads/<module_id>/ (reusing its earlier location on resume).
+    Returns the staged path and the SHA-256 of the bytes, hashed while copying."""
+    if existing:
+        dest = Path(existing)
+    else:
+        module_dir = UPLOAD_DIR / str(module_id)
+        module_dir.mkdir(parents=True, exist_ok=True)
+        # Archives often repeat file names in different folders, and workers stage concurrently
+        dest = Path(claim_upload_path(str(module_dir), name))
+    tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    if "::" in key:
+        archive, member = key.split("::", 1)
+        with zipfile.ZipFile(archive) as zf, zf.open(member) as src, open(tmp, "wb") as out:
+            _copy_hashed(src, out, digest)
+    else:
+        with open(key, "rb") as src, open(tmp, "wb") as out:
+            _copy_hashed(src, out, digest)
+    os.replace(tmp, dest)
+    return str(dest), digest.hexdigest()
+
+def _copy_hashed(src, out, digest, block: int = 1 << 20):
+    while True:
+        data = src.read(block)
+        if not data:
+            return
+        digest.update(data)
+        out.write(data)
+
+def bulk_ingest(paths: Sequence[str], module_id: int, workers: int = BULK_INGEST_WORKERS,
+                checkpoint_path: Optional[str] = None, uploaded_by: str = "bulk_ingest") -> dict:
+    """Ingest every supported file under `paths` into a module. Returns run totals."""
+    from semantic_indexing import ingest, openai_embed
+
+    conn = get_db_connection()
+    module = conn.execute("SELECT team_id FROM module WHERE module_id = ?", (module_id,)).fetchone()
+    conn.close()
+    if not module:
+        raise ValueError(f"Module {module_id} not found")
+    team_id = module["team_id"]
+
+    checkpoint = Checkpoint(checkpoint_path or f"bulk_ingest_{module_id}.checkpoint.jsonl")
+    sources, skipped = [], 0
+    for key, fingerprint, name in iter_sources(paths):
+        entry = checkpoint.get(key)
+        if entry and entry.get("status") == "done" and entry.get("fingerprint") == fingerprint:
+            skipped += 1
+            continue
+        sources.append((key, fingerprint, name, entry))
+    log.info(f"Bulk ingest: {len(sources)} files to ingest, {skipped} already done (checkpoint {checkpoint.path})")
+
+    totals = {"documents": 0, "failed": 0, "skipped": skipped, "chunks": 0, "images": 0, "tokens": 0}
+    totals_lock = threading.Lock()
+    embedder = SharedEmbedder(openai_embed)
+    started = time.monotonic()
+
+    def run(key, fingerprint, name, entry):
+        file_path, content_hash = _stage_file(key, name, module_id, entry and entry.get("file_path"))
+        title = Path(name).stem
+        document_id = entry and entry.get("document_id")
+        if document_id is None:
+            document_id = add_document(module_id, title, file_path, uploaded_by, team_id, content_hash)
+        else:
+            update_document_file(document_id, file_path, content_hash)
+        checkpoint.record(key, fingerprint=fingerprint, document_id=document_id, file_path=file_path, status="registered")
+        # Recorded as a job (running here, never claimed by the workers) so the document shows in
+        # /api/ingest_jobs and, once done, can serve as a dedupe source for identical uploads
+        job_id = create_ingest_job(document_id, module_id, file_path, title, team_id, status="running")
+        report, flush = progress_reporter(job_id)
+        job_started = time.monotonic()
+        try:
+            # Resumed documents keep their id; the incremental ingest skips what is already stored
+            stats = ingest(file_path, document_id, module_id, title, team_id, progress=report, embed_texts=embedder.embed)
+        except Exception as e:
+            flush()
+            finish_ingest_job(job_id, "failed", duration_seconds=time.monotonic() - job_started, error=str(e))
+            raise
+        flush()
+        finish_ingest_job(job_id, "done", duration_seconds=time.monotonic() - job_started)
+        checkpoint.record(key, status="done", chunks=stats["chunks"], images=stats["images"])
+        return stats
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bulk-ingest") as pool:
+            futures = {pool.submit(run, *source): source[0] for source in sources}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    log.error(f"Bulk ingest failed for {key}: {e}")
+                    checkpoint.record(key, status="failed", error=str(e))
+                    with totals_lock:
+                        totals["failed"] += 1
+                    continue
+                with totals_lock:
+                    totals["documents"] += 1
+                    totals["chunks"] += stats["chunks"]
+                    totals["images"] += stats["images"]
+                    totals["tokens"] += stats.get("tokens", 0)
+                    elapsed = max(time.monotonic() - started, 1e-6)
+                    log.info(f"[{totals['documents'] + totals['failed']}/{len(sources)}] "
+                             f"{totals['documents'] / elapsed:.2f} docs/s, {totals['chunks'] / elapsed:.1f} chunks/s, "
+                             f"{totals['tokens'] / elapsed:.0f} tokens/s")
+    finally:
+        embedder.close()
+
+    totals["seconds"] = round(time.monotonic() - started, 1)
+    log.info(f"Bulk ingest finished: {totals}")
+    return totals
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+    parser = argparse.ArgumentParser(description="Ingest directories and zip archives of documents into a module")
+    parser.add_argument("paths", nargs="+", help="Directories, zip archives or files")
+    parser.add_argument("--module", type=int, required=True, help="Module ID to add the documents to")
+    parser.add_argument("--workers", type=int, default=BULK_INGEST_WORKERS, help="Documents ingested concurrently")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: bulk_ingest_<module>.checkpoint.jsonl)")
+    args = parser.parse_args()
+
+    from vector_store import store_manager
+    try:
+        result = bulk_ingest(args.paths, args.module, args.workers, args.checkpoint)
+    except ValueError as e:
+        sys.exit(str(e))
+    finally:
+        store_manager.close()
+    sys.exit(1 if result["failed"] else 0)
@@ -0,0 +1,204 @@
+"""
+chunking.py - Sentence-aware, token-counted document chunker
+
+Text is split into units (sentences, or whole paragraphs for technical sections),
+token counts for all units of a fed block come from one batch encode, and units are
+packed into chunks of at most `chunk_size` tokens with an optional `chunk_overlap`.
+Entity extraction uses precompiled patterns and a single keyword matcher.
+
+Given a doc_id, chunk IDs are deterministic - uuid5 of (doc_id, content hash, occurrence) -
+so re-ingesting a revised document only produces new IDs for chunks whose text changed.
+
+compat=True reproduces the original _sentence_chunk() output exactly (punctuation
+dropped at sentence boundaries, no overlap, oversized units kept whole).
+"""
+import os
+import re
+import uuid
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import tiktoken
+
+DEFAULT_CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "150"))  # tokens per chunk
+DEFAULT_CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "0"))  # tokens carried over from the previous chunk
+CHUNKER_COMPAT = os.getenv("CHUNKER_COMPAT", "0") == "1"  # reproduce the legacy chunk boundaries exactly
+
+enc_tok = tiktoken.get_encoding("cl100k_base")
+
+POINT_ID_NAMESPACE = uuid.UUID("6f1c7a52-3d4e-5b8a-9c0f-2e7d1b4a8c63")  # namespace for deterministic point IDs
+
+def content_point_id(doc_id, kind: str, digest: str, occurrence: int = 0) -> str:
+    """Deterministic Qdrant point ID for the n-th occurrence of some content in a document"""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{doc_id}:{kind}:{digest}:{occurrence}"))
+
+@dataclass
+class Chunk:
+    text: str
+    entities: List[str]
+    chunk_id: str
+
+# Entity patterns - capitalized words and acronyms, HTTP endpoints, URL paths
+_CAPITALIZED = re.compile(r"[A-Z][a-z]+[A-Za-z0-9_]*|[A-Z0-9_]{2,}")
+_HTTP_ENDPOINT = re.compile(r"(?:GET|POST|PUT|DELETE|PATCH)\s+[/\w\-:]+")
+_URL_PATH = re.compile(r"/[/\w\-:]+")
+
+TECH_KEYWORDS = [
+    "endpoint", "endpoints", "API", "backend", "frontend", "database",
+    "service", "server", "client", "authentication", "authorization",
+    "register", "login", "profile", "update", "tech stack", "technology"
+]
+
+def _build_keyword_matcher(keywords: List[str]):
+    """One regex finding every keyword occurrence, plus the keywords each match implies.
+
+    The lookahead reports the longest keyword starting at each position; shorter keywords
+    that are substrings of it ("endpoint" in "endpoints") are added through `implied`.
+    """
+    lowered: Dict[str, List[str]] = {}
+    for keyword in keywords:
+        lowered.setdefault(keyword.lower(), []).append(keyword)
+    alternatives = sorted(lowered, key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in alternatives) + "))")
+    implied = {
+        k: [original for other in lowered if other in k for original in lowered[other]]
+        for k in lowered
+    }
+    return pattern, implied
+
+_KEYWORD_MATCHER, _KEYWORD_IMPLIED = _build_keyword_matcher(TECH_KEYWORDS)
+
+# Paragraphs mentioning these are kept whole instead of being split into sentences
+_TECHNICAL_PARAGRAPH = re.compile("endpoint|api|post|get|put|delete|patch")
+_SENTENCE_SPLIT = re.compile(r"[.?!]")
+_SENTENCE_END = re.compile(r"(?<=[.?!])")
+
+def extract_entities(text: str) -> List[str]:
+    """Capitalized terms, acronyms, endpoints, URL paths and technical keywords in `text`"""
+    entities = set(_CAPITALIZED.findall(text))
+    entities.update(_HTTP_ENDPOINT.findall(text))
+    entities.update(_URL_PATH.findall(text))
+    for keyword in set(_KEYWORD_MATCHER.findall(text.lower())):
+        entities.update(_KEYWORD_IMPLIED[keyword])
+    return list(entities)
+
+class SentenceChunker:
+    """Incremental chunker: feed() text as it is extracted, close() at the end.
+
+    Produces the same chunks as chunking the concatenated text in one go.
+    """
+
+    def __init__(self, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None, compat: bool = CHUNKER_COMPAT,
+                 doc_id: Optional[str] = None):
+        self.chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        self.chunk_overlap = 0 if compat else min(max(0, DEFAULT_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap),
+                                                  self.chunk_size - 1)
+        self.compat = compat
+        self.doc_id = doc_id  # when set, chunk IDs are derived from content instead of random
+        self._occurrences: Dict[str, int] = {}
+        self.tokens = 0  # tokens of all text fed so far
+        self._pending = ""  # trailing partial paragraph from the last feed()
+        self._current: List[tuple[str, int]] = []  # (unit text, token count)
+        self._current_tokens = 0
+        self._fresh = False  # whether _current holds units not yet emitted (vs. carried overlap only)
+
+    def feed(self, text: str) -> List[Chunk]:
+        paragraphs = (self._pending + text).split("\n")
+        self._pending = paragraphs.pop()
+        return self._add_units(self._split_units(paragraphs))
+
+    def close(self) -> List[Chunk]:
+        chunks = self._add_units(self._split_units([self._pending]))
+        self._pending = ""
+        # Handle remaining content
+        if self._fresh:
+            chunks.append(self._make_chunk())
+        self._current, self._current_tokens, self._fresh = [], 0, False
+        return chunks
+
+    def page_break(self) -> List[Chunk]:
+        """Close the open chunk at a page boundary, so an edit on one page leaves the chunks
+        (and chunk IDs) of the other pages unchanged. No-op in compat mode."""
+        return [] if self.compat else self.close()
+
+    def _split_units(self, paragraphs: List[str]) -> List[str]:
+        units = []
+        for paragraph in paragraphs:
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if _TECHNICAL_PARAGRAPH.search(paragraph.lower()):
+                # Keep technical sections together
+                units.append(paragraph)
+            else:
+                splitter = _SENTENCE_SPLIT if self.compat else _SENTENCE_END
+                units.extend(s for s in (s.strip() for s in splitter.split(paragraph)) if s)
+        return units
+
+    def _add_units(self, units: List[str]) -> List[Chunk]:
+        chunks: List[Chunk] = []
+        if not units:
+            return chunks
+        # One batch encode per fed block instead of one encode per sentence
+        for unit, tokens in zip(units, enc_tok.encode_ordinary_batch(units)):
+            n_tokens = len(tokens)
+            self.tokens += n_tokens
+            if not self.compat and n_tokens > self.chunk_size:
+                self._add_oversized(tokens, chunks)
+                continue
+            # If adding this unit would exceed the chunk size, start a new chunk
+            if self._current_tokens + n_tokens > self.chunk_size and self._current:
+                self._emit(chunks, n_tokens)
+            self._current.append((unit, n_tokens))
+            self._current_tokens += n_tokens
+            self._fresh = True
+        return chunks
+
+    def _add_oversized(self, tokens: List[int], chunks: List[Chunk]):
+        """Split a unit longer than chunk_size into token windows"""
+        if self._fresh:
+            self._emit(chunks, self.chunk_size)
+        step = self.chunk_size - self.chunk_overlap
+        for start in range(0, len(tokens), step):
+            window = tokens[start:start + self.chunk_size]
+            self._current, self._current_tokens = [(enc_tok.decode(window), len(window))], len(window)
+            self._fresh = True
+            if start + self.chunk_size >= len(tokens):
+                break  # the last window stays open so following sentences can join it
+            self._emit(chunks, self.chunk_size)
+
+    def _emit(self, chunks: List[Chunk], next_tokens: int):
+        """Close the current chunk, carrying trailing units that fit in chunk_overlap into the next"""
+        chunks.append(self._make_chunk())
+        carried, carried_tokens = [], 0
+        for unit, n_tokens in reversed(self._current):
+            if carried_tokens + n_tokens > self.chunk_overlap or carried_tokens + n_tokens + next_tokens > self.chunk_size:
+                break
+            carried.insert(0, (unit, n_tokens))
+            carried_tokens += n_tokens
+        self._current, self._current_tokens = carried, carried_tokens
+        self._fresh = False
+
+    def _make_chunk(self) -> Chunk:
+        chunk_text = " ".join(unit for unit, _ in self._current)
+        return Chunk(
+            text=chunk_text,
+            entities=extract_entities(chunk_text),
+            chunk_id=self._chunk_id(chunk_text)
+        )
+
+    def _chunk_id(self, chunk_text: str) -> str:
+        if self.doc_id is None:
+            return str(uuid.uuid4())
+        digest = hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()
+        # Identical chunks within a document get distinct IDs by occurrence
+        occurrence = self._occurrences.get(digest, 0)
+        self._occurrences[digest] = occurrence + 1
+        return content_point_id(self.doc_id, "text", digest, occurrence)
+
+def chunk_text(text: str, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None, compat: bool = CHUNKER_COMPAT,
+               doc_id: Optional[str] = None) -> List[Chunk]:
+    """Chunk a whole text in one call"""
+    chunker = SentenceChunker(chunk_size, chunk_overlap, compat, doc_id)
+    return chunker.feed(text) + chunker.close()
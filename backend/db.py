@@ -91,6 +91,15 @@ def initialize_db():
             FOREIGN KEY (team_id) REFERENCES teams (team_id) ON DELETE SET NULL
         )
     ''')
+
+    # Per-module chunking settings (NULL = CHUNK_SIZE / CHUNK_OVERLAP defaults)
+    cursor.execute("PRAGMA table_info(module)")
+    module_columns = cursor.fetchall()
+    for column in ("chunk_size", "chunk_overlap"):
+        if not any(col["name"] == column for col in module_columns):
+            cursor.execute(f"ALTER TABLE module ADD COLUMN {column} INTEGER")
+            print(f"Added {column} column to module table.")
+
     # Create documents table if not exists
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS documents (
@@ -104,6 +113,12 @@ def initialize_db():
             FOREIGN KEY (team_id) REFERENCES teams (team_id) ON DELETE SET NULL
         )
     ''')
+    # Content hash (sha256) of the uploaded bytes, used to reuse identical documents
+    cursor.execute("PRAGMA table_info(documents)")
+    if not any(col["name"] == "content_hash" for col in cursor.fetchall()):
+        cursor.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+        print("Added content_hash column to documents table.")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash)")
     # Create chat_sessions table if not exists
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS chat_sessions (
@@ -128,47 +143,186 @@ def initialize_db():
             FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
         )
     ''')
+    # Create ingest_jobs table if not exists (durable background ingestion queue)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER,
+            module_id INTEGER,
+            team_id INTEGER,
+            title TEXT,
+            file_path TEXT NOT NULL,
+            status TEXT DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            pages_done INTEGER DEFAULT 0,
+            pages_total INTEGER DEFAULT 0,
+            chunks_done INTEGER DEFAULT 0,
+            chunks_total INTEGER DEFAULT 0,
+            images_done INTEGER DEFAULT 0,
+            images_total INTEGER DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            duration_seconds REAL,
+            FOREIGN KEY (document_id) REFERENCES documents (document_id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, job_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_module ON ingest_jobs (module_id, job_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_document ON ingest_jobs (document_id, status)")
+    # Jobs for duplicate uploads copy the points of an already ingested document
+    cursor.execute("PRAGMA table_info(ingest_jobs)")
+    if not any(col["name"] == "source_document_id" for col in cursor.fetchall()):
+        cursor.execute("ALTER TABLE ingest_jobs ADD COLUMN source_document_id INTEGER")
+        print("Added source_document_id column to ingest_jobs table.")
+
+    # Create upload_sessions table if not exists (resumable chunked uploads; parts live on disk)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            upload_id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            uploaded_by TEXT,
+            module_id INTEGER,
+            team_id INTEGER,
+            title TEXT,
+            filename TEXT NOT NULL,
+            total_size INTEGER NOT NULL,
+            part_size INTEGER NOT NULL,
+            total_parts INTEGER NOT NULL,
+            status TEXT DEFAULT 'open',
+            document_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_upload_sessions_expiry ON upload_sessions (status, expires_at)")
+
+    # Create answer_library table if not exists (approved per-team Q&A pairs, see answer_library.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS answer_library (
+            entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team_id INTEGER NOT NULL,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (team_id) REFERENCES teams (team_id) ON DELETE CASCADE,
+            FOREIGN KEY (created_by) REFERENCES users (id) ON DELETE SET NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_answer_library_team ON answer_library (team_id, entry_id)")
+    # Disabled entries stay in the library but are never served
+    cursor.execute("PRAGMA table_info(answer_library)")
+    if not any(col["name"] == "enabled" for col in cursor.fetchall()):
+        cursor.execute("ALTER TABLE answer_library ADD COLUMN enabled INTEGER NOT NULL DEFAULT 1")
+        print("Added enabled column to answer_library table.")
 
     conn.commit()
     conn.close()
 
-def create_module(name, description=None, team_id=None):
+def create_module(name, description=None, team_id=None, chunk_size=None, chunk_overlap=None):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        "INSERT INTO module (name, description, team_id) VALUES (?, ?, ?)",
-        (name, description, team_id)
+        "INSERT INTO module (name, description, team_id, chunk_size, chunk_overlap) VALUES (?, ?, ?, ?, ?)",
+        (name, description, team_id, chunk_size, chunk_overlap)
     )
     module_id = cursor.lastrowid
     conn.commit()
     conn.close()
     return module_id
 
-def add_document(module_id, title, file_path, uploaded_by=None, team_id=None):
+def set_module_chunking(module_id, chunk_size=None, chunk_overlap=None):
+    """Set a module's chunk size/overlap in tokens (None restores the defaults). Applies to future ingests."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE module SET chunk_size = ?, chunk_overlap = ? WHERE module_id = ?",
+        (chunk_size, chunk_overlap, module_id)
+    )
+    updated = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return updated
+
+def add_document(module_id, title, file_path, uploaded_by=None, team_id=None, content_hash=None):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        "INSERT INTO documents (module_id, title, file_path, uploaded_by, team_id) VALUES (?, ?, ?, ?, ?)",
-        (module_id, title, file_path, uploaded_by, team_id)
+        "INSERT INTO documents (module_id, title, file_path, uploaded_by, team_id, content_hash) VALUES (?, ?, ?, ?, ?, ?)",
+        (module_id, title, file_path, uploaded_by, team_id, content_hash)
     )
     document_id = cursor.lastrowid
     conn.commit()
     conn.close()
     return document_id
 
+def update_document_file(document_id, file_path, content_hash=None):
+    """Point a document at a revised file (re-upload)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE documents SET file_path = ?, content_hash = ?, uploaded_at = CURRENT_TIMESTAMP WHERE document_id = ?",
+        (file_path, content_hash, document_id)
+    )
+    conn.commit()
+    conn.close()
+
+def find_ingested_document_by_hash(content_hash, module_id):
+    """An existing document with these exact bytes whose points can be cloned into module_id (or None).
+    Its module chunks the same way as module_id, its latest ingest job is done and none is pending.
+    A re-upload sets content_hash before its ingest runs, so until that finishes the stored points
+    still belong to the previous bytes."""
+    if not content_hash:
+        return None
+    conn = get_db_connection()
+    row = conn.execute("""
+        SELECT d.* FROM documents d
+        JOIN module source ON source.module_id = d.module_id
+        JOIN module target ON target.module_id = ?
+        WHERE d.content_hash = ?
+          AND source.chunk_size IS target.chunk_size AND source.chunk_overlap IS target.chunk_overlap
+          AND (SELECT j.status FROM ingest_jobs j WHERE j.document_id = d.document_id
+               ORDER BY j.job_id DESC LIMIT 1) = 'done'
+          AND NOT EXISTS (SELECT 1 FROM ingest_jobs j
+                          WHERE j.document_id = d.document_id AND j.status IN ('queued', 'running'))
+        ORDER BY d.document_id
+        LIMIT 1
+    """, (module_id, content_hash)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def document_exists(document_id):
+    """Whether a document row still exists (ingest workers check before and after ingesting)"""
+    conn = get_db_connection()
+    row = conn.execute("SELECT 1 FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+    conn.close()
+    return row is not None
+
+def is_file_referenced(file_path):
+    """Whether any document still points at this stored file"""
+    conn = get_db_connection()
+    row = conn.execute("SELECT 1 FROM documents WHERE file_path = ? LIMIT 1", (file_path,)).fetchone()
+    conn.close()
+    return row is not None
+
 def get_modules(team_id=None):
     conn = get_db_connection()
     cursor = conn.cursor()
     if team_id:
         cursor.execute("""
-            SELECT m.module_id, m.name, m.description, m.team_id, t.name as team_name
+            SELECT m.module_id, m.name, m.description, m.team_id, m.chunk_size, m.chunk_overlap, t.name as team_name
             FROM module m 
             LEFT JOIN teams t ON m.team_id = t.team_id
             WHERE m.team_id = ?
         """, (team_id,))
     else:
         cursor.execute("""
-            SELECT m.module_id, m.name, m.description, m.team_id, t.name as team_name
+            SELECT m.module_id, m.name, m.description, m.team_id, m.chunk_size, m.chunk_overlap, t.name as team_name
             FROM module m 
             LEFT JOIN teams t ON m.team_id = t.team_id
         """)
@@ -698,7 +852,13 @@ def delete_module(module_id):
         documents = cursor.execute("SELECT document_id, file_path FROM documents WHERE module_id = ?", (module_id,)).fetchall()
         doc_ids = [d["document_id"] for d in documents]
         
-        # 2. Delete embeddings from Qdrant vector database
+        # 2. Cancel their ingest jobs and delete the documents from the database first, so an
+        #    ingest still running finds its document gone and removes what it indexed
+        cancel_ingest_jobs(cursor, doc_ids)
+        cursor.execute("DELETE FROM documents WHERE module_id = ?", (module_id,))
+        print(f"Deleted {cursor.rowcount} documents from database")
+        
+        # 3. Delete embeddings from Qdrant vector database
         if doc_ids:
             try:
                 from semantic_indexing import delete_module_embeddings
@@ -707,7 +867,7 @@ def delete_module(module_id):
             except Exception as e:
                 print(f"Warning: Could not delete embeddings for module {module_id}: {e}")
         
-        # 3. Delete physical files from uploads directory
+        # 4. Delete physical files from uploads directory
         upload_dir = os.path.join(os.path.dirname(__file__), "uploads")
         module_upload_dir = os.path.join(upload_dir, str(module_id))
         if os.path.exists(module_upload_dir):
@@ -717,10 +877,6 @@ def delete_module(module_id):
             except Exception as e:
                 print(f"Warning: Could not delete upload directory {module_upload_dir}: {e}")
         
-        # 4. Delete documents from database
-        cursor.execute("DELETE FROM documents WHERE module_id = ?", (module_id,))
-        print(f"Deleted {cursor.rowcount} documents from database")
-        
         # 5. Delete the module itself
         cursor.execute("DELETE FROM module WHERE module_id = ?", (module_id,))
         print(f"Deleted module {module_id}")
@@ -748,17 +904,32 @@ def delete_team(team_id):
         # 1. Get all modules associated with this team
         modules = cursor.execute("SELECT module_id FROM module WHERE team_id = ?", (team_id,)).fetchall()
         module_ids = [m["module_id"] for m in modules]
+        placeholders = ",".join("?" * len(module_ids))
+        
+        # 2. Cancel ingest jobs and delete the documents from the database before their embeddings,
+        #    so an ingest still running finds its document gone and removes what it indexed
+        if module_ids:
+            documents = cursor.execute(f"SELECT document_id FROM documents WHERE module_id IN ({placeholders})", module_ids).fetchall()
+            cancel_ingest_jobs(cursor, [d["document_id"] for d in documents])
+            cursor.execute(f"DELETE FROM documents WHERE module_id IN ({placeholders})", module_ids)
+            print(f"Deleted {cursor.rowcount} documents from database")
         
-        # 2. Delete embeddings for the entire team using the new semantic indexing function
+        # 3. Delete embeddings for the entire team using the new semantic indexing function
         try:
             from semantic_indexing import delete_team_embeddings
             delete_team_embeddings(team_id)
             print(f"Deleted embeddings for team {team_id}")
         except Exception as e:
             print(f"Warning: Could not delete embeddings for team {team_id}: {e}")
+        try:
+            from answer_library import delete_team_library_vectors
+            delete_team_library_vectors(team_id)
+        except Exception as e:
+            print(f"Warning: Could not delete answer library vectors for team {team_id}: {e}")
+        cursor.execute("DELETE FROM answer_library WHERE team_id = ?", (team_id,))
         
         if module_ids:
-            # 3. Delete physical files from uploads directory
+            # 4. Delete physical files from uploads directory
             upload_dir = os.path.join(os.path.dirname(__file__), "uploads")
             for module_id in module_ids:
                 module_upload_dir = os.path.join(upload_dir, str(module_id))
@@ -769,11 +940,6 @@ def delete_team(team_id):
                     except Exception as e:
                         print(f"Warning: Could not delete upload directory {module_upload_dir}: {e}")
             
-            # 4. Delete documents from database (will cascade if proper foreign keys are set)
-            placeholders = ",".join("?" * len(module_ids))
-            cursor.execute(f"DELETE FROM documents WHERE module_id IN ({placeholders})", module_ids)
-            print(f"Deleted {cursor.rowcount} documents from database")
-            
             # 5. Delete modules from database  
             cursor.execute(f"DELETE FROM module WHERE module_id IN ({placeholders})", module_ids)
             print(f"Deleted {cursor.rowcount} modules from database")
@@ -863,3 +1029,222 @@ def clear_chat_messages(session_id, user_id):
     
     conn.commit()
     conn.close()
+
+# Ingestion Job Functions
+INGEST_JOB_PROGRESS_FIELDS = (
+    "pages_done", "pages_total", "chunks_done", "chunks_total", "images_done", "images_total"
+)
+
+def create_ingest_job(document_id, module_id, file_path, title=None, team_id=None, source_document_id=None,
+                      status="queued"):
+    """Enqueue a document for background ingestion and return the job id.
+    With source_document_id the job copies that document's points instead of re-ingesting.
+    status='running' records an ingest another process runs itself (e.g. bulk_ingest), which
+    the workers never claim."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO ingest_jobs (document_id, module_id, team_id, title, file_path, status, source_document_id,
+                                 attempts, started_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, CASE WHEN ? = 'running' THEN CURRENT_TIMESTAMP END)
+    """, (document_id, module_id, team_id, title, file_path, status, source_document_id,
+          1 if status == "running" else 0, status))
+    job_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return job_id
+
+def cancel_ingest_jobs(cursor, document_ids):
+    """Cancel the queued and running jobs of documents being deleted and drop their other job rows.
+    Connections do not enable foreign keys, so the ON DELETE CASCADE of ingest_jobs never fires;
+    cancelled rows stay so pollers of /api/ingest_jobs/{job_id} see why the job stopped."""
+    document_ids = list(document_ids)
+    if not document_ids:
+        return
+    placeholders = ",".join("?" * len(document_ids))
+    cursor.execute(f"""
+        UPDATE ingest_jobs
+        SET status = 'cancelled', error = 'document deleted',
+            finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE document_id IN ({placeholders}) AND status IN ('queued', 'running')
+    """, document_ids)
+    cursor.execute(f"DELETE FROM ingest_jobs WHERE document_id IN ({placeholders}) AND status != 'cancelled'", document_ids)
+
+def claim_next_ingest_job():
+    """Atomically move the oldest queued job to 'running' and return it (or None)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        job = cursor.execute(
+            "SELECT * FROM ingest_jobs WHERE status = 'queued' ORDER BY job_id LIMIT 1"
+        ).fetchone()
+        if not job:
+            cursor.execute("COMMIT")
+            return None
+        cursor.execute("""
+            UPDATE ingest_jobs
+            SET status = 'running', attempts = attempts + 1, error = NULL,
+                started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE job_id = ?
+        """, (job["job_id"],))
+        cursor.execute("COMMIT")
+        return dict(job)
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def update_ingest_job_progress(job_id, **progress):
+    """Record progress counters for a running job (also acts as a heartbeat)"""
+    fields = [k for k in progress if k in INGEST_JOB_PROGRESS_FIELDS]
+    assignments = "".join(f"{k} = ?, " for k in fields)
+    conn = get_db_connection()
+    conn.execute(
+        f"UPDATE ingest_jobs SET {assignments}updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+        [progress[k] for k in fields] + [job_id]
+    )
+    conn.commit()
+    conn.close()
+
+def finish_ingest_job(job_id, status, duration_seconds=None, error=None):
+    """Mark a job as 'done', 'failed' or 'cancelled' (a cancelled job stays cancelled)"""
+    conn = get_db_connection()
+    conn.execute("""
+        UPDATE ingest_jobs
+        SET status = ?, error = ?, duration_seconds = ?,
+            finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE job_id = ? AND status != 'cancelled'
+    """, (status, error, duration_seconds, job_id))
+    conn.commit()
+    conn.close()
+
+def requeue_stale_ingest_jobs(stale_seconds):
+    """Put 'running' jobs whose heartbeat is older than stale_seconds back in the queue"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE ingest_jobs
+        SET status = 'queued', updated_at = CURRENT_TIMESTAMP
+        WHERE status = 'running' AND updated_at <= datetime('now', ?)
+    """, (f"-{int(stale_seconds)} seconds",))
+    requeued = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return requeued
+
+def get_ingest_job(job_id):
+    """Get a single ingestion job"""
+    conn = get_db_connection()
+    job = conn.execute("SELECT * FROM ingest_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    conn.close()
+    return dict(job) if job else None
+
+def get_module_ingest_jobs(module_id, limit=100):
+    """Get the most recent ingestion jobs for a module"""
+    conn = get_db_connection()
+    jobs = conn.execute("""
+        SELECT * FROM ingest_jobs
+        WHERE module_id = ?
+        ORDER BY job_id DESC
+        LIMIT ?
+    """, (module_id, limit)).fetchall()
+    conn.close()
+    return [dict(job) for job in jobs]
+
+def create_upload_session(upload_id, user_id, uploaded_by, module_id, team_id, title, filename,
+                          total_size, part_size, total_parts, expires_at):
+    """Record a new resumable upload session"""
+    conn = get_db_connection()
+    conn.execute("""
+        INSERT INTO upload_sessions (upload_id, user_id, uploaded_by, module_id, team_id, title, filename,
+                                     total_size, part_size, total_parts, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (upload_id, user_id, uploaded_by, module_id, team_id, title, filename,
+          total_size, part_size, total_parts, expires_at))
+    conn.commit()
+    conn.close()
+
+def get_upload_session(upload_id):
+    conn = get_db_connection()
+    session = conn.execute("SELECT * FROM upload_sessions WHERE upload_id = ?", (upload_id,)).fetchone()
+    conn.close()
+    return dict(session) if session else None
+
+def claim_upload_session(upload_id):
+    """Atomically move an open session to 'finalizing' so it is assembled only once"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE upload_sessions SET status = 'finalizing' WHERE upload_id = ? AND status = 'open'", (upload_id,))
+    claimed = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return claimed
+
+def update_upload_session(upload_id, status, document_id=None):
+    conn = get_db_connection()
+    conn.execute(
+        "UPDATE upload_sessions SET status = ?, document_id = COALESCE(?, document_id) WHERE upload_id = ?",
+        (status, document_id, upload_id)
+    )
+    conn.commit()
+    conn.close()
+
+def expire_upload_sessions(now):
+    """Mark open sessions past their expiry as 'expired' and return their ids"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    rows = cursor.execute(
+        "SELECT upload_id FROM upload_sessions WHERE status = 'open' AND expires_at < ?", (now,)
+    ).fetchall()
+    expired = [row["upload_id"] for row in rows]
+    cursor.executemany("UPDATE upload_sessions SET status = 'expired' WHERE upload_id = ?", [(u,) for u in expired])
+    cursor.execute("COMMIT")
+    conn.close()
+    return expired
+
+# Answer Library Functions
+def add_library_entry(team_id, question, answer, created_by=None):
+    """Store an approved Q&A pair for a team and return its entry id"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO answer_library (team_id, question, answer, created_by) VALUES (?, ?, ?, ?)",
+        (team_id, question, answer, created_by)
+    )
+    entry_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return entry_id
+
+def update_library_entry(entry_id, question=None, answer=None, enabled=None):
+    """Change an entry's question, answer and/or enabled flag"""
+    conn = get_db_connection()
+    conn.execute("""
+        UPDATE answer_library
+        SET question = COALESCE(?, question), answer = COALESCE(?, answer), enabled = COALESCE(?, enabled),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE entry_id = ?
+    """, (question, answer, None if enabled is None else int(bool(enabled)), entry_id))
+    conn.commit()
+    conn.close()
+
+def delete_library_entry(entry_id):
+    conn = get_db_connection()
+    conn.execute("DELETE FROM answer_library WHERE entry_id = ?", (entry_id,))
+    conn.commit()
+    conn.close()
+
+def get_library_entry(entry_id):
+    conn = get_db_connection()
+    row = conn.execute("SELECT * FROM answer_library WHERE entry_id = ?", (entry_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def get_library_entries(team_id):
+    conn = get_db_connection()
+    rows = conn.execute("SELECT * FROM answer_library WHERE team_id = ? ORDER BY entry_id", (team_id,)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
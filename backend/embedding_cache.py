@@ -0,0 +1,188 @@
+"""
+embedding_cache.py - Persistent content-hash embedding cache
+
+Vectors are stored as float32 blobs in a small SQLite database keyed by
+sha256(model, dimension, sha256(normalized text or raw image bytes)), so
+re-ingesting a document that was seen before costs no embedding calls.
+The cache is size-bounded and evicts least-recently-used entries.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", Path(__file__).parent / "embedding_cache.db"))
+CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024")) * 1024 * 1024
+CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") != "0"
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Normalization applied before hashing text (unicode NFC, collapsed whitespace)"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", str(text))).strip()
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+
+def bytes_digest(data: bytes) -> bytes:
+    return hashlib.sha256(data).digest()
+
+class EmbeddingCache:
+    """Disk-backed LRU cache of embedding vectors"""
+
+    def __init__(self, path: Path = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._bytes = conn.execute("SELECT COALESCE(SUM(length(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, dim: int, digest: bytes) -> bytes:
+        return hashlib.sha256(f"{model}:{dim}:".encode("utf-8") + digest).digest()
+
+    def get_many(self, model: str, dim: int, digests: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """Look up vectors for content digests; misses are None"""
+        if not digests:
+            return []
+        keys = [self.make_key(model, dim, d) for d in digests]
+        found: Dict[bytes, np.ndarray] = {}
+        conn = self._conn()
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        if found:
+            now = time.time()
+            conn.execute("BEGIN")
+            conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            conn.execute("COMMIT")
+        results = [found.get(k) for k in keys]
+        with self._lock:
+            hits = sum(1 for r in results if r is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, dim: int, items: Sequence[tuple[bytes, Sequence[float]]]):
+        """Store (digest, vector) pairs"""
+        rows = {}  # by key: a repeated digest stores its last vector once
+        now = time.time()
+        for digest, vector in items:
+            key = self.make_key(model, dim, digest)
+            rows[key] = (key, model, dim, np.asarray(vector, dtype=np.float32).tobytes(), now)
+        if not rows:
+            return
+        keys = list(rows)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Replaced entries give back their old size, so re-storing a vector does not grow the total
+            replaced = 0
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                replaced += conn.execute(
+                    f"SELECT COALESCE(SUM(length(vector)), 0) FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchone()[0]
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)", rows.values()
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self._bytes += sum(len(r[3]) for r in rows.values()) - replaced
+            over = self._bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        """Drop least-recently-used entries until the cache is below 90% of max_bytes"""
+        with self._lock:
+            conn = self._conn()
+            total = conn.execute("SELECT COALESCE(SUM(length(vector)), 0) FROM embeddings").fetchone()[0]
+            target = int(self.max_bytes * 0.9)
+            while total > target:
+                rows = conn.execute(
+                    "SELECT key, length(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+                ).fetchall()
+                if not rows:
+                    break
+                drop, freed = [], 0
+                for key, size in rows:
+                    drop.append((key,))
+                    freed += size
+                    if total - freed <= target:
+                        break
+                conn.executemany("DELETE FROM embeddings WHERE key = ?", drop)
+                total -= freed
+            self._bytes = total
+            log.info(f"Embedding cache evicted down to {total / 1024 / 1024:.1f} MB")
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> Optional[EmbeddingCache]:
+    """Process-wide cache instance (None when disabled or unavailable)"""
+    global _cache, CACHE_ENABLED
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = EmbeddingCache()
+                except Exception as e:
+                    log.warning(f"Embedding cache disabled - could not open {CACHE_PATH}: {e}")
+                    CACHE_ENABLED = False
+                    return None
+    return _cache
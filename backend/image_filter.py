@@ -0,0 +1,96 @@
+"""
+image_filter.py - Pre-embedding image stage: dedupe and junk filtering
+
+Documents repeat the same logo or header image on every page, and PDFs are full of
+icons, rules and spacer images that carry no meaning for retrieval. ImageFilter drops
+those before they are CLIP-embedded and upserted:
+
+  - exact duplicates (sha256 of the bytes) within a document
+  - optionally, near-duplicates by perceptual dHash within a document
+  - images smaller than IMAGE_MIN_SIDE / IMAGE_MIN_PIXELS or more elongated than IMAGE_MAX_ASPECT
+
+Repeated PDF xrefs are skipped earlier, before extraction, in semantic_indexing. Across
+documents, identical images share one image store blob and one cached CLIP vector.
+Dimensions are read from the image header, so rejected images are never decoded, and
+oversized JPEGs are draft-decoded at reduced scale (IMAGE_DECODE_SIDE) before CLIP.
+"""
+import io
+import os
+import hashlib
+from typing import List, Optional
+
+from PIL import Image
+
+IMAGE_MIN_SIDE = int(os.getenv("IMAGE_MIN_SIDE", "48"))  # px; smaller images are icons/bullets
+IMAGE_MIN_PIXELS = int(os.getenv("IMAGE_MIN_PIXELS", str(96 * 96)))
+IMAGE_MAX_ASPECT = float(os.getenv("IMAGE_MAX_ASPECT", "8"))  # long side / short side; above this are rules and bars
+IMAGE_DEDUPE_PHASH = os.getenv("IMAGE_DEDUPE_PHASH", "0") == "1"  # also drop near-duplicates by perceptual hash
+IMAGE_PHASH_DISTANCE = int(os.getenv("IMAGE_PHASH_DISTANCE", "4"))  # max differing bits for a near-duplicate
+IMAGE_DECODE_SIDE = int(os.getenv("IMAGE_DECODE_SIDE", "448"))  # JPEGs are draft-decoded down to about this size
+
+def image_size(data: bytes) -> Optional[tuple[int, int]]:
+    """(width, height) from the image header without decoding pixels (None if unreadable)"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size
+    except Exception:
+        return None
+
+def dhash(data: bytes, hash_size: int = 8) -> Optional[int]:
+    """64-bit difference hash of an image (None if undecodable)"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # draft() lets JPEGs decode at a fraction of full resolution
+            img.draft("L", (hash_size * 4, hash_size * 4))
+            pixels = list(img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR).getdata())
+    except Exception:
+        return None
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+class ImageFilter:
+    """Per-document filter deciding which extracted images are worth embedding"""
+
+    def __init__(self, use_phash: bool = IMAGE_DEDUPE_PHASH):
+        self.use_phash = use_phash
+        self._seen_digests: set[bytes] = set()
+        self._seen_hashes: List[int] = []
+        self.stats = {"accepted": 0, "duplicate": 0, "near_duplicate": 0, "too_small": 0, "bad_aspect": 0, "unreadable": 0}
+
+    def _reject(self, reason: str) -> bool:
+        self.stats[reason] += 1
+        return False
+
+    def accept(self, data: bytes) -> bool:
+        """True if the image should be embedded; records it so later copies are rejected"""
+        digest = hashlib.sha256(data).digest()
+        if digest in self._seen_digests:
+            return self._reject("duplicate")
+
+        size = image_size(data)
+        if size is None:
+            return self._reject("unreadable")
+        width, height = size
+        if min(width, height) < IMAGE_MIN_SIDE or width * height < IMAGE_MIN_PIXELS:
+            self._seen_digests.add(digest)
+            return self._reject("too_small")
+        if max(width, height) / max(1, min(width, height)) > IMAGE_MAX_ASPECT:
+            self._seen_digests.add(digest)
+            return self._reject("bad_aspect")
+
+        if self.use_phash:
+            value = dhash(data)
+            if value is not None:
+                if any(bin(value ^ seen).count("1") <= IMAGE_PHASH_DISTANCE for seen in self._seen_hashes):
+                    self._seen_digests.add(digest)
+                    return self._reject("near_duplicate")
+                self._seen_hashes.append(value)
+
+        self._seen_digests.add(digest)
+        self.stats["accepted"] += 1
+        return True
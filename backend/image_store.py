@@ -0,0 +1,69 @@
+"""
+image_store.py - Content-addressed on-disk store for extracted document images
+
+Each image is written once as image_store/<aa>/<bb>/<sha256>, where aa/bb are the
+first two byte pairs of its hex digest. Qdrant payloads only carry the hash,
+dimensions and mime type; the bytes are served by /api/images/{sha256}.
+"""
+import io
+import os
+import re
+import uuid
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+IMAGE_STORE_PATH = Path(os.getenv("IMAGE_STORE_PATH", Path(__file__).parent / "image_store"))
+
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+def image_path(sha256: str) -> Optional[Path]:
+    """Location of a stored image (None for a malformed hash)"""
+    sha256 = sha256.lower()
+    if not _SHA256_HEX.match(sha256):
+        return None
+    return IMAGE_STORE_PATH / sha256[:2] / sha256[2:4] / sha256
+
+def describe_image(data: bytes) -> dict:
+    """Width, height and mime type from the image header (no full decode)"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return {
+                "width": img.width,
+                "height": img.height,
+                "mime": Image.MIME.get(img.format, "application/octet-stream"),
+            }
+    except Exception:
+        return {"width": None, "height": None, "mime": "application/octet-stream"}
+
+def put_image(data: bytes, sha256: Optional[str] = None) -> dict:
+    """Store image bytes (idempotent) and return {sha256, width, height, mime, size}"""
+    sha256 = sha256 or hashlib.sha256(data).hexdigest()
+    path = image_path(sha256)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{sha256}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return {"sha256": sha256, "size": len(data), **describe_image(data)}
+
+def get_image(sha256: str) -> Optional[bytes]:
+    path = image_path(sha256)
+    if path is None or not path.exists():
+        return None
+    return path.read_bytes()
+
+def image_mime(sha256: str) -> str:
+    """Sniff the mime type of a stored image"""
+    path = image_path(sha256)
+    try:
+        with Image.open(path) as img:
+            return Image.MIME.get(img.format, "application/octet-stream")
+    except Exception:
+        return "application/octet-stream"
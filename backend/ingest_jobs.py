@@ -0,0 +1,142 @@
+"""
+ingest_jobs.py - Background ingestion workers backed by the ingest_jobs SQLite table
+
+Uploads enqueue a job and return immediately; a small pool of worker threads claims
+queued jobs and runs semantic_indexing.ingest() off the request path. Jobs survive
+restarts because the queue lives in the database.
+"""
+import os
+import time
+import logging
+import threading
+
+from db import (create_ingest_job, claim_next_ingest_job, update_ingest_job_progress,
+                finish_ingest_job, requeue_stale_ingest_jobs, document_exists)
+
+log = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))  # concurrent ingestion jobs per process
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "2"))
+INGEST_JOB_STALE_SECONDS = int(os.getenv("INGEST_JOB_STALE_SECONDS", "900"))  # requeue 'running' jobs with no heartbeat
+PROGRESS_MIN_INTERVAL = 0.5  # seconds between progress writes for a single job
+
+_wakeup = threading.Event()
+_stop = threading.Event()
+_workers: list[threading.Thread] = []
+
+def enqueue_ingest(document_id, module_id, file_path, title=None, team_id=None, source_document_id=None):
+    """Persist an ingestion job and wake a worker. Returns the job id.
+    With source_document_id (a duplicate upload) the worker copies that document's points."""
+    job_id = create_ingest_job(document_id, module_id, file_path, title, team_id, source_document_id)
+    _wakeup.set()
+    log.info(f"Queued ingest job {job_id} for document {document_id} (module={module_id})")
+    return job_id
+
+def progress_reporter(job_id):
+    """Build a throttled progress callback for semantic_indexing.ingest() and its flush().
+    The writes double as the job's heartbeat."""
+    state = {"last": 0.0, "pending": {}}
+
+    def report(**counters):
+        state["pending"].update(counters)
+        now = time.monotonic()
+        if now - state["last"] < PROGRESS_MIN_INTERVAL:
+            return
+        update_ingest_job_progress(job_id, **state["pending"])
+        state["pending"] = {}
+        state["last"] = now
+
+    def flush():
+        if state["pending"]:
+            update_ingest_job_progress(job_id, **state["pending"])
+            state["pending"] = {}
+
+    return report, flush
+
+def _discard_deleted(job, started):
+    """The document was deleted while its job ran: remove the points and keyword rows the job added"""
+    from semantic_indexing import delete_document_embeddings
+
+    log.info(f"Ingest job {job['job_id']}: document {job['document_id']} was deleted, discarding its index entries")
+    try:
+        delete_document_embeddings(job["document_id"])
+    finally:
+        finish_ingest_job(job["job_id"], "cancelled", duration_seconds=time.monotonic() - started, error="document deleted")
+
+def _run_job(job):
+    from semantic_indexing import ingest, clone_document_points
+
+    job_id = job["job_id"]
+    report, flush = progress_reporter(job_id)
+    started = time.monotonic()
+    if not document_exists(job["document_id"]):
+        finish_ingest_job(job_id, "cancelled", error="document deleted")
+        log.info(f"Ingest job {job_id} skipped: document {job['document_id']} was deleted")
+        return
+    log.info(f"Ingest job {job_id} started (document={job['document_id']}, attempt={job['attempts'] + 1})")
+    try:
+        stats = None
+        if job["source_document_id"]:
+            # Sources cite the document title; the stored file name may carry a uniqueness suffix
+            stats = clone_document_points(job["source_document_id"], job["document_id"], job["module_id"],
+                                          job["title"] or os.path.basename(job["file_path"]), job["team_id"])
+            if not stats["chunks"] and not stats["images"]:
+                log.info(f"Ingest job {job_id}: source document {job['source_document_id']} has no points, ingesting")
+                stats = None
+            else:
+                report(chunks_total=stats["chunks"], chunks_done=stats["chunks"],
+                       images_total=stats["images"], images_done=stats["images"])
+        if stats is None:
+            ingest(job["file_path"], job["document_id"], job["module_id"], job["title"], team_id=job["team_id"], progress=report)
+        flush()
+        # A delete that ran meanwhile removed the document before its embeddings, so this sees it
+        if not document_exists(job["document_id"]):
+            _discard_deleted(job, started)
+            return
+        finish_ingest_job(job_id, "done", duration_seconds=time.monotonic() - started)
+        log.info(f"Ingest job {job_id} finished in {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        if not document_exists(job["document_id"]):  # e.g. its file went with the document
+            _discard_deleted(job, started)
+            return
+        log.error(f"Ingest job {job_id} failed: {e}")
+        try:
+            flush()
+        finally:
+            finish_ingest_job(job_id, "failed", duration_seconds=time.monotonic() - started, error=str(e))
+
+def _worker_loop():
+    while not _stop.is_set():
+        try:
+            job = claim_next_ingest_job()
+        except Exception as e:
+            log.error(f"Failed to claim ingest job: {e}")
+            job = None
+        if job is None:
+            _wakeup.wait(INGEST_POLL_SECONDS)
+            _wakeup.clear()
+            continue
+        _run_job(job)
+
+def start_workers(concurrency: int | None = None):
+    """Start the ingestion worker threads (idempotent)"""
+    if _workers:
+        return
+    concurrency = INGEST_WORKERS if concurrency is None else concurrency
+    requeued = requeue_stale_ingest_jobs(INGEST_JOB_STALE_SECONDS)
+    if requeued:
+        log.info(f"Requeued {requeued} stale ingest jobs")
+    _stop.clear()
+    for i in range(max(1, concurrency)):
+        t = threading.Thread(target=_worker_loop, name=f"ingest-worker-{i}", daemon=True)
+        t.start()
+        _workers.append(t)
+    log.info(f"Started {len(_workers)} ingest workers")
+
+def stop_workers(timeout: float = 5.0):
+    """Signal workers to stop after their current job"""
+    _stop.set()
+    _wakeup.set()
+    for t in _workers:
+        t.join(timeout)
+    _workers.clear()
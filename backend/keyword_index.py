@@ -0,0 +1,179 @@
+"""
+keyword_index.py - SQLite FTS5 index of chunk text for exact-phrase and prefix lookups
+
+Vector search (dense or BM25) treats a part number, clause ID or `/api/...` path as loose
+tokens. Every text point _embed_and_upsert() writes is also stored here, keyed by point id
+with its doc_id, module_id and team_id, in an FTS5 index. retrieve() turns the precise terms
+of a question - quoted phrases, compound tokens such as XR-200B or /api/v2/users, tokens with
+digits and `prefix*` terms - into an FTS5 query and fuses the matches with the vector hits.
+
+Access control is part of the FTS5 query: each row carries scope tokens (m<module_id>,
+t<team_id>) in an indexed column, so a scoped lookup intersects posting lists instead of
+filtering matches afterwards, and stays in the milliseconds at millions of chunks.
+
+The index is a SQLite file shared by every worker process on the host; rebuild it from the
+vector store with `python semantic_indexing.py --rebuild-keyword-index`.
+"""
+import os
+import re
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+log = logging.getLogger(__name__)
+
+KEYWORD_INDEX_PATH = Path(os.getenv("KEYWORD_INDEX_PATH", Path(__file__).parent / "keyword_index.db"))
+KEYWORD_INDEX_ENABLED = os.getenv("KEYWORD_INDEX", "1") != "0"
+
+_TERM = re.compile(r'"([^"]+)"|(\w+(?:[-./:#]\w+)*)(\*?)')
+_PART = re.compile(r"[^\W_]+")  # unicode61 token characters
+
+def match_expression(question: str) -> Optional[str]:
+    """FTS5 query for the precise terms of a question (None when it has none): quoted phrases,
+    compound tokens and tokens with digits as phrases, `term*` as prefix phrases, OR'ed"""
+    phrases = []
+    for match in _TERM.finditer(str(question or "")):
+        quoted, token, star = match.groups()
+        parts = _PART.findall((quoted or token).lower())
+        precise = quoted or star or len(parts) > 1 or (any(c.isdigit() for c in token) and len(token) > 1)
+        if parts and precise:
+            phrase = '"' + " ".join(parts) + '"' + ("*" if star else "")
+            if phrase not in phrases:
+                phrases.append(phrase)
+    return " OR ".join(phrases) if phrases else None
+
+def scope_tokens(module_id: int | None, team_id: int | None) -> str:
+    return " ".join(token for token in (f"m{int(module_id)}" if module_id is not None else None,
+                                        f"t{int(team_id)}" if team_id is not None else None) if token)
+
+def scope_expression(module_id: int | None = None, team_id: int | None = None,
+                     user_team_ids: Sequence[int] | None = None) -> Optional[str]:
+    """FTS5 column filter mirroring the access filter retrieve() applies (None = unscoped)"""
+    if module_id is not None:
+        return f"scope : m{int(module_id)}"
+    if team_id is not None:
+        return f"scope : t{int(team_id)}"
+    if user_team_ids:
+        return "scope : (" + " OR ".join(f"t{int(t)}" for t in sorted({int(t) for t in user_team_ids})) + ")"
+    return None
+
+class KeywordIndex:
+    """Chunk text table with an external-content FTS5 index kept in sync by triggers"""
+
+    def __init__(self, path: Path = KEYWORD_INDEX_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                point_id TEXT NOT NULL UNIQUE,
+                doc_id TEXT NOT NULL,
+                doc_title TEXT,
+                module_id INTEGER,
+                team_id INTEGER,
+                scope TEXT NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks (doc_id);
+            CREATE INDEX IF NOT EXISTS idx_chunks_module_id ON chunks (module_id);
+            CREATE INDEX IF NOT EXISTS idx_chunks_team_id ON chunks (team_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                text, scope, content='chunks', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            );
+            CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, text, scope) VALUES (new.rowid, new.text, new.scope);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, text, scope) VALUES ('delete', old.rowid, old.text, old.scope);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, text, scope) VALUES ('delete', old.rowid, old.text, old.scope);
+                INSERT INTO chunks_fts (rowid, text, scope) VALUES (new.rowid, new.text, new.scope);
+            END;
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql: str, rows: Iterable[tuple]):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add(self, points: Iterable[Dict]):
+        """Insert or replace chunks; each dict has point_id, text, doc_id, doc_title, module_id, team_id"""
+        self._write(
+            "INSERT INTO chunks (point_id, doc_id, doc_title, module_id, team_id, scope, text) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(point_id) DO UPDATE SET doc_id = excluded.doc_id, doc_title = excluded.doc_title, "
+            "module_id = excluded.module_id, team_id = excluded.team_id, scope = excluded.scope, text = excluded.text",
+            [(str(p["point_id"]), str(p["doc_id"]), p.get("doc_title"), p.get("module_id"), p.get("team_id"),
+              scope_tokens(p.get("module_id"), p.get("team_id")), p["text"]) for p in points],
+        )
+
+    def update_document_fields(self, point_ids: Iterable, doc_title: Optional[str], module_id: int | None, team_id: int | None):
+        """Set the title and scope of stored chunks (a re-ingest keeps its unchanged chunks)"""
+        self._write("UPDATE chunks SET doc_title = ?, module_id = ?, team_id = ?, scope = ? WHERE point_id = ?",
+                    [(doc_title, module_id, team_id, scope_tokens(module_id, team_id), str(p)) for p in point_ids])
+
+    def delete_points(self, point_ids: Iterable):
+        self._write("DELETE FROM chunks WHERE point_id = ?", [(str(p),) for p in point_ids])
+
+    def delete_where(self, doc_id=None, module_id: int | None = None, team_id: int | None = None):
+        """Drop the chunks of a document, module or team"""
+        column, value = (("doc_id", str(doc_id)) if doc_id is not None else
+                         ("module_id", int(module_id)) if module_id is not None else ("team_id", int(team_id)))
+        self._write(f"DELETE FROM chunks WHERE {column} = ?", [(value,)])
+
+    def clear(self):
+        self._write("DELETE FROM chunks", [()])
+
+    def search(self, expression: str, scope: Optional[str] = None, limit: int = 24) -> List[Dict]:
+        """Best matches for an FTS5 expression within a scope filter, as {point_id, score, payload}.
+        The expression only matches the text column: question terms such as "m12" are scope tokens too."""
+        query = f"text : ({expression})"
+        query = f"{scope} AND {query}" if scope else query
+        rows = self._conn().execute(
+            "SELECT c.point_id, c.doc_id, c.doc_title, c.module_id, c.team_id, c.text, bm25(chunks_fts, 1.0, 0.0) AS score "
+            "FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid WHERE chunks_fts MATCH ? "
+            "ORDER BY score LIMIT ?", (query, limit)
+        ).fetchall()
+        return [{"point_id": point_id, "score": -score,
+                 "payload": {"type": "text", "text": text, "doc_id": doc_id, "doc_title": doc_title,
+                             "module_id": module_id, "team_id": team_id}}
+                for point_id, doc_id, doc_title, module_id, team_id, text, score in rows]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+_keyword_index: Optional[KeywordIndex] = None
+_keyword_index_lock = threading.Lock()
+
+def get_keyword_index() -> Optional[KeywordIndex]:
+    """Process-wide keyword index (None when disabled or unavailable)"""
+    global _keyword_index, KEYWORD_INDEX_ENABLED
+    if not KEYWORD_INDEX_ENABLED:
+        return None
+    if _keyword_index is None:
+        with _keyword_index_lock:
+            if _keyword_index is None:
+                try:
+                    _keyword_index = KeywordIndex()
+                except Exception as e:
+                    log.warning(f"Keyword index disabled - could not open {KEYWORD_INDEX_PATH}: {e}")
+                    KEYWORD_INDEX_ENABLED = False
+                    return None
+    return _keyword_index
@@ -0,0 +1,87 @@
+"""
+pdf_extract.py - Page-parallel PDF text extraction
+
+Large PDFs are split into page ranges that a process pool extracts concurrently,
+each worker opening the file with fitz.open independently. Results are yielded
+in page order as (page_no, text, image_xrefs); image bytes are pulled by the
+caller from its own document handle so they are not pickled across processes.
+Small files are extracted sequentially in-process.
+
+Kept free of heavy imports so pool workers start quickly.
+"""
+import os
+import sys
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+import fitz  # PyMuPDF
+
+PARALLEL_EXTRACT_MIN_PAGES = int(os.getenv("PARALLEL_EXTRACT_MIN_PAGES", "64"))  # below this, extract sequentially
+EXTRACT_PROCESSES = int(os.getenv("EXTRACT_PROCESSES", str(os.cpu_count() or 1)))
+EXTRACT_PAGES_PER_TASK = int(os.getenv("EXTRACT_PAGES_PER_TASK", "16"))
+# Never "fork": forking the threaded server copies locks held by other threads into the workers
+EXTRACT_MP_START = os.getenv("EXTRACT_MP_START", "spawn" if sys.platform == "win32" else "forkserver")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[tuple[int, str, List[int]]]:
+    """Worker: extract pages [start, stop) as (page_no, text, image xrefs), page_no 1-based"""
+    pages = []
+    doc = fitz.open(file_path)
+    try:
+        for index in range(start, min(stop, len(doc))):
+            page = doc[index]
+            pages.append((index + 1, page.get_text(), [img[0] for img in page.get_images(full=True)]))
+    finally:
+        doc.close()
+    return pages
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=EXTRACT_PROCESSES,
+                    mp_context=multiprocessing.get_context(EXTRACT_MP_START),
+                )
+    return _pool
+
+def shutdown_pool():
+    """Stop the extraction worker processes (they are restarted on demand)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def iter_pdf_pages(file_path: str, page_count: int, processes: Optional[int] = None) -> Iterator[tuple[int, str, List[int]]]:
+    """Yield (page_no, text, image xrefs) for every page of a PDF, in page order"""
+    processes = EXTRACT_PROCESSES if processes is None else processes
+    if processes <= 1 or page_count < PARALLEL_EXTRACT_MIN_PAGES:
+        for start in range(0, page_count, EXTRACT_PAGES_PER_TASK):
+            yield from _extract_page_range(file_path, start, start + EXTRACT_PAGES_PER_TASK)
+        return
+
+    pool = _get_pool()
+    ranges = iter(range(0, page_count, EXTRACT_PAGES_PER_TASK))
+    in_flight = deque()
+    # Keep a bounded window of ranges in flight so results never pile up ahead of the consumer
+    for start in ranges:
+        in_flight.append(pool.submit(_extract_page_range, file_path, start, start + EXTRACT_PAGES_PER_TASK))
+        if len(in_flight) >= processes * 2:
+            break
+    try:
+        while in_flight:
+            pages = in_flight.popleft().result()
+            start = next(ranges, None)
+            if start is not None:
+                in_flight.append(pool.submit(_extract_page_range, file_path, start, start + EXTRACT_PAGES_PER_TASK))
+            yield from pages
+    finally:
+        for future in in_flight:
+            future.cancel()
@@ -0,0 +1,154 @@
+"""
+query_cache.py - In-process TTL/LRU cache of query embeddings
+
+retrieve() embeds every question twice (OpenAI text space and CLIP text space). Teams
+ask the same questions many times a day, so query vectors are cached in memory keyed by
+(model, normalized question) - casefolded, NFC, collapsed whitespace. Embeddings do not
+depend on module/team scope, so one entry serves every tenant. Entries expire after
+QUERY_CACHE_TTL seconds and the least recently used are evicted past QUERY_CACHE_MAX_MB.
+
+With QUERY_CACHE_SHARED=1 (default) misses fall through to the persistent embedding cache
+(embedding_cache.py), which is shared by every worker process on the host, and computed
+vectors are written back to it.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, get_cache, normalize_text
+
+log = logging.getLogger(__name__)
+
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE", "1") != "0"
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "86400"))  # seconds an in-memory entry stays valid
+QUERY_CACHE_MAX_BYTES = int(float(os.getenv("QUERY_CACHE_MAX_MB", "64")) * 1024 * 1024)
+QUERY_CACHE_SHARED = os.getenv("QUERY_CACHE_SHARED", "1") != "0"  # fall back to the persistent embedding cache
+
+def normalize_query(query: str) -> str:
+    """Key form of a question: embedding_cache normalization, casefolded"""
+    return normalize_text(query).casefold()
+
+def query_digest(query: str) -> bytes:
+    """Content digest of a normalized question (namespaced apart from chunk text digests)"""
+    return hashlib.sha256(b"query:" + normalize_query(query).encode("utf-8")).digest()
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of query vectors with a TTL, a byte bound and an optional shared tier"""
+
+    def __init__(self, ttl: float = QUERY_CACHE_TTL, max_bytes: int = QUERY_CACHE_MAX_BYTES,
+                 shared: Optional[EmbeddingCache] = None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries: "OrderedDict[tuple[str, str], tuple[float, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.shared_hits = self.misses = self.expired = self.evictions = 0
+
+    def get(self, model: str, dim: int, query: str) -> Optional[list]:
+        """Cached vector for a question, or None"""
+        key = (model, normalize_query(query))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1].tolist()
+                self._drop(key)
+                self.expired += 1
+        vector = self._get_shared(model, dim, query)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self._put_local(key, vector)
+        return vector.tolist()
+
+    def put(self, model: str, dim: int, query: str, vector: Sequence[float]):
+        """Cache a computed vector (in memory and, if configured, in the shared tier)"""
+        if vector is None or len(vector) == 0:
+            return
+        array = np.asarray(vector, dtype=np.float32)
+        self._put_local((model, normalize_query(query)), array)
+        if self.shared is not None:
+            try:
+                self.shared.put_many(model, dim, [(query_digest(query), array)])
+            except Exception as e:
+                log.warning(f"Shared query cache write failed: {e}")
+
+    def get_or_compute(self, model: str, dim: int, query: str, compute: Callable[[str], Optional[Sequence[float]]]):
+        """Cached vector, or compute(query) stored on the way out (failures, None/[], are not cached)"""
+        vector = self.get(model, dim, query)
+        if vector is None:
+            vector = compute(query)
+            if vector:
+                self.put(model, dim, query, vector)
+        return vector
+
+    def _get_shared(self, model: str, dim: int, query: str) -> Optional[np.ndarray]:
+        if self.shared is None:
+            return None
+        try:
+            return self.shared.get_many(model, dim, [query_digest(query)])[0]
+        except Exception as e:
+            log.warning(f"Shared query cache read failed: {e}")
+            return None
+
+    def _put_local(self, key: tuple[str, str], vector: np.ndarray):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, vector)
+            self._bytes += vector.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "shared": self.shared is not None,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": ((self.hits + self.shared_hits) / lookups) if lookups else 0.0,
+            }
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache() -> Optional[QueryEmbeddingCache]:
+    """Process-wide query embedding cache (None when disabled)"""
+    global _query_cache
+    if not QUERY_CACHE_ENABLED:
+        return None
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryEmbeddingCache(shared=get_cache() if QUERY_CACHE_SHARED else None)
+    return _query_cache
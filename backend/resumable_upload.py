@@ -0,0 +1,182 @@
+"""
+resumable_upload.py - Resumable chunked uploads for very large files
+
+Protocol (endpoints in server.py):
+  POST   /api/uploads                       create a session -> upload_id, part_size, total_parts
+  PUT    /api/uploads/{id}/parts/{n}        raw bytes of part n (1-based), any order, in parallel
+  GET    /api/uploads/{id}                  which parts are present / missing
+  POST   /api/uploads/{id}/complete         assemble the parts and queue ingestion
+  DELETE /api/uploads/{id}                  abort
+
+Parts are stored as individual files under uploads/.sessions/<upload_id>/ so a dropped
+connection only loses the part in flight. On completion they are concatenated with
+os.copy_file_range (in-kernel, zero-copy) where available. Sessions that are not completed
+within UPLOAD_SESSION_TTL_HOURS are garbage-collected with their parts.
+"""
+import os
+import re
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import AsyncIterator, List
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException
+
+from db import expire_upload_sessions
+from upload_storage import UPLOAD_DIR, MAX_UPLOAD_BYTES
+
+log = logging.getLogger(__name__)
+
+SESSIONS_DIR = Path(UPLOAD_DIR) / ".sessions"
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_MB", "8")) * 1024 * 1024  # default part size
+UPLOAD_PART_MAX_SIZE = int(os.getenv("UPLOAD_PART_MAX_MB", "64")) * 1024 * 1024
+UPLOAD_SESSION_TTL_SECONDS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24")) * 3600
+UPLOAD_MIN_PART_SIZE = 256 * 1024
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+def new_upload_id() -> str:
+    return uuid.uuid4().hex
+
+def session_dir(upload_id: str) -> Path:
+    if not _UPLOAD_ID.match(upload_id):
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return SESSIONS_DIR / upload_id
+
+def plan_parts(total_size: int, part_size: int | None = None) -> tuple[int, int]:
+    """Validate the declared size and pick (part_size, total_parts)"""
+    if total_size <= 0:
+        raise HTTPException(status_code=400, detail="total_size must be positive")
+    if total_size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit")
+    part_size = min(max(part_size or UPLOAD_PART_SIZE, UPLOAD_MIN_PART_SIZE), UPLOAD_PART_MAX_SIZE)
+    return part_size, -(-total_size // part_size)
+
+def expected_part_size(session: dict, part_number: int) -> int:
+    if not 1 <= part_number <= session["total_parts"]:
+        raise HTTPException(status_code=400, detail=f"Part number must be between 1 and {session['total_parts']}")
+    if part_number < session["total_parts"]:
+        return session["part_size"]
+    return session["total_size"] - session["part_size"] * (session["total_parts"] - 1)
+
+def _part_path(upload_id: str, part_number: int) -> Path:
+    return session_dir(upload_id) / f"part-{part_number:06d}"
+
+async def write_part(session: dict, part_number: int, body: AsyncIterator[bytes]) -> dict:
+    """Stream one part to disk; re-sending a part replaces it. Returns {part_number, size, sha256}."""
+    expected = expected_part_size(session, part_number)
+    directory = session_dir(session["upload_id"])
+    await aiofiles.os.makedirs(directory, exist_ok=True)
+    final = _part_path(session["upload_id"], part_number)
+    tmp = directory / f".{final.name}.{uuid.uuid4().hex}.part"
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp, "wb") as out:
+            async for chunk in body:
+                size += len(chunk)
+                if size > expected:
+                    raise HTTPException(status_code=400, detail=f"Part {part_number} must be {expected} bytes")
+                digest.update(chunk)
+                await out.write(chunk)
+        if size != expected:
+            raise HTTPException(status_code=400, detail=f"Part {part_number} must be {expected} bytes, got {size}")
+        await aiofiles.os.replace(tmp, final)
+    except BaseException:
+        try:
+            await aiofiles.os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return {"part_number": part_number, "size": size, "sha256": digest.hexdigest()}
+
+def present_parts(session: dict) -> List[int]:
+    """Part numbers that are completely on disk"""
+    directory = session_dir(session["upload_id"])
+    if not directory.exists():
+        return []
+    present = []
+    for entry in os.scandir(directory):
+        if not entry.name.startswith("part-"):
+            continue
+        number = int(entry.name[5:])
+        if 1 <= number <= session["total_parts"] and entry.stat().st_size == expected_part_size(session, number):
+            present.append(number)
+    return sorted(present)
+
+def _append_file(src, dst, size: int):
+    """Append src to dst in-kernel when possible (copy_file_range, then sendfile), else by buffered copy"""
+    offset = 0
+    for copy in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+        if copy is None:
+            continue
+        try:
+            while offset < size:
+                if copy is os.sendfile:
+                    copied = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+                else:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), size - offset, offset)
+                if copied == 0:
+                    break
+                offset += copied
+            if offset == size:
+                return
+        except OSError:
+            pass  # e.g. cross-device or unsupported filesystem; resume with the next method
+    src.seek(offset)
+    dst.seek(0, os.SEEK_END)
+    shutil.copyfileobj(src, dst, 1 << 20)
+
+def assemble(session: dict, file_location: str) -> dict:
+    """Concatenate all parts into file_location (atomically) and remove the session directory.
+    Blocking - run it in a worker thread. Returns {file_path, sha256, size}."""
+    missing = sorted(set(range(1, session["total_parts"] + 1)) - set(present_parts(session)))
+    if missing:
+        raise HTTPException(status_code=409, detail=f"Missing parts: {missing[:20]}")
+    tmp = f"{file_location}.{uuid.uuid4().hex}.part"
+    try:
+        with open(tmp, "wb") as dst:
+            for number in range(1, session["total_parts"] + 1):
+                with open(_part_path(session["upload_id"], number), "rb") as src:
+                    _append_file(src, dst, expected_part_size(session, number))
+        size = os.path.getsize(tmp)
+        if size != session["total_size"]:
+            raise HTTPException(status_code=409, detail=f"Assembled size {size} does not match {session['total_size']}")
+        # Hash from the page cache right after assembly (needed for duplicate detection)
+        digest = hashlib.sha256()
+        with open(tmp, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        os.replace(tmp, file_location)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    discard_session(session["upload_id"])
+    return {"file_path": file_location, "sha256": digest.hexdigest(), "size": size}
+
+def discard_session(upload_id: str):
+    shutil.rmtree(session_dir(upload_id), ignore_errors=True)
+
+def gc_expired_sessions() -> int:
+    """Expire overdue sessions and delete their parts, plus part directories no session owns"""
+    expired = expire_upload_sessions(time.time())
+    for upload_id in expired:
+        discard_session(upload_id)
+    # Directories left behind (e.g. a crash between assembly and cleanup) age out by mtime
+    removed = len(expired)
+    if SESSIONS_DIR.exists():
+        cutoff = time.time() - UPLOAD_SESSION_TTL_SECONDS
+        for entry in os.scandir(SESSIONS_DIR):
+            if entry.is_dir() and entry.name not in expired and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+    if removed:
+        log.info(f"Garbage-collected {removed} expired upload sessions")
+    return removed
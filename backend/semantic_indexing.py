@@ -4,9 +4,10 @@ Fixed version addressing retrieval and filtering issues
 """
 from __future__ import annotations
 
-import io, os, ssl, uuid, logging, pathlib, argparse, sys, textwrap, re
-from dataclasses import dataclass
-from typing import List, Optional, Sequence, Dict
+import io, os, ssl, uuid, hashlib, logging, pathlib, argparse, sys, textwrap, re, queue, threading, time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Callable, Iterator, List, Optional, Sequence, Dict
 
 import numpy as np
 from PIL import Image
@@ -16,9 +17,19 @@ import tiktoken
 
 import torch
 import open_clip
-from qdrant_client import QdrantClient
 from qdrant_client.http import models as qmodels
-from openai import OpenAI
+from pdf_extract import iter_pdf_pages
+from image_store import put_image
+from image_filter import ImageFilter, IMAGE_DECODE_SIDE
+from chunking import Chunk, SentenceChunker, extract_entities, content_point_id
+from bm25 import BM25_VECTOR, document_vector, query_vector
+from keyword_index import get_keyword_index, match_expression, scope_expression
+from embedding_cache import get_cache, text_digest, bytes_digest
+from query_cache import get_query_cache
+from answer_cache import get_answer_cache, search_scopes, content_scopes, bump_index_versions, GLOBAL_SCOPE
+from vector_store import StoreProxy, store_manager, copy_collection
+from openai import OpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 from dotenv import load_dotenv
 
 # Configuration
@@ -27,16 +38,35 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
 log = logging.getLogger("mmRAG")
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-QDRANT_PATH = pathlib.Path(__file__).with_suffix("").parent / "qdrant_store"
 COLL_NAME = "documents"
 TXT_DIM = 1536
 IMG_DIM = 512
 
 OPENAI_EMB_MODEL = "text-embedding-3-small"
+CLIP_MODEL_NAME = "open_clip/ViT-B-32/laion2b_s34b_b79k"  # embedding cache namespace for CLIP vectors
+OPENAI_EMB_MAX_INPUT_TOKENS = 8191  # per-input limit of the embeddings endpoint
+OPENAI_EMB_BATCH_TOKENS = int(os.getenv("OPENAI_EMB_BATCH_TOKENS", "100000"))  # tokens per request (API max 300k)
+OPENAI_EMB_BATCH_INPUTS = int(os.getenv("OPENAI_EMB_BATCH_INPUTS", "512"))  # inputs per request (API max 2048)
+OPENAI_EMB_CONCURRENCY = int(os.getenv("OPENAI_EMB_CONCURRENCY", "4"))  # concurrent embedding requests
+OPENAI_EMB_RETRIES = int(os.getenv("OPENAI_EMB_RETRIES", "5"))
 OPENAI_CHAT_MODEL = "gpt-3.5-turbo"
 
 ALPHA_TEXT = 0.7  # weight for text space
 BETA_IMAGE = 0.3  # weight for image space
+GAMMA_SPARSE = float(os.getenv("GAMMA_SPARSE", "0.7"))  # weight for BM25 keyword matches
+DELTA_KEYWORD = float(os.getenv("DELTA_KEYWORD", "0.7"))  # weight for exact phrase/prefix matches (FTS5 keyword index)
+RRF_K = int(os.getenv("RRF_K", "60"))  # reciprocal rank fusion constant
+
+CLIP_BATCH_SIZE = int(os.getenv("CLIP_BATCH_SIZE", "16"))  # images per encode_image forward pass
+CLIP_DECODE_WORKERS = int(os.getenv("CLIP_DECODE_WORKERS", "4"))  # threads decoding/preprocessing images
+
+INGEST_UPSERT_BATCH = int(os.getenv("INGEST_UPSERT_BATCH", "64"))  # text chunks per embed + upsert round
+INGEST_IMAGE_BATCH = int(os.getenv("INGEST_IMAGE_BATCH", "32"))  # images per embed + upsert round
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))  # max items buffered between pipeline stages
+
+QUERY_EMBED_TIMEOUT = float(os.getenv("QUERY_EMBED_TIMEOUT", "8"))  # seconds retrieve() waits for the OpenAI query embedding
+CLIP_QUERY_TIMEOUT = float(os.getenv("CLIP_QUERY_TIMEOUT", "3"))  # seconds retrieve() waits for the CLIP text embedding
+QUERY_EMBED_WORKERS = int(os.getenv("QUERY_EMBED_WORKERS", "8"))  # threads embedding queries (two per in-flight question)
 
 # Global CLIP model variables
 _clip_model = _clip_pre = _clip_tok = None
@@ -71,43 +101,183 @@ _init_clip()
 enc_tok = tiktoken.get_encoding("cl100k_base")
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def openai_embed(texts: Sequence[str]) -> List[List[float]]:
-    """Batch embed using OpenAI API"""
+@retry(
+    retry=retry_if_exception_type((RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)),
+    wait=wait_random_exponential(multiplier=0.5, max=20),
+    stop=stop_after_attempt(OPENAI_EMB_RETRIES),
+    reraise=True,
+)
+def _openai_embed_request(inputs: List[str]) -> List[List[float]]:
+    """Single embeddings API call, retried with backoff on transient errors"""
+    response = openai_client.embeddings.create(
+        model=OPENAI_EMB_MODEL,
+        input=inputs,
+        encoding_format="float"
+    )
+    return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+def _openai_embed_isolating(batch: List[tuple[int, str]], results: List[List[float]]):
+    """Embed a batch into `results`; on failure bisect so only the bad inputs are dropped"""
     try:
-        text_list = [str(t).strip() for t in texts if t and str(t).strip()]
-        if not text_list:
-            return [[] for _ in texts]
-        
-        response = openai_client.embeddings.create(
-            model=OPENAI_EMB_MODEL,
-            input=text_list,
-            encoding_format="float"
-        )
-        embeds = [d.embedding for d in response.data]
-        
-        # Pad for any filtered-out texts
-        while len(embeds) < len(texts):
-            embeds.append([])
-        return embeds
+        vectors = _openai_embed_request([text for _, text in batch])
+        for (pos, _), vector in zip(batch, vectors):
+            results[pos] = vector
     except Exception as e:
-        log.error(f"OpenAI embedding error: {e}")
-        return [[] for _ in texts]
+        if len(batch) == 1:
+            log.error(f"OpenAI embedding error for input {batch[0][0]}: {e}")
+            return
+        log.warning(f"OpenAI embedding error for batch of {len(batch)} - bisecting: {e}")
+        mid = len(batch) // 2
+        _openai_embed_isolating(batch[:mid], results)
+        _openai_embed_isolating(batch[mid:], results)
 
-def clip_image_embed(image_bytes: bytes) -> Optional[List[float]]:
-    """Embed image using CLIP"""
-    if _clip_model is None:
-        return None
+def _pack_embedding_batches(items: List[tuple[int, str, int]]) -> List[List[tuple[int, str]]]:
+    """Greedily pack (position, text, n_tokens) items into token- and count-bounded batches"""
+    batches, current, current_tokens = [], [], 0
+    for pos, text, n_tokens in items:
+        if current and (current_tokens + n_tokens > OPENAI_EMB_BATCH_TOKENS or len(current) >= OPENAI_EMB_BATCH_INPUTS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append((pos, text))
+        current_tokens += n_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def openai_embed(texts: Sequence[str]) -> List[List[float]]:
+    """Batch embed using OpenAI API. Output is aligned with `texts`; blank or failed inputs get []"""
+    results: List[List[float]] = [[] for _ in texts]
+    positions = [i for i, t in enumerate(texts) if t and str(t).strip()]
+    if not positions:
+        return results
+
+    inputs = [str(texts[i]).strip() for i in positions]
+
+    # Serve previously embedded texts from the persistent cache
+    cache = get_cache()
+    if cache:
+        digests = [text_digest(t) for t in inputs]
+        cached = cache.get_many(OPENAI_EMB_MODEL, TXT_DIM, digests)
+        for pos, vector in zip(positions, cached):
+            if vector is not None:
+                results[pos] = vector.tolist()
+        # Embed each distinct missing text once; repeats are filled in afterwards
+        first_by_digest, repeats = {}, []
+        for k, vector in enumerate(cached):
+            if vector is None:
+                if digests[k] in first_by_digest:
+                    repeats.append((positions[k], positions[first_by_digest[digests[k]]]))
+                else:
+                    first_by_digest[digests[k]] = k
+        missing = list(first_by_digest.values())
+        positions = [positions[k] for k in missing]
+        inputs = [inputs[k] for k in missing]
+        digests = [digests[k] for k in missing]
+        if not positions:
+            return results
+
+    items = []
+    for pos, text, tokens in zip(positions, inputs, enc_tok.encode_ordinary_batch(inputs)):
+        if len(tokens) > OPENAI_EMB_MAX_INPUT_TOKENS:
+            tokens = tokens[:OPENAI_EMB_MAX_INPUT_TOKENS]
+            text = enc_tok.decode(tokens)
+        items.append((pos, text, len(tokens)))
+
+    batches = _pack_embedding_batches(items)
+    if len(batches) == 1:
+        _openai_embed_isolating(batches[0], results)
+    else:
+        with ThreadPoolExecutor(max_workers=OPENAI_EMB_CONCURRENCY) as pool:
+            list(pool.map(lambda batch: _openai_embed_isolating(batch, results), batches))
+
+    if cache:
+        for pos, first_pos in repeats:
+            results[pos] = results[first_pos]
+        try:
+            cache.put_many(OPENAI_EMB_MODEL, TXT_DIM,
+                           [(d, results[pos]) for pos, d in zip(positions, digests) if results[pos]])
+        except Exception as e:
+            log.warning(f"Embedding cache write failed: {e}")
+    return results
+
+def _clip_preprocess(image_bytes: bytes):
+    """Decode and preprocess one image into a CLIP input tensor (None if undecodable)"""
     try:
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        img_tensor = _clip_pre(img).unsqueeze(0).to(DEVICE)
-        with torch.no_grad():
-            image_features = _clip_model.encode_image(img_tensor)
-            vec = image_features.cpu().squeeze().tolist()
-        return vec
+        img = Image.open(io.BytesIO(image_bytes))
+        # Oversized JPEGs are decoded at reduced scale; CLIP only sees 224x224 anyway
+        img.draft("RGB", (IMAGE_DECODE_SIDE, IMAGE_DECODE_SIDE))
+        return _clip_pre(img.convert("RGB"))
     except Exception as e:
-        log.error(f"CLIP image embedding error: {e}")
+        log.error(f"CLIP image decode error: {e}")
         return None
 
+def clip_image_embed_batch(images: Sequence[bytes], batch_size: int = CLIP_BATCH_SIZE) -> tuple[np.ndarray, List[int]]:
+    """Embed images with CLIP in batches, decoding on a thread pool.
+
+    Returns (vectors, indices): a float32 array of shape (len(indices), IMG_DIM) and the
+    positions in `images` that were embedded (undecodable images are skipped).
+    """
+    if _clip_model is None or not images:
+        return np.zeros((0, IMG_DIM), dtype=np.float32), []
+
+    cache = get_cache()
+    if not cache:
+        return _clip_image_embed_uncached(images, batch_size)
+
+    digests = [bytes_digest(b) for b in images]
+    cached = cache.get_many(CLIP_MODEL_NAME, IMG_DIM, digests)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    new_vectors, new_indices = _clip_image_embed_uncached([images[i] for i in missing], batch_size)
+    if new_indices:
+        try:
+            cache.put_many(CLIP_MODEL_NAME, IMG_DIM, [(digests[missing[k]], v) for k, v in zip(new_indices, new_vectors)])
+        except Exception as e:
+            log.warning(f"Embedding cache write failed: {e}")
+        for k, vector in zip(new_indices, new_vectors):
+            cached[missing[k]] = vector
+
+    indices = [i for i, vector in enumerate(cached) if vector is not None]
+    if not indices:
+        return np.zeros((0, IMG_DIM), dtype=np.float32), []
+    return np.stack([cached[i] for i in indices]).astype(np.float32, copy=False), indices
+
+def _clip_image_embed_uncached(images: Sequence[bytes], batch_size: int) -> tuple[np.ndarray, List[int]]:
+    if not images:
+        return np.zeros((0, IMG_DIM), dtype=np.float32), []
+
+    batch_size = max(1, batch_size)
+    vectors, indices = [], []
+    with ThreadPoolExecutor(max_workers=CLIP_DECODE_WORKERS) as pool:
+        def submit(start):
+            return [(i, pool.submit(_clip_preprocess, images[i])) for i in range(start, min(start + batch_size, len(images)))]
+
+        pending = submit(0)
+        for start in range(0, len(images), batch_size):
+            current = pending
+            # Decode the next batch while this one goes through the model
+            pending = submit(start + batch_size) if start + batch_size < len(images) else []
+            decoded = [(i, f.result()) for i, f in current]
+            decoded = [(i, t) for i, t in decoded if t is not None]
+            if not decoded:
+                continue
+            try:
+                batch = torch.stack([t for _, t in decoded]).to(DEVICE)
+                with torch.inference_mode():
+                    feats = _clip_model.encode_image(batch)
+                vectors.append(feats.float().cpu().numpy())
+                indices.extend(i for i, _ in decoded)
+            except Exception as e:
+                log.error(f"CLIP image embedding error (batch of {len(decoded)}): {e}")
+
+    if not vectors:
+        return np.zeros((0, IMG_DIM), dtype=np.float32), []
+    return np.concatenate(vectors).astype(np.float32, copy=False), indices
+
+def clip_image_embed(image_bytes: bytes) -> Optional[List[float]]:
+    """Embed image using CLIP"""
+    vectors, indices = clip_image_embed_batch([image_bytes])
+    return vectors[0].tolist() if indices else None
+
 def clip_text_embed(text: str) -> Optional[List[float]]:
     """Embed text using CLIP (for cross-modal retrieval)"""
     if _clip_model is None:
@@ -122,187 +292,211 @@ def clip_text_embed(text: str) -> Optional[List[float]]:
         log.error(f"CLIP text embedding error: {e}")
         return None
 
-# Qdrant setup
-def _get_qdrant_client():
-    try:
-        return QdrantClient(path=str(QDRANT_PATH))
-    except RuntimeError as e:
-        if "already accessed by another instance" in str(e):
-            log.warning("Qdrant storage locked - retrying with force_disable_check_same_thread=True")
-            return QdrantClient(path=str(QDRANT_PATH), force_disable_check_same_thread=True)
-        raise
-
-qdrant = _get_qdrant_client()
-
-def _ensure_collection():
-    """Ensure Qdrant collection exists with proper vector configuration"""
-    collections = [c.name for c in qdrant.get_collections().collections]
+# Vector store: one shared client owned by store_manager (opened at app startup, see vector_store.py)
+qdrant = StoreProxy()
+
+# Payload indexes for the tenant/document filters of retrieve() and the deletes
+PAYLOAD_INDEXES = {
+    "module_id": qmodels.PayloadSchemaType.INTEGER,
+    "team_id": qmodels.PayloadSchemaType.INTEGER,
+    "doc_id": qmodels.PayloadSchemaType.KEYWORD,
+    "type": qmodels.PayloadSchemaType.KEYWORD,
+}
+
+# BM25 term weights of text chunks; the store applies IDF at query time
+SPARSE_VECTORS_CONFIG = {BM25_VECTOR: qmodels.SparseVectorParams(modifier=qmodels.Modifier.IDF)}
+_bm25_ready = False  # whether the collection has the BM25 sparse vector (set by _ensure_collection)
+BM25_MIGRATION_COLL = f"{COLL_NAME}_bm25_migration"  # staging collection of migrate_sparse_vectors()
+
+@store_manager.on_open
+def _ensure_collection(store):
+    """Ensure Qdrant collection exists with proper vector configuration and payload indexes"""
+    global _bm25_ready
+    collections = [c.name for c in store.get_collections().collections]
     if COLL_NAME not in collections:
         log.info("Creating Qdrant collection...")
-        qdrant.recreate_collection(
-            collection_name=COLL_NAME,
-            vectors_config={
-                "text": qmodels.VectorParams(size=TXT_DIM, distance="Cosine"),
-                "image": qmodels.VectorParams(size=IMG_DIM, distance="Cosine"),
-            },
-        )
-        return
-    
-    # Check if collection has correct vector config
-    cfg = qdrant.get_collection(COLL_NAME).config.params.vectors
-    if not (isinstance(cfg, dict) and cfg.get("text") and cfg.get("image")):
-        log.warning("Collection has wrong vector config - recreating...")
-        qdrant.recreate_collection(
+        store.recreate_collection(
             collection_name=COLL_NAME,
             vectors_config={
                 "text": qmodels.VectorParams(size=TXT_DIM, distance="Cosine"),
                 "image": qmodels.VectorParams(size=IMG_DIM, distance="Cosine"),
             },
+            sparse_vectors_config=SPARSE_VECTORS_CONFIG,
         )
+    else:
+        # Check if collection has correct vector config
+        cfg = store.get_collection(COLL_NAME).config.params.vectors
+        if not (isinstance(cfg, dict) and cfg.get("text") and cfg.get("image")):
+            log.warning("Collection has wrong vector config - recreating...")
+            store.recreate_collection(
+                collection_name=COLL_NAME,
+                vectors_config={
+                    "text": qmodels.VectorParams(size=TXT_DIM, distance="Cosine"),
+                    "image": qmodels.VectorParams(size=IMG_DIM, distance="Cosine"),
+                },
+                sparse_vectors_config=SPARSE_VECTORS_CONFIG,
+            )
+    _bm25_ready = _has_bm25(store, COLL_NAME)
+    if not _bm25_ready:
+        log.warning("Collection has no BM25 sparse vector - keyword retrieval falls back to the entity "
+                    "filter until `python semantic_indexing.py --migrate-sparse-vectors`")
+    if BM25_MIGRATION_COLL in collections:
+        log.warning("An interrupted BM25 migration left its staging collection - rerun "
+                    "`python semantic_indexing.py --migrate-sparse-vectors` to finish it")
+    _ensure_payload_indexes(store)
 
-_ensure_collection()
+def _has_bm25(store, collection_name: str) -> bool:
+    return BM25_VECTOR in (getattr(store.get_collection(collection_name).config.params, "sparse_vectors", None) or {})
 
-# Data structures
-@dataclass
-class Chunk:
-    text: str
-    entities: List[str]
-    chunk_id: str
+def _ensure_payload_indexes(store):
+    """Create any missing PAYLOAD_INDEXES (existing collections are migrated on first start)"""
+    existing = store.get_collection(COLL_NAME).payload_schema or {}
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        if field_name not in existing:
+            log.info(f"Creating {schema.value} payload index on {field_name}")
+            store.create_payload_index(collection_name=COLL_NAME, field_name=field_name, field_schema=schema, wait=False)
 
-def _extract_text_images(file_path: str) -> tuple[str, List[bytes]]:
-    """Extract text and images from various file formats"""
+def _iter_document(file_path: str, progress: Optional[Callable[..., None]] = None) -> Iterator[tuple[str, object]]:
+    """Stream ("text", str) pieces and ("image", bytes) items from a document, page by page.
+    PDFs also yield ("page", page_no) after each page."""
     ext = pathlib.Path(file_path).suffix.lower()
-    text, images = "", []
     
     if ext == ".pdf":
         doc = fitz.open(file_path)
-        for page in doc:
-            text += page.get_text()
-            # Extract images
-            for img in page.get_images(full=True):
-                try:
-                    image_data = doc.extract_image(img[0])["image"]
-                    images.append(image_data)
-                except Exception as e:
-                    log.warning(f"Failed to extract image: {e}")
-        doc.close()
+        try:
+            pages_total = len(doc)
+            seen_xrefs = set()  # logos/headers repeat the same xref on every page
+            # Page text is extracted across a process pool for large PDFs (see pdf_extract.py)
+            for page_no, page_text, xrefs in iter_pdf_pages(file_path, pages_total):
+                yield "text", page_text
+                # Extract images
+                for xref in xrefs:
+                    if xref in seen_xrefs:
+                        continue
+                    seen_xrefs.add(xref)
+                    try:
+                        yield "image", doc.extract_image(xref)["image"]
+                    except Exception as e:
+                        log.warning(f"Failed to extract image: {e}")
+                yield "page", page_no
+                if progress:
+                    progress(pages_done=page_no, pages_total=pages_total)
+        finally:
+            doc.close()
     
     elif ext in {".doc", ".docx"}:
         doc = docx.Document(file_path)
-        text += "\n".join(paragraph.text for paragraph in doc.paragraphs)
+        for paragraph in doc.paragraphs:
+            yield "text", paragraph.text + "\n"
         # Extract images from relationships
         for rel in doc.part.rels.values():
             if "image" in rel.target_ref:
                 try:
-                    images.append(rel.target_part.blob)
+                    yield "image", rel.target_part.blob
                 except Exception as e:
                     log.warning(f"Failed to extract image from docx: {e}")
     
     else:
         # Plain text file
-        text = pathlib.Path(file_path).read_text("utf-8", errors="ignore")
-    
-    return text, images
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            while True:
+                block = f.read(1 << 20)
+                if not block:
+                    break
+                yield "text", block
 
-def _enhanced_entities(text: str) -> List[str]:
-    """Enhanced entity extraction with better patterns"""
-    entities = set()
-    
-    # Original patterns - capitalized words and acronyms
-    for match in re.finditer(r"[A-Z][a-z]+[A-Za-z0-9_]*|[A-Z0-9_]{2,}", text):
-        entities.add(match.group(0))
-    
-    # Technical terms and endpoints
-    for match in re.finditer(r"(?:GET|POST|PUT|DELETE|PATCH)\s+[/\w\-:]+", text):
-        entities.add(match.group(0))
-    
-    # URLs and endpoints
-    for match in re.finditer(r"/[/\w\-:]+", text):
-        entities.add(match.group(0))
-    
-    # Technical keywords
-    tech_keywords = [
-        "endpoint", "endpoints", "API", "backend", "frontend", "database",
-        "service", "server", "client", "authentication", "authorization",
-        "register", "login", "profile", "update", "tech stack", "technology"
-    ]
-    
-    text_lower = text.lower()
-    for keyword in tech_keywords:
-        if keyword.lower() in text_lower:
-            entities.add(keyword)
-    
-    return list(entities)
+def _extract_text_images(file_path: str, progress: Optional[Callable[..., None]] = None) -> tuple[str, List[bytes]]:
+    """Extract text and images from various file formats"""
+    parts, images = [], []
+    for kind, item in _iter_document(file_path, progress):
+        if kind == "text":
+            parts.append(item)
+        elif kind == "image":
+            images.append(item)
+    return "".join(parts), images
 
-def _sentence_chunk(text: str, max_tokens: int = 150) -> List[Chunk]:
-    """Improved sentence-aware chunking with better context preservation"""
-    lines = []
-    
-    # Split by paragraphs first
-    paragraphs = text.split("\n")
-    
-    for paragraph in paragraphs:
-        paragraph = paragraph.strip()
-        if not paragraph:
-            continue
-        
-        # Check if paragraph contains endpoints or technical lists
-        if any(keyword in paragraph.lower() for keyword in ["endpoint", "api", "post", "get", "put", "delete", "patch"]):
-            # Keep technical sections together
-            lines.append(paragraph)
-        else:
-            # Split into sentences for regular text
-            sentences = [s.strip() for s in re.split(r"[.?!]", paragraph) if s.strip()]
-            lines.extend(sentences)
-    
-    chunks = []
-    current_chunk = []
-    current_tokens = 0
-    
-    for line in lines:
-        line_tokens = len(enc_tok.encode(line))
-        
-        # If adding this line would exceed max tokens, create a new chunk
-        if current_tokens + line_tokens > max_tokens and current_chunk:
-            chunk_text = " ".join(current_chunk)
-            chunks.append(Chunk(
-                text=chunk_text,
-                entities=_enhanced_entities(chunk_text),
-                chunk_id=str(uuid.uuid4())
-            ))
-            current_chunk = []
-            current_tokens = 0
-        
-        current_chunk.append(line)
-        current_tokens += line_tokens
-    
-    # Handle remaining content
-    if current_chunk:
-        chunk_text = " ".join(current_chunk)
-        chunks.append(Chunk(
-            text=chunk_text,
-            entities=_enhanced_entities(chunk_text),
-            chunk_id=str(uuid.uuid4())
-        ))
-    
-    return chunks
+def _background_iter(iterable, maxsize: int = INGEST_QUEUE_SIZE):
+    """Run `iterable` in a worker thread, handing items over through a bounded queue"""
+    q: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except BaseException as e:
+            put((done, e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = q.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
 
-def _embed_and_upsert(chunks: List[Chunk], images: List[bytes], doc_id: str, module_id: int, doc_title: str, team_id: int | None = None):
-    """Embed chunks and images, then upsert to Qdrant"""
+def _iter_ingest_batches(items, chunker: Optional[SentenceChunker] = None, image_filter: Optional[ImageFilter] = None) -> Iterator[tuple[List[Chunk], List[bytes]]]:
+    """Group streamed document items into fixed-size (chunks, images) upsert batches.
+    Images rejected by `image_filter` (duplicates, icons, rules) are dropped here."""
+    chunker = chunker or SentenceChunker()
+    chunks: List[Chunk] = []
+    images: List[bytes] = []
+    for kind, item in items:
+        if kind == "text":
+            chunks.extend(chunker.feed(item))
+        elif kind == "page":
+            chunks.extend(chunker.page_break())
+        elif image_filter is None or image_filter.accept(item):
+            images.append(item)
+        while len(chunks) >= INGEST_UPSERT_BATCH:
+            yield chunks[:INGEST_UPSERT_BATCH], []
+            chunks = chunks[INGEST_UPSERT_BATCH:]
+        if len(images) >= INGEST_IMAGE_BATCH:
+            yield [], images
+            images = []
+    chunks.extend(chunker.close())
+    for start in range(0, len(chunks), INGEST_UPSERT_BATCH):
+        yield chunks[start:start + INGEST_UPSERT_BATCH], []
+    if images:
+        yield [], images
+
+def _embed_and_upsert(chunks: List[Chunk], images: List[bytes], doc_id: str, module_id: int, doc_title: str, team_id: int | None = None,
+                      embed_texts: Optional[Callable[[Sequence[str]], List[List[float]]]] = None) -> tuple[int, int]:
+    """Embed chunks and images, then upsert to Qdrant. Returns (text points, image points) written"""
     valid_chunks = [c for c in chunks if c.text.strip()]
     if not valid_chunks and not images:
-        return
+        return 0, 0
 
     # Embed text chunks
-    text_vectors = openai_embed([c.text for c in valid_chunks])
+    text_vectors = (embed_texts or openai_embed)([c.text for c in valid_chunks])
     points = []
 
     # Add text points
     for chunk, vector in zip(valid_chunks, text_vectors):
         if vector:  # Only add if embedding was successful
+            vectors = {"text": vector}
+            sparse = document_vector(chunk.text) if _bm25_ready else None
+            if sparse is not None:
+                vectors[BM25_VECTOR] = sparse
             points.append(qmodels.PointStruct(
                 id=chunk.chunk_id,
-                vector={"text": vector},
+                vector=vectors,
                 payload={
                     "type": "text",
                     "text": chunk.text,
@@ -313,83 +507,279 @@ def _embed_and_upsert(chunks: List[Chunk], images: List[bytes], doc_id: str, mod
                     "team_id": team_id,
                 },
             ))
+    text_points = len(points)
 
     # Add image points
-    for image_bytes in images:
-        image_vector = clip_image_embed(image_bytes)
-        if image_vector is not None:
-            points.append(qmodels.PointStruct(
-                id=str(uuid.uuid4()),
-                vector={"image": image_vector},
-                payload={
-                    "type": "image",
-                    "image": image_bytes.hex(),
-                    "doc_id": doc_id,
-                    "doc_title": doc_title,
-                    "module_id": module_id,
-                    "team_id": team_id,
-                },
-            ))
+    image_vectors, image_indices = clip_image_embed_batch(images)
+    for image_vector, idx in zip(image_vectors, image_indices):
+        # Bytes go to the content-addressed image store; the payload only references them
+        image_info = put_image(images[idx])
+        points.append(qmodels.PointStruct(
+            id=content_point_id(doc_id, "image", image_info["sha256"]),
+            vector={"image": image_vector.tolist()},
+            payload={
+                "type": "image",
+                "image_sha256": image_info["sha256"],
+                "width": image_info["width"],
+                "height": image_info["height"],
+                "mime": image_info["mime"],
+                "doc_id": doc_id,
+                "doc_title": doc_title,
+                "module_id": module_id,
+                "team_id": team_id,
+            },
+        ))
 
-    # Upsert to Qdrant
+    # Upsert to Qdrant, then mirror the text into the keyword index
     if points:
         qdrant.upsert(collection_name=COLL_NAME, points=points)
+        _index_keywords(points)
+    return text_points, len(points) - text_points
 
-def ingest(file_path: str, doc_id: Optional[str] = None, module_id: int = 0, doc_title: Optional[str] = None, team_id: int | None = None):
-    """Main ingestion function"""
-    doc_id = doc_id or str(uuid.uuid4())
+def _index_keywords(points: Sequence[qmodels.PointStruct]):
+    """Write the text points' chunk text to the FTS5 keyword index"""
+    index = get_keyword_index()
+    rows = [{"point_id": p.id, **p.payload} for p in points if p.payload.get("type") == "text"]
+    if index and rows:
+        index.add(rows)
+
+@contextmanager
+def _changing_index(module_id: int | None, team_id: int | None):
+    """Bump the answer cache versions of the scopes that see these points before and after a change,
+    so answers generated from the partial or previous content are never served afterwards"""
+    scopes = content_scopes(module_id, team_id)
+    bump_index_versions(scopes)
+    try:
+        yield
+    finally:
+        bump_index_versions(scopes)
+
+def _doc_filter(doc_id: str) -> qmodels.Filter:
+    """Match a document's points; older points may carry doc_id as an integer"""
+    conditions = [qmodels.FieldCondition(key="doc_id", match=qmodels.MatchValue(value=str(doc_id)))]
+    if str(doc_id).isdigit():
+        conditions.append(qmodels.FieldCondition(key="doc_id", match=qmodels.MatchValue(value=int(doc_id))))
+    return qmodels.Filter(should=conditions)
+
+DOCUMENT_FIELDS = ("doc_title", "module_id", "team_id")  # payload describing the document, not the content
+
+def _stored_points(doc_id: str) -> Dict[str, dict]:
+    """Every point currently stored for a document: id -> its DOCUMENT_FIELDS"""
+    stored, offset = {}, None
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=COLL_NAME,
+            scroll_filter=_doc_filter(doc_id),
+            limit=1024,
+            offset=offset,
+            with_payload=list(DOCUMENT_FIELDS),
+            with_vectors=False,
+        )
+        stored.update((str(p.id), p.payload or {}) for p in points)
+        if offset is None:
+            return stored
+
+def ingest(file_path: str, doc_id: Optional[str] = None, module_id: int = 0, doc_title: Optional[str] = None, team_id: int | None = None,
+           progress: Optional[Callable[..., None]] = None, incremental: bool = True,
+           embed_texts: Optional[Callable[[Sequence[str]], List[List[float]]]] = None) -> Dict:
+    """Main ingestion function. `progress` (optional) receives page/chunk/image counters as keyword args.
+
+    Extraction, chunking and embedding/upsert run as overlapping stages connected by bounded
+    queues, and points are upserted in batches of INGEST_UPSERT_BATCH, so memory stays flat and
+    the document becomes searchable progressively.
+
+    Point IDs are derived from content, so with `incremental` a re-ingest of a revised document
+    only embeds chunks and images that are not already stored for doc_id, and afterwards deletes
+    the stored points that no longer occur in it.
+
+    `embed_texts` replaces openai_embed, e.g. with a batcher shared by concurrent ingests.
+    """
+    doc_id = str(doc_id) if doc_id is not None else str(uuid.uuid4())
     # Use doc_title if provided, otherwise extract filename from path
     if doc_title is None:
         doc_title = pathlib.Path(file_path).name
     
-    # If team_id is not provided, try to get it from the database using module_id
-    if team_id is None and module_id:
+    # Look up the module's chunking settings, and its team_id if not provided
+    chunk_size = chunk_overlap = None
+    if module_id:
         try:
             from db import get_db_connection
             conn = get_db_connection()
-            result = conn.execute("SELECT team_id FROM module WHERE module_id = ?", (module_id,)).fetchone()
+            result = conn.execute("SELECT team_id, chunk_size, chunk_overlap FROM module WHERE module_id = ?", (module_id,)).fetchone()
             conn.close()
             if result:
-                team_id = result["team_id"] if result["team_id"] is not None else None
-                log.info(f"Retrieved team_id {team_id} for module_id {module_id}")
+                chunk_size, chunk_overlap = result["chunk_size"], result["chunk_overlap"]
+                if team_id is None:
+                    team_id = result["team_id"] if result["team_id"] is not None else None
+                    log.info(f"Retrieved team_id {team_id} for module_id {module_id}")
         except Exception as e:
-            log.warning(f"Could not retrieve team_id for module_id {module_id}: {e}")
+            log.warning(f"Could not retrieve settings for module_id {module_id}: {e}")
     
     log.info(f"Ingesting {file_path} (doc_id={doc_id}, module={module_id}, team={team_id}, title={doc_title})...")
     
-    text, images = _extract_text_images(file_path)
-    chunks = _sentence_chunk(text)
-    _embed_and_upsert(chunks, images, doc_id, module_id, doc_title, team_id)
-    
-    log.info(f"Indexed {len(chunks)} chunks + {len(images)} images")
+    stats = {"doc_id": doc_id, "chunks": 0, "images": 0, "chunks_indexed": 0, "images_indexed": 0,
+             "unchanged": 0, "deleted": 0}
+    with _changing_index(module_id, team_id):
+        stored = _stored_points(doc_id) if incremental else {}
+        stored_ids = set(stored)
+        seen_ids = set()
+        # Stage 1: extraction thread -> Stage 2: chunking thread -> Stage 3: embed + upsert (this thread)
+        items = _background_iter(_iter_document(file_path, progress))
+        chunker = SentenceChunker(chunk_size, chunk_overlap, doc_id=doc_id)
+        image_filter = ImageFilter()
+        for chunks, images in _background_iter(_iter_ingest_batches(items, chunker, image_filter)):
+            stats["chunks"] += len(chunks)
+            stats["images"] += len(images)
+            image_ids = [content_point_id(doc_id, "image", hashlib.sha256(b).hexdigest()) for b in images]
+            seen_ids.update(c.chunk_id for c in chunks)
+            seen_ids.update(image_ids)
+            if stored_ids:
+                # Unchanged content already has a point with the same ID
+                new_chunks = [c for c in chunks if c.chunk_id not in stored_ids]
+                new_images = [b for b, point_id in zip(images, image_ids) if point_id not in stored_ids]
+                stats["unchanged"] += len(chunks) - len(new_chunks) + len(images) - len(new_images)
+                stats["chunks_indexed"] += len(chunks) - len(new_chunks)
+                stats["images_indexed"] += len(images) - len(new_images)
+                chunks, images = new_chunks, new_images
+            text_points, image_points = _embed_and_upsert(chunks, images, doc_id, module_id, doc_title, team_id, embed_texts)
+            stats["chunks_indexed"] += text_points
+            stats["images_indexed"] += image_points
+            if progress:
+                progress(chunks_total=stats["chunks"], images_total=stats["images"],
+                         chunks_done=stats["chunks_indexed"], images_done=stats["images_indexed"])
 
-def _improved_keyword_filter(query: str) -> qmodels.Filter | None:
-    """Improved keyword-based filter for retrieval"""
-    entities = _enhanced_entities(query)
-    
-    # Add query words as potential keywords
-    query_words = [word.lower() for word in query.split() if len(word) > 2]
-    entities.extend(query_words)
-    
+        # Only after a complete pass: drop points for content that vanished from the document
+        vanished = list(stored_ids - seen_ids)
+        for start in range(0, len(vanished), 1000):
+            qdrant.delete(collection_name=COLL_NAME,
+                          points_selector=qmodels.PointIdsList(points=vanished[start:start + 1000]))
+        if vanished and get_keyword_index():
+            get_keyword_index().delete_points(vanished)
+        stats["deleted"] = len(vanished)
+        # Unchanged points were not rewritten: give them the document's current title and scope
+        fields = {"doc_title": doc_title, "module_id": module_id, "team_id": team_id}
+        outdated = [point_id for point_id, payload in stored.items()
+                    if point_id in seen_ids and any(payload.get(key) != value for key, value in fields.items())]
+        for start in range(0, len(outdated), 1000):
+            qdrant.set_payload(collection_name=COLL_NAME, payload=fields, points=outdated[start:start + 1000])
+        if outdated and get_keyword_index():
+            get_keyword_index().update_document_fields(outdated, **fields)
+    stats["tokens"] = chunker.tokens
+
+    log.info(f"Indexed {stats['chunks']} chunks + {stats['images']} images "
+             f"({stats['unchanged']} unchanged, {stats['deleted']} deleted; image filter: {image_filter.stats})")
+    cache = get_cache()
+    if cache:
+        log.info(f"Embedding cache: {cache.stats()}")
+    return stats
+
+def clone_document_points(source_doc_id, doc_id, module_id: int, doc_title: str, team_id: int | None = None) -> Dict:
+    """Copy an ingested document's points to a new doc_id/module/team scope without re-extracting
+    or re-embedding (duplicate uploads). Returns ingest-style stats; 0 points means nothing to copy."""
+    source_doc_id, doc_id = str(source_doc_id), str(doc_id)
+    stats = {"doc_id": doc_id, "chunks": 0, "images": 0, "chunks_indexed": 0, "images_indexed": 0, "cloned_from": source_doc_id}
+    occurrences: Dict[str, int] = {}
+    with _changing_index(module_id, team_id):
+        offset = None
+        while True:
+            points, offset = qdrant.scroll(
+                collection_name=COLL_NAME,
+                scroll_filter=_doc_filter(source_doc_id),
+                limit=INGEST_UPSERT_BATCH,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            clones = []
+            for point in points:
+                payload = {**point.payload, "doc_id": doc_id, "doc_title": doc_title, "module_id": module_id, "team_id": team_id}
+                if payload.get("type") == "image":
+                    digest = payload.get("image_sha256") or str(point.id)
+                    point_id = content_point_id(doc_id, "image", digest)
+                    stats["images"] += 1
+                else:
+                    digest = hashlib.sha256(payload.get("text", "").encode("utf-8")).hexdigest()
+                    point_id = content_point_id(doc_id, "text", digest, occurrences.get(digest, 0))
+                    occurrences[digest] = occurrences.get(digest, 0) + 1
+                    stats["chunks"] += 1
+                clones.append(qmodels.PointStruct(id=point_id, vector=point.vector, payload=payload))
+            if clones:
+                qdrant.upsert(collection_name=COLL_NAME, points=clones)
+                _index_keywords(clones)
+            if offset is None:
+                break
+    stats["chunks_indexed"], stats["images_indexed"] = stats["chunks"], stats["images"]
+    log.info(f"Cloned {stats['chunks']} chunks + {stats['images']} images from document {source_doc_id} to {doc_id}")
+    return stats
+
+def _entity_filter(query: str) -> qmodels.Filter | None:
+    """Entity/keyword `should` filter: the lexical fallback for collections without the BM25 vector"""
+    entities = extract_entities(query)
+    entities.extend(word.lower() for word in query.split() if len(word) > 2)
     if not entities:
         return None
-    
-    return qmodels.Filter(
-        should=[qmodels.FieldCondition(key="ents", match=qmodels.MatchAny(any=entities))]
-    )
+    return qmodels.Filter(should=[qmodels.FieldCondition(key="ents", match=qmodels.MatchAny(any=entities))])
+
+_query_embed_pool = ThreadPoolExecutor(max_workers=QUERY_EMBED_WORKERS, thread_name_prefix="query-embed")
+
+def _await_embedding(future, deadline: float, name: str):
+    """Result of an embedding future, or None if it fails or misses its deadline"""
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FuturesTimeout:
+        # The request keeps running; a late OpenAI result still lands in the embedding cache
+        log.warning(f"{name} query embedding timed out - continuing without it")
+    except Exception as e:
+        log.error(f"{name} query embedding failed - continuing without it: {e}")
+    return None
+
+def _embed_query_text(query: str, cache=None) -> Optional[List[float]]:
+    vector = openai_embed([query])[0] or None
+    if cache and vector:
+        cache.put(OPENAI_EMB_MODEL, TXT_DIM, query, vector)
+    return vector
+
+def _embed_query_clip(query: str, cache=None) -> Optional[List[float]]:
+    vector = clip_text_embed(query)
+    if cache and vector:
+        cache.put(CLIP_MODEL_NAME, IMG_DIM, query, vector)
+    return vector
+
+def embed_query(query: str) -> tuple[Optional[List[float]], Optional[List[float]]]:
+    """(text vector, CLIP vector) for a query, embedded concurrently with per-embedder timeouts.
+    Either may be None, in which case retrieval runs in the other space only."""
+    started = time.monotonic()
+    cache = get_query_cache()
+    text_vector = cache.get(OPENAI_EMB_MODEL, TXT_DIM, query) if cache else None
+    image_vector = cache.get(CLIP_MODEL_NAME, IMG_DIM, query) if cache else None
+
+    # Only misses go to the embedders; results are cached in the worker, so late ones still land
+    text_future = image_future = None
+    if text_vector is None:
+        text_future = _query_embed_pool.submit(_embed_query_text, query, cache)
+    if image_vector is None:
+        image_future = _query_embed_pool.submit(_embed_query_clip, query, cache)  # Cross-modal: text query for images
+    if text_future is not None:
+        text_vector = _await_embedding(text_future, started + QUERY_EMBED_TIMEOUT, "OpenAI")
+    if image_future is not None:
+        image_vector = _await_embedding(image_future, started + CLIP_QUERY_TIMEOUT, "CLIP")
+    return text_vector, image_vector
 
 def retrieve(query: str, *, top_k: int = 8, module_id: int | None = None, 
-            team_id: int | None = None, user_team_ids: list | None = None) -> List[Dict]:
-    """Retrieve relevant chunks using multimodal search with improved filtering and strict team/module isolation"""
+            team_id: int | None = None, user_team_ids: list | None = None,
+            query_vectors: tuple | None = None) -> List[Dict]:
+    """Retrieve relevant chunks using hybrid dense + BM25 + image search with strict team/module isolation.
+    `query_vectors` is a precomputed embed_query() result."""
     query = str(query).strip()
     log.info(f"Retrieving for query: '{query}' with top_k={top_k}, module_id={module_id}, team_id={team_id}, user_team_ids={user_team_ids}")
     
     # Get embeddings
-    text_vector = openai_embed([query])[0]
-    image_vector = clip_text_embed(query)  # Cross-modal: text query for images
-    
-    # Create filters - make entity filter less restrictive
-    entity_filter = _improved_keyword_filter(query)
+    text_vector, image_vector = query_vectors or embed_query(query)
+    sparse_vector = query_vector(query) if _bm25_ready else None
+    keyword_expression = match_expression(query) if get_keyword_index() else None
+    if text_vector is None and image_vector is None and sparse_vector is None and keyword_expression is None:
+        log.error("No query embedding available - returning no results")
+        return []
     
     # Build access control filters - STRICT isolation for teams and modules
     access_conditions = []
@@ -413,81 +803,61 @@ def retrieve(query: str, *, top_k: int = 8, module_id: int | None = None,
     
     # Build final filter with mandatory access control
     if access_conditions:
-        if entity_filter:
-            final_filter = qmodels.Filter(must=access_conditions, should=entity_filter.should)
-        else:
-            final_filter = qmodels.Filter(must=access_conditions)
+        final_filter = qmodels.Filter(must=access_conditions)
     else:
-        final_filter = entity_filter
+        final_filter = None
         log.warning("No module_id, team_id, or user_team_ids specified - searching across all accessible documents")
     
-    # Search text space with higher limit
-    text_hits = []
+    # Dense text, BM25 keywords and image go to the store as one batch (one round trip)
+    requests, slots = [], {}
     if text_vector:
-        text_hits = qdrant.search(
-            collection_name=COLL_NAME,
-            query_vector=("text", text_vector),
-            query_filter=final_filter,
-            limit=top_k * 3,  # Get more candidates
-            with_payload=True
-        )
-    
-    # Search image space
-    image_hits = []
+        slots["text"] = len(requests)
+        requests.append(qmodels.QueryRequest(query=text_vector, using="text", filter=final_filter,
+                                             limit=top_k * 3, with_payload=True))  # Get more candidates
+    if sparse_vector is not None:
+        slots["sparse"] = len(requests)
+        requests.append(qmodels.QueryRequest(query=sparse_vector, using=BM25_VECTOR, filter=final_filter,
+                                             limit=top_k * 3, with_payload=True))
+    elif text_vector and not _bm25_ready and (entity_filter := _entity_filter(query)):
+        # Not yet migrated to BM25: dense hits among the chunks whose entities match stand in for the keyword list
+        slots["sparse"] = len(requests)
+        requests.append(qmodels.QueryRequest(query=text_vector, using="text",
+                                             filter=qmodels.Filter(must=access_conditions or None, should=entity_filter.should),
+                                             limit=top_k * 3, with_payload=True))
     if image_vector is not None:
-        image_hits = qdrant.search(
-            collection_name=COLL_NAME,
-            query_vector=("image", image_vector),
-            query_filter=final_filter,
-            limit=top_k * 2,
-            with_payload=True
-        )
-    
-    # Broader search without entity filter if not enough results
-    # BUT ALWAYS preserve ALL access control filters for strict team/module isolation
-    if len(text_hits) < 3 and access_conditions:
-        log.info("Trying broader search without entity filter but maintaining strict access control...")
-        # ALWAYS preserve access control filters - NEVER remove team/module isolation
-        broader_filter = qmodels.Filter(must=access_conditions)
-        
-        broader_hits = qdrant.search(
-            collection_name=COLL_NAME,
-            query_vector=("text", text_vector),
-            query_filter=broader_filter,
-            limit=top_k * 2,
-            with_payload=True
-        )
-        
-        # Merge results, avoiding duplicates
-        existing_ids = {hit.id for hit in text_hits}
-        for hit in broader_hits:
-            if hit.id not in existing_ids:
-                text_hits.append(hit)
-    # If no access_conditions (no module/team specified), we already did the broadest possible search above
-    
-    log.info(f"Found {len(text_hits)} text hits and {len(image_hits)} image hits")
-    
-    # Fuse results
+        slots["image"] = len(requests)
+        requests.append(qmodels.QueryRequest(query=image_vector, using="image", filter=final_filter,
+                                             limit=top_k * 2, with_payload=True))
+    responses = qdrant.query_batch_points(collection_name=COLL_NAME, requests=requests) if requests else []
+    hits = {name: list(responses[index].points) for name, index in slots.items()}
+    # Exact phrases, codes and prefixes from the FTS5 index, under the same access scoping
+    if keyword_expression:
+        hits["keyword"] = _keyword_hits(keyword_expression, scope_expression(module_id, team_id, user_team_ids), top_k * 3)
+    
+    log.info(f"Found {len(hits.get('text', []))} text hits, {len(hits.get('sparse', []))} BM25 hits, "
+             f"{len(hits.get('keyword', []))} exact keyword hits and {len(hits.get('image', []))} image hits")
+    
+    # Fuse results by weighted reciprocal rank (scores of the spaces are not comparable);
+    # a first-ranked hit counts its full weight, so a top hit in both text lists scores ALPHA_TEXT + GAMMA_SPARSE
     fused_results = {}
-    for hit in text_hits:
-        fused_results[hit.id] = {
-            "score": ALPHA_TEXT * hit.score,
-            "payload": hit.payload
-        }
-    
-    for hit in image_hits:
-        if hit.id in fused_results:
-            fused_results[hit.id]["score"] += BETA_IMAGE * hit.score
-        else:
-            fused_results[hit.id] = {
-                "score": BETA_IMAGE * hit.score,
-                "payload": hit.payload
-            }
+    for name, weight in (("text", ALPHA_TEXT), ("sparse", GAMMA_SPARSE), ("keyword", DELTA_KEYWORD), ("image", BETA_IMAGE)):
+        for rank, hit in enumerate(hits.get(name, []), start=1):
+            entry = fused_results.setdefault(hit.id, {"score": 0.0, "payload": hit.payload})
+            entry["score"] += weight * (RRF_K + 1) / (RRF_K + rank)
     
     # Sort by fused score and return top-k
     sorted_results = sorted(fused_results.values(), key=lambda x: x["score"], reverse=True)
     return sorted_results[:top_k]
 
+def _keyword_hits(expression: str, scope: Optional[str], limit: int) -> List[qmodels.ScoredPoint]:
+    """FTS5 keyword index matches as scored points ([] if the index is unavailable)"""
+    try:
+        matches = get_keyword_index().search(expression, scope, limit)
+    except Exception as e:
+        log.error(f"Keyword index search failed - continuing without it: {e}")
+        return []
+    return [qmodels.ScoredPoint(id=m["point_id"], version=0, score=m["score"], payload=m["payload"]) for m in matches]
+
 def _build_system_prompt(config: dict) -> str:
     """Build system prompt based on user configuration"""
     persona_map = {
@@ -540,6 +910,39 @@ def _build_system_prompt(config: dict) -> str:
     
     return "\n".join(prompt_parts)
 
+def _lookup_answer(query: str, module_id, team_id, user_team_ids, config: dict, chat_history: list | None):
+    """Answer cache lookup before retrieval: (cached answer or None, store(answer) callback, query vectors).
+    Query vectors are only computed (for near-duplicate matching) on an exact miss and reused by retrieve()."""
+    cache = get_answer_cache()
+    if cache is None:
+        return None, lambda text: None, None
+    state = {"vectors": None}
+
+    def embed():
+        state["vectors"] = embed_query(query)
+        return state["vectors"][0]
+
+    try:
+        bucket = cache.bucket(search_scopes(module_id, team_id, user_team_ids), config, (chat_history or [])[-6:])
+        cached = cache.lookup(bucket, query, embed)
+    except Exception as e:
+        log.warning(f"Answer cache lookup failed: {e}")
+        return None, lambda text: None, state["vectors"]
+
+    def store(text: str):
+        try:
+            cache.store(bucket, query, text, state["vectors"][0] if state["vectors"] else None)
+        except Exception as e:
+            log.warning(f"Answer cache write failed: {e}")
+
+    return cached, store, state["vectors"]
+
+GREETINGS = {'hi', 'hello', 'hey', 'hi!', 'hello!', 'hey!'}
+
+def is_greeting(query: str) -> bool:
+    """Small talk answered without retrieval, the answer library or the LLM"""
+    return str(query).strip().lower() in GREETINGS
+
 def answer(query: str, *, top_k: int = 8, module_id: int | None = None, team_id: int | None = None,
           user_config: dict | None = None, chat_history: list | None = None, 
           user_team_ids: list | None = None, use_general_llm: bool = False) -> str:
@@ -548,7 +951,7 @@ def answer(query: str, *, top_k: int = 8, module_id: int | None = None, team_id:
     log.info(f"Answering query: '{query}' for module_id: {module_id}, team_id: {team_id}, user_team_ids: {user_team_ids}, use_general_llm: {use_general_llm}")
     
     # Handle greetings
-    if query.lower() in {'hi', 'hello', 'hey', 'hi!', 'hello!', 'hey!'}:
+    if is_greeting(query):
         return "Hello! How can I help you today?"
     
     # Default configuration
@@ -567,8 +970,13 @@ def answer(query: str, *, top_k: int = 8, module_id: int | None = None, team_id:
         log.info("Using general LLM without document context as requested by user")
         return _call_general_llm(query, config, chat_history)
     
+    cached, store_answer, query_vectors = _lookup_answer(query, module_id, team_id, user_team_ids, config, chat_history)
+    if cached is not None:
+        return cached
+    
     # Retrieve relevant chunks with strict isolation
-    hits = retrieve(query, top_k=top_k, module_id=module_id, team_id=team_id, user_team_ids=user_team_ids)
+    hits = retrieve(query, top_k=top_k, module_id=module_id, team_id=team_id, user_team_ids=user_team_ids,
+                    query_vectors=query_vectors)
     log.info(f"Retrieved {len(hits)} chunks for query")
     
     # Define relevance thresholds
@@ -590,37 +998,9 @@ def answer(query: str, *, top_k: int = 8, module_id: int | None = None, team_id:
         log.info(f"Insufficient relevant chunks ({len(relevant_chunks)}) for filtered query")
         return f"No relevant information found{filter_context} for your question. Would you like me to provide a general answer instead? (Please reply 'yes' if you want a general response)"
     
-    # Less aggressive filtering - use semantic similarity and keyword matching
-    query_lower = query.lower()
-    query_keywords = set(query_lower.split())
-    
-    # Score chunks based on content relevance - use relevant_chunks instead of hits
-    scored_hits = []
-    for hit in relevant_chunks:
-        payload = hit['payload']
-        if payload['type'] == 'text':
-            chunk_text = payload['text'].lower()
-            
-            # Calculate relevance score
-            relevance_score = 0
-            
-            # Keyword matching
-            for keyword in query_keywords:
-                if keyword in chunk_text:
-                    relevance_score += 1
-            
-            # Special scoring for technical terms
-            if any(term in query_lower for term in ['endpoint', 'api', 'backend']) and \
-               any(term in chunk_text for term in ['endpoint', 'api', 'post', 'get', 'put', 'delete', 'patch']):
-                relevance_score += 3
-            
-            # Boost score with vector similarity
-            final_score = hit['score'] + (relevance_score * 0.1)
-            scored_hits.append((final_score, hit))
-    
-    # Sort by relevance and take top chunks
-    scored_hits.sort(key=lambda x: x[0], reverse=True)
-    hits = [hit for _, hit in scored_hits[:top_k]]
+    # Text chunks in retrieve()'s fused order: keyword matches are already ranked in by the
+    # BM25 and keyword index lists, so no separate keyword bonus is added here
+    hits = [hit for hit in relevant_chunks if hit['payload']['type'] == 'text'][:top_k]
     
     if not hits:
         return "I don't have enough information to answer that question."
@@ -670,6 +1050,7 @@ def answer(query: str, *, top_k: int = 8, module_id: int | None = None, team_id:
             if "Source:" not in answer_text:
                 answer_text += source_text
         
+        store_answer(answer_text)
         return answer_text
         
     except Exception as e:
@@ -835,7 +1216,7 @@ def answer_question_stream(question: str, module_id: int | None = None, team_id:
     log.info(f"Streaming answer for query: '{query}' for module_id: {module_id}, team_id: {team_id}, user_team_ids: {user_team_ids}, use_general_llm: {use_general_llm}")
     
     # Handle greetings
-    if query.lower() in {'hi', 'hello', 'hey', 'hi!', 'hello!', 'hey!'}:
+    if is_greeting(query):
         yield "Hello! How can I help you today?"
         return
     
@@ -856,8 +1237,14 @@ def answer_question_stream(question: str, module_id: int | None = None, team_id:
         yield from _call_general_llm_stream(query, config, chat_history)
         return
     
+    cached, store_answer, query_vectors = _lookup_answer(query, module_id, team_id, user_team_ids, config, chat_history)
+    if cached is not None:
+        yield cached  # Replay in one piece; nothing to wait for
+        return
+    
     # Retrieve relevant chunks with strict isolation
-    hits = retrieve(query, top_k=8, module_id=module_id, team_id=team_id, user_team_ids=user_team_ids)
+    hits = retrieve(query, top_k=8, module_id=module_id, team_id=team_id, user_team_ids=user_team_ids,
+                    query_vectors=query_vectors)
     log.info(f"Retrieved {len(hits)} chunks for streaming query")
     
     # Define relevance thresholds
@@ -880,37 +1267,9 @@ def answer_question_stream(question: str, module_id: int | None = None, team_id:
         yield f"No relevant information found{filter_context} for your question. Would you like me to provide a general answer instead? (Please reply 'yes' if you want a general response)"
         return
     
-    # Less aggressive filtering - use semantic similarity and keyword matching
-    query_lower = query.lower()
-    query_keywords = set(query_lower.split())
-    
-    # Score chunks based on content relevance - use relevant_chunks instead of hits
-    scored_hits = []
-    for hit in relevant_chunks:
-        payload = hit['payload']
-        if payload['type'] == 'text':
-            chunk_text = payload['text'].lower()
-            
-            # Calculate relevance score
-            relevance_score = 0
-            
-            # Keyword matching
-            for keyword in query_keywords:
-                if keyword in chunk_text:
-                    relevance_score += 1
-            
-            # Special scoring for technical terms
-            if any(term in query_lower for term in ['endpoint', 'api', 'backend']) and \
-               any(term in chunk_text for term in ['endpoint', 'api', 'post', 'get', 'put', 'delete', 'patch']):
-                relevance_score += 3
-            
-            # Boost score with vector similarity
-            final_score = hit['score'] + (relevance_score * 0.1)
-            scored_hits.append((final_score, hit))
-    
-    # Sort by relevance and take top chunks
-    scored_hits.sort(key=lambda x: x[0], reverse=True)
-    hits = [hit for _, hit in scored_hits[:8]]
+    # Text chunks in retrieve()'s fused order: keyword matches are already ranked in by the
+    # BM25 and keyword index lists, so no separate keyword bonus is added here
+    hits = [hit for hit in relevant_chunks if hit['payload']['type'] == 'text'][:8]
     
     if not hits:
         yield "I don't have enough information to answer that question."
@@ -966,8 +1325,11 @@ def answer_question_stream(question: str, module_id: int | None = None, team_id:
             if "Source:" not in full_response and "I don't have enough information" not in full_response:
                 source_list = [str(doc) for doc in source_docs]
                 source_text = "\n\nSource: " + ", ".join(sorted(source_list))
+                answer_chunks.append(source_text)
                 yield source_text
         
+        store_answer("".join(answer_chunks))
+        
     except Exception as e:
         log.error(f"Streaming ChatCompletion error: {e}")
         yield "LLM generation failed."
@@ -1001,25 +1363,24 @@ def _get_doc_title_from_db(doc_id: str) -> str:
         log.warning(f"Failed to get document title from database: {e}")
         return f"Document_{doc_id}"
 
+def _stored_scope(flt: qmodels.Filter) -> Dict:
+    """module_id/team_id payload of one point matching the filter ({} if none)"""
+    points, _ = qdrant.scroll(collection_name=COLL_NAME, scroll_filter=flt, limit=1,
+                              with_payload=["module_id", "team_id"], with_vectors=False)
+    return points[0].payload if points else {}
+
 def delete_document_embeddings(doc_id: int):
     """Delete all embeddings for a specific document from Qdrant"""
     try:
-        client = _get_qdrant_client()
-        
+        scope = _stored_scope(_doc_filter(doc_id))
         # Delete all points where payload.doc_id matches this document
-        client.delete(
+        qdrant.delete(
             collection_name=COLL_NAME,
-            points_selector=qmodels.FilterSelector(
-                filter=qmodels.Filter(
-                    must=[
-                        qmodels.FieldCondition(
-                            key="doc_id",
-                            match=qmodels.MatchValue(value=str(doc_id))
-                        )
-                    ]
-                )
-            )
+            points_selector=qmodels.FilterSelector(filter=_doc_filter(doc_id))
         )
+        if get_keyword_index():
+            get_keyword_index().delete_where(doc_id=doc_id)
+        bump_index_versions(content_scopes(scope.get("module_id"), scope.get("team_id")))
         log.info(f"Deleted embeddings for document {doc_id}")
         
     except Exception as e:
@@ -1029,22 +1390,16 @@ def delete_document_embeddings(doc_id: int):
 def delete_module_embeddings(module_id: int):
     """Delete all embeddings for all documents in a specific module from Qdrant"""
     try:
-        client = _get_qdrant_client()
-        
+        module_filter = qmodels.Filter(must=[qmodels.FieldCondition(key="module_id", match=qmodels.MatchValue(value=module_id))])
+        scope = _stored_scope(module_filter)
         # Delete all points where payload.module_id matches this module
-        client.delete(
+        qdrant.delete(
             collection_name=COLL_NAME,
-            points_selector=qmodels.FilterSelector(
-                filter=qmodels.Filter(
-                    must=[
-                        qmodels.FieldCondition(
-                            key="module_id",
-                            match=qmodels.MatchValue(value=module_id)
-                        )
-                    ]
-                )
-            )
+            points_selector=qmodels.FilterSelector(filter=module_filter)
         )
+        if get_keyword_index():
+            get_keyword_index().delete_where(module_id=module_id)
+        bump_index_versions(content_scopes(module_id, scope.get("team_id")))
         log.info(f"Deleted embeddings for module {module_id}")
         
     except Exception as e:
@@ -1054,10 +1409,8 @@ def delete_module_embeddings(module_id: int):
 def delete_team_embeddings(team_id: int):
     """Delete all embeddings for all documents in a specific team from Qdrant"""
     try:
-        client = _get_qdrant_client()
-        
         # Delete all points where payload.team_id matches this team
-        client.delete(
+        qdrant.delete(
             collection_name=COLL_NAME,
             points_selector=qmodels.FilterSelector(
                 filter=qmodels.Filter(
@@ -1070,6 +1423,10 @@ def delete_team_embeddings(team_id: int):
                 )
             )
         )
+        if get_keyword_index():
+            get_keyword_index().delete_where(team_id=team_id)
+        # The team's modules are not known here, so invalidate every cached answer
+        bump_index_versions(content_scopes(team_id=team_id) + [GLOBAL_SCOPE])
         log.info(f"Deleted embeddings for team {team_id}")
         
     except Exception as e:
@@ -1079,10 +1436,8 @@ def delete_team_embeddings(team_id: int):
 def get_module_stats(module_id: int):
     """Get embedding statistics for a specific module"""
     try:
-        client = _get_qdrant_client()
-        
         # Count embeddings for this module
-        result = client.scroll(
+        result = qdrant.scroll(
             collection_name=COLL_NAME,
             scroll_filter=qmodels.Filter(
                 must=[
@@ -1102,7 +1457,7 @@ def get_module_stats(module_id: int):
         next_page_offset = None
         
         while True:
-            batch_result = client.scroll(
+            batch_result = qdrant.scroll(
                 collection_name=COLL_NAME,
                 scroll_filter=qmodels.Filter(
                     must=[
@@ -1139,14 +1494,176 @@ def get_module_stats(module_id: int):
             "error": str(e)
         }
 
+def migrate_image_payloads(batch_size: int = 64) -> int:
+    """Move hex-encoded images out of Qdrant payloads into the image store. Returns points migrated"""
+    migrated = 0
+    offset = None
+    image_filter = qmodels.Filter(must=[qmodels.FieldCondition(key="type", match=qmodels.MatchValue(value="image"))])
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=COLL_NAME,
+            scroll_filter=image_filter,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        for point in points:
+            image_hex = point.payload.get("image")
+            if not image_hex:
+                continue
+            image_info = put_image(bytes.fromhex(image_hex))
+            qdrant.set_payload(
+                collection_name=COLL_NAME,
+                payload={
+                    "image_sha256": image_info["sha256"],
+                    "width": image_info["width"],
+                    "height": image_info["height"],
+                    "mime": image_info["mime"],
+                },
+                points=[point.id],
+            )
+            qdrant.delete_payload(collection_name=COLL_NAME, keys=["image"], points=[point.id])
+            migrated += 1
+        if offset is None:
+            break
+    log.info(f"Migrated {migrated} image payloads to the image store")
+    return migrated
+
+def migrate_doc_id_payloads(batch_size: int = 256) -> int:
+    """Rewrite integer doc_id payloads (older ingests) as strings, so the keyword index
+    covers every point. Returns points migrated."""
+    migrated = 0
+    offset = None
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=COLL_NAME,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["doc_id"],
+            with_vectors=False
+        )
+        by_doc: Dict[int, list] = {}
+        for point in points:
+            doc_id = (point.payload or {}).get("doc_id")
+            if isinstance(doc_id, int) and not isinstance(doc_id, bool):
+                by_doc.setdefault(doc_id, []).append(point.id)
+        for doc_id, point_ids in by_doc.items():
+            qdrant.set_payload(collection_name=COLL_NAME, payload={"doc_id": str(doc_id)}, points=point_ids)
+            migrated += len(point_ids)
+        if offset is None:
+            break
+    log.info(f"Migrated {migrated} integer doc_id payloads to strings")
+    return migrated
+
+def migrate_sparse_vectors(batch_size: int = 256) -> int:
+    """Rebuild a collection created without the BM25 sparse vector (a sparse vector cannot be added
+    in place) and compute it for every text point. Run with the server stopped. Returns points migrated.
+
+    Points are first copied, with their BM25 vectors, into a staging collection while the live one
+    stays untouched. Only once the staging copy is complete is the live collection recreated and
+    refilled from it; the staging collection is dropped after that copy is verified. A rerun after a
+    crash resumes: a partial staging copy is rebuilt, a partial refill is completed from staging."""
+    staging = BM25_MIGRATION_COLL
+    staged = qdrant.collection_exists(staging)
+    live = qdrant.collection_exists(COLL_NAME)
+    if staged and live and not _has_bm25(qdrant, COLL_NAME):
+        # Interrupted while staging: the live collection is intact, start the copy over
+        qdrant.delete_collection(staging)
+        staged = False
+    if not staged:
+        if _has_bm25(qdrant, COLL_NAME):
+            log.info("Collection already has the BM25 sparse vector")
+            return 0
+        _stage_sparse_vectors(staging, batch_size)
+    else:
+        log.info(f"Resuming an interrupted BM25 migration from {staging}")
+
+    # Swap: recreate the collection with the full config and indexes, then copy the points back
+    if qdrant.collection_exists(COLL_NAME) and not _has_bm25(qdrant, COLL_NAME):
+        qdrant.delete_collection(COLL_NAME)
+    _ensure_collection(qdrant)
+    copy_collection(qdrant, qdrant, staging, batch_size=batch_size, target_name=COLL_NAME)
+    migrated = qdrant.count(collection_name=staging, exact=True).count
+    copied = qdrant.count(collection_name=COLL_NAME, exact=True).count
+    if copied < migrated:
+        raise RuntimeError(f"BM25 migration copied {copied} of {migrated} points; {staging} is kept - rerun to resume")
+    qdrant.delete_collection(staging)
+    bump_index_versions([GLOBAL_SCOPE])
+    log.info(f"Migrated {migrated} points to a collection with BM25 sparse vectors")
+    return migrated
+
+def _stage_sparse_vectors(staging: str, batch_size: int):
+    """Copy the live collection's points into `staging` with BM25 vectors added, and verify the count"""
+    qdrant.create_collection(staging, vectors_config=qdrant.get_collection(COLL_NAME).config.params.vectors,
+                             sparse_vectors_config=SPARSE_VECTORS_CONFIG)
+    offset = None
+    while True:
+        records, offset = qdrant.scroll(collection_name=COLL_NAME, limit=batch_size, offset=offset,
+                                        with_payload=True, with_vectors=True)
+        points = []
+        for record in records:
+            vectors = dict(record.vector or {})
+            sparse = document_vector((record.payload or {}).get("text", "")) if (record.payload or {}).get("type") == "text" else None
+            if sparse is not None:
+                vectors[BM25_VECTOR] = sparse
+            points.append(qmodels.PointStruct(id=record.id, vector=vectors, payload=record.payload))
+        if points:
+            qdrant.upsert(collection_name=staging, points=points)
+        if offset is None:
+            break
+    expected = qdrant.count(collection_name=COLL_NAME, exact=True).count
+    staged = qdrant.count(collection_name=staging, exact=True).count
+    if staged != expected:
+        raise RuntimeError(f"BM25 migration staged {staged} of {expected} points; the live collection is unchanged - rerun")
+
+def rebuild_keyword_index(batch_size: int = 1024) -> int:
+    """Refill the FTS5 keyword index from the text points in the collection. Returns chunks indexed."""
+    index = get_keyword_index()
+    if index is None:
+        log.warning("Keyword index is disabled")
+        return 0
+    index.clear()
+    text_filter = qmodels.Filter(must=[qmodels.FieldCondition(key="type", match=qmodels.MatchValue(value="text"))])
+    indexed, offset = 0, None
+    while True:
+        points, offset = qdrant.scroll(collection_name=COLL_NAME, scroll_filter=text_filter, limit=batch_size,
+                                       offset=offset, with_payload=True, with_vectors=False)
+        _index_keywords(points)
+        indexed += len(points)
+        if offset is None:
+            break
+    log.info(f"Indexed {indexed} chunks in the keyword index")
+    return indexed
+
 # CLI interface
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Multimodal RAG with OpenAI + OpenCLIP")
     parser.add_argument("--ingest", metavar="FILE", help="File to ingest (pdf/docx/txt)")
     parser.add_argument("--query", metavar="QUESTION", help="Ask a question")
     parser.add_argument("--module", type=int, default=0, help="Module ID (default: 0)")
+    parser.add_argument("--migrate-images", action="store_true", help="Move hex-encoded image payloads into the image store")
+    parser.add_argument("--migrate-payload-indexes", action="store_true",
+                        help="Create missing payload indexes and convert integer doc_id payloads to strings")
+    parser.add_argument("--migrate-sparse-vectors", action="store_true",
+                        help="Rebuild the collection with BM25 sparse vectors for keyword retrieval")
+    parser.add_argument("--rebuild-keyword-index", action="store_true",
+                        help="Refill the FTS5 keyword index from the collection's text points")
     args = parser.parse_args()
     
+    if args.migrate_images:
+        migrate_image_payloads()
+    
+    if args.migrate_payload_indexes:
+        _ensure_payload_indexes(qdrant)
+        migrate_doc_id_payloads()
+    
+    if args.migrate_sparse_vectors:
+        migrate_sparse_vectors()
+    
+    if args.rebuild_keyword_index:
+        rebuild_keyword_index()
+    
     if args.ingest:
         if not pathlib.Path(args.ingest).exists():
             sys.exit("File not found")
@@ -1156,7 +1673,9 @@ if __name__ == "__main__":
         result = answer(args.query, module_id=args.module)
         print(textwrap.fill(result, width=100))
     
-    if not args.ingest and not args.query:
+    if not (args.ingest or args.query or args.migrate_images or args.migrate_payload_indexes or args.migrate_sparse_vectors
+            or args.rebuild_keyword_index):
         print("Usage examples:")
         print("  python multimodal_rag.py --ingest document.pdf")
-        print("  python multimodal_rag.py --query 'What is the main topic?'")
\ No newline at end of file
+        print("  python multimodal_rag.py --query 'What is the main topic?'")
+        print("  python bulk_ingest.py --module 3 archive.zip past_rfps/   (many documents in parallel)")
\ No newline at end of file
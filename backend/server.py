@@ -1,11 +1,13 @@
 import os
+import asyncio
 import pathlib
 import shutil
 import jwt
 import smtplib
 import sqlite3
 import time
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
@@ -17,15 +19,42 @@ from datetime import datetime
 from db import (get_db_connection, get_modules, create_module, add_document, get_documents,
                 create_team, get_teams, get_user_teams, add_user_to_team, remove_user_from_team,
                 get_team_members, is_team_admin, get_user_by_id, get_all_users_for_team,
-                update_team_admin_status, delete_team, delete_module)
+                update_team_admin_status, delete_team, delete_module, has_team_access, can_manage_team_content,
+                set_module_chunking,
+                update_document_file, find_ingested_document_by_hash, is_file_referenced, cancel_ingest_jobs,
+                get_ingest_job, get_module_ingest_jobs, create_upload_session, get_upload_session,
+                claim_upload_session, update_upload_session, get_library_entry)
 import json
-from semantic_indexing import answer_question, answer_question_stream
+from semantic_indexing import answer_question, answer_question_stream, is_greeting, COLL_NAME
+from vector_store import store_manager
+from query_cache import get_query_cache
+from answer_cache import get_answer_cache
+import answer_library
+import pdf_extract
+from embedding_cache import get_cache
+from ingest_jobs import enqueue_ingest, start_workers, stop_workers
+from chunking import DEFAULT_CHUNK_SIZE
+from upload_storage import (save_upload, check_content_length, reuse_stored_file, claim_upload_path,
+                            remove_unreferenced_file)
+import resumable_upload
 import logging
 
 # Load env vars
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One shared vector store client for every request and ingest worker
+    store_manager.open()
+    start_workers()
+    resumable_upload.gc_expired_sessions()
+    yield
+    # Workers finish their current job before the store is flushed and closed
+    stop_workers()
+    pdf_extract.shutdown_pool()
+    store_manager.close()
+
+app = FastAPI(lifespan=lifespan)
 security = HTTPBearer()
 
 FRONTEND_URL = (
@@ -89,9 +118,29 @@ class UpdateTeamAdminRequest(BaseModel):
     user_id: int
     is_admin: bool
 
+class CreateUploadSessionRequest(BaseModel):
+    module_id: int
+    filename: str
+    total_size: int  # bytes
+    title: Optional[str] = None
+    part_size: Optional[int] = None  # bytes; server default if omitted
+
+class ModuleChunkingRequest(BaseModel):
+    chunk_size: Optional[int] = None  # tokens; None restores the default
+    chunk_overlap: Optional[int] = None
+
 class DeleteTeamRequest(BaseModel):
     team_id: int
 
+class LibraryEntryRequest(BaseModel):
+    question: str
+    answer: str
+
+class UpdateLibraryEntryRequest(BaseModel):
+    question: Optional[str] = None
+    answer: Optional[str] = None
+    enabled: Optional[bool] = None
+
 class CreateSessionRequest(BaseModel):
     session_name: Optional[str] = None
 
@@ -120,6 +169,34 @@ def get_user_from_token(request: Request):
     except jwt.InvalidTokenError:
         return None
 
+@app.get("/api/health")
+async def health():
+    """Liveness/readiness probe: 503 while the vector store is unreachable"""
+    vector_store = await asyncio.to_thread(store_manager.health, COLL_NAME)
+    status_code = 200 if vector_store["status"] == "ok" else 503
+    return JSONResponse(status_code=status_code, content={"status": vector_store["status"], "vector_store": vector_store})
+
+@app.get("/api/cache_stats")
+async def cache_stats(request: Request):
+    """Hit rates and sizes of the answer, query embedding and persistent embedding caches (system admins only)"""
+    user = get_user_from_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    conn = get_db_connection()
+    user_data = conn.execute("SELECT role FROM users WHERE id = ?", (user["id"],)).fetchone()
+    conn.close()
+
+    if not user_data or user_data["role"] != 1:
+        raise HTTPException(status_code=403, detail="Only system admins can view cache statistics")
+
+    answer_cache, query_cache, embedding_cache = get_answer_cache(), get_query_cache(), get_cache()
+    return {
+        "answers": await asyncio.to_thread(answer_cache.stats) if answer_cache else None,
+        "query_embeddings": query_cache.stats() if query_cache else None,
+        "embeddings": await asyncio.to_thread(embedding_cache.stats) if embedding_cache else None,
+    }
+
 @app.post("/api/login")
 def login(req: LoginRequest):
     conn = get_db_connection()
@@ -202,46 +279,217 @@ async def upload_file(
         user = get_user_from_token(request)
         if not user:
             raise HTTPException(status_code=401, detail="Authentication required")
+        check_content_length(request.headers.get("content-length"))
         
         uploaded_by = user["username"]
         user_id = user["id"]
 
         # Check if user has permission to upload to this module
-        conn = get_db_connection()
-        user_data = conn.execute("SELECT role FROM users WHERE id = ?", (user_id,)).fetchone()
-        module_data = conn.execute("SELECT team_id FROM module WHERE module_id = ?", (module_id,)).fetchone()
-        conn.close()
+        module_data = _check_upload_access(user_id, module_id)
 
-        if not module_data:
-            raise HTTPException(status_code=404, detail="Module not found")
+        # Stream the upload into uploads/<module_id>/ (hashed and size-limited as it is written)
+        saved = await save_upload(file, module_id)
+        return _register_upload(saved, module_id, title, uploaded_by, module_data["team_id"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # System admins can upload to any module
-        if user_data["role"] != 1:
-            # For regular users, check if they are team admin of the module's team
-            if module_data["team_id"] and not is_team_admin(user_id, module_data["team_id"]):
-                raise HTTPException(status_code=403, detail="Only team admins can upload documents to this module")
+def _check_upload_access(user_id, module_id):
+    """Return the module row if the user may upload to it (system admin or team admin)"""
+    conn = get_db_connection()
+    user_data = conn.execute("SELECT role FROM users WHERE id = ?", (user_id,)).fetchone()
+    module_data = conn.execute("SELECT team_id FROM module WHERE module_id = ?", (module_id,)).fetchone()
+    conn.close()
 
-        # Create module directory if it doesn't exist
-        module_dir = os.path.join(UPLOAD_DIR, str(module_id))
+    if not module_data:
+        raise HTTPException(status_code=404, detail="Module not found")
+
+    # System admins can upload to any module
+    if user_data["role"] != 1:
+        # For regular users, check if they are team admin of the module's team
+        if module_data["team_id"] and not is_team_admin(user_id, module_data["team_id"]):
+            raise HTTPException(status_code=403, detail="Only team admins can upload documents to this module")
+    return module_data
+
+def _register_upload(saved, module_id, title, uploaded_by, team_id):
+    """Record a stored upload as a document and queue its ingestion"""
+    file_location = saved["file_path"]
+
+    # Identical bytes already ingested (e.g. the same questionnaire in another team's module) and
+    # chunked with this module's settings: share the stored file and copy its points instead of
+    # extracting and embedding again. Otherwise the embedding cache still spares most of the cost.
+    duplicate = find_ingested_document_by_hash(saved["sha256"], module_id)
+    if duplicate:
+        reuse_stored_file(file_location, duplicate["file_path"])
+
+    # Save file info to the database
+    doc_id = add_document(module_id, title, file_location, uploaded_by, team_id, saved["sha256"])
+
+    # Queue background ingestion (text + images) with team_id for strict isolation
+    job_id = enqueue_ingest(doc_id, module_id, file_location, title, team_id=team_id,
+                            source_document_id=duplicate["document_id"] if duplicate else None)
+
+    return {"success": True, "file_path": file_location, "document_id": doc_id, "module_id": module_id,
+            "job_id": job_id, "status": "queued", "sha256": saved["sha256"], "size": saved["size"],
+            "duplicate_of": duplicate["document_id"] if duplicate else None}
+
+@app.post("/api/uploads")
+async def create_upload_session_endpoint(request: Request, upload: CreateUploadSessionRequest):
+    """Start a resumable upload; parts are then PUT individually"""
+    user = get_user_from_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    module_data = _check_upload_access(user["id"], upload.module_id)
+    if not os.path.basename(upload.filename):
+        raise HTTPException(status_code=400, detail="filename is required")
+    part_size, total_parts = resumable_upload.plan_parts(upload.total_size, upload.part_size)
+
+    await asyncio.to_thread(resumable_upload.gc_expired_sessions)
+    upload_id = resumable_upload.new_upload_id()
+    expires_at = time.time() + resumable_upload.UPLOAD_SESSION_TTL_SECONDS
+    create_upload_session(upload_id, user["id"], user["username"], upload.module_id, module_data["team_id"],
+                          upload.title, os.path.basename(upload.filename), upload.total_size, part_size,
+                          total_parts, expires_at)
+    return {"upload_id": upload_id, "part_size": part_size, "total_parts": total_parts, "expires_at": expires_at}
+
+def _get_own_upload_session(request, upload_id):
+    user = get_user_from_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    session = get_upload_session(upload_id)
+    if not session or session["user_id"] != user["id"]:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session["status"] == "open" and session["expires_at"] < time.time():
+        raise HTTPException(status_code=410, detail="Upload session expired")
+    return session
+
+@app.put("/api/uploads/{upload_id}/parts/{part_number}")
+async def upload_part(request: Request, upload_id: str, part_number: int):
+    """Store one part (raw request body). Parts may arrive in any order and in parallel."""
+    session = _get_own_upload_session(request, upload_id)
+    if session["status"] != "open":
+        raise HTTPException(status_code=409, detail=f"Upload session is {session['status']}")
+    return await resumable_upload.write_part(session, part_number, request.stream())
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload_session_endpoint(request: Request, upload_id: str):
+    """Session state with the parts received so far (to resume after a dropped connection)"""
+    session = _get_own_upload_session(request, upload_id)
+    present = await asyncio.to_thread(resumable_upload.present_parts, session) if session["status"] == "open" else []
+    missing = sorted(set(range(1, session["total_parts"] + 1)) - set(present)) if session["status"] == "open" else []
+    return {"upload": session, "parts_present": present, "parts_missing": missing}
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload_session(request: Request, upload_id: str):
+    """Assemble the parts into uploads/<module_id>/ and queue ingestion"""
+    session = _get_own_upload_session(request, upload_id)
+    if not claim_upload_session(upload_id):
+        raise HTTPException(status_code=409, detail=f"Upload session is {session['status']}")
+    file_location = None
+    try:
+        module_dir = os.path.join(UPLOAD_DIR, str(session["module_id"]))
         os.makedirs(module_dir, exist_ok=True)
+        file_location = claim_upload_path(module_dir, os.path.basename(session["filename"]))
+        saved = await asyncio.to_thread(resumable_upload.assemble, session, file_location)
+        result = _register_upload(saved, session["module_id"], session["title"] or session["filename"],
+                                  session["uploaded_by"], session["team_id"])
+    except BaseException:
+        # Parts stay on disk, so the client can fix missing parts and complete again
+        if file_location:
+            remove_unreferenced_file(file_location, is_file_referenced)
+        update_upload_session(upload_id, "open")
+        raise
+    update_upload_session(upload_id, "done", result["document_id"])
+    return result
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_upload_session(request: Request, upload_id: str):
+    """Abort a resumable upload and delete its parts"""
+    session = _get_own_upload_session(request, upload_id)
+    if session["status"] != "open":
+        raise HTTPException(status_code=409, detail=f"Upload session is {session['status']}")
+    update_upload_session(upload_id, "aborted")
+    await asyncio.to_thread(resumable_upload.discard_session, upload_id)
+    return {"success": True}
+
+@app.post("/api/documents/{document_id}/reupload")
+async def reupload_file(request: Request, document_id: int, file: UploadFile = File(...)):
+    """Replace a document with a revised file; only changed chunks are re-embedded"""
+    try:
+        user = get_user_from_token(request)
+        if not user:
+            raise HTTPException(status_code=401, detail="Authentication required")
+        check_content_length(request.headers.get("content-length"))
 
-        # Save the uploaded file
-        file_location = os.path.join(module_dir, file.filename)
-        with open(file_location, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        # Save file info to the database
-        doc_id = add_document(module_id, title, file_location, uploaded_by, module_data["team_id"])
-
-        # After saving, ingest the file (text + images) with team_id for strict isolation
-        from semantic_indexing import ingest
-        ingest(file_location, doc_id, module_id, team_id=module_data["team_id"])
+        conn = get_db_connection()
+        user_data = conn.execute("SELECT role FROM users WHERE id = ?", (user["id"],)).fetchone()
+        document = conn.execute("SELECT document_id, module_id, title, file_path, team_id FROM documents WHERE document_id = ?",
+                                (document_id,)).fetchone()
+        conn.close()
 
-        return {"success": True, "file_path": file_location, "document_id": doc_id, "module_id": module_id}
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        if user_data["role"] != 1 and document["team_id"] and not is_team_admin(user["id"], document["team_id"]):
+            raise HTTPException(status_code=403, detail="Only team admins can update documents in this module")
+
+        # A new file of its own (never another document's), then drop the previous revision
+        saved = await save_upload(file, document["module_id"])
+        file_location = saved["file_path"]
+        update_document_file(document_id, file_location, saved["sha256"])
+        if document["file_path"] and document["file_path"] != file_location:
+            try:
+                remove_unreferenced_file(document["file_path"], is_file_referenced)
+            except OSError as e:
+                logger.warning(f"Failed to delete previous file {document['file_path']}: {e}")
+
+        # Same document_id: the ingest diffs against the stored points instead of starting over
+        job_id = enqueue_ingest(document_id, document["module_id"], file_location, document["title"],
+                                team_id=document["team_id"])
+        return {"success": True, "file_path": file_location, "document_id": document_id,
+                "module_id": document["module_id"], "job_id": job_id, "status": "queued",
+                "sha256": saved["sha256"], "size": saved["size"]}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _can_view_module(user_id, module_id):
+    """System admins see every module; other users need access to the module's team"""
+    conn = get_db_connection()
+    user_data = conn.execute("SELECT role FROM users WHERE id = ?", (user_id,)).fetchone()
+    module_data = conn.execute("SELECT team_id FROM module WHERE module_id = ?", (module_id,)).fetchone()
+    conn.close()
+    if user_data and user_data["role"] == 1:
+        return True
+    if not module_data:
+        return False
+    return module_data["team_id"] is None or has_team_access(user_id, module_data["team_id"])
+
+@app.get("/api/ingest_jobs/{job_id}")
+async def get_ingest_job_endpoint(request: Request, job_id: int):
+    """Get state, progress and timings of a background ingestion job"""
+    user = get_user_from_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    job = get_ingest_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    if not _can_view_module(user["id"], job["module_id"]):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return {"job": job}
+
+@app.get("/api/ingest_jobs")
+async def list_ingest_jobs_endpoint(request: Request, module_id: int, limit: int = Query(100, ge=1, le=1000)):
+    """List recent ingestion jobs for a module"""
+    user = get_user_from_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if not _can_view_module(user["id"], module_id):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return {"jobs": get_module_ingest_jobs(module_id, limit)}
+
 @app.get("/api/users")
 def get_users():
     conn = get_db_connection()
@@ -394,6 +642,67 @@ async def delete_team_endpoint(request: Request, team_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Answer Library Endpoints (approved Q&A pairs that /api/ask answers from directly)
+@app.get("/api/teams/{team_id}/answer_library")
+def get_answer_library(request: Request, team_id: int):
+    """List a team's approved Q&A pairs"""
+    user = get_user_from_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if not has_team_access(user["id"], team_id):
+        raise HTTPException(status_code=403, detail="Access denied: You don't have permission to access this team")
+    return {"entries": answer_library.list_entries(team_id)}
+
+@app.post("/api/teams/{team_id}/answer_library")
+def add_answer_library_entry(request: Request, team_id: int, entry: LibraryEntryRequest):
+    """Add an approved Q&A pair to a team's library"""
+    user = get_user_from_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if not can_manage_team_content(user["id"], team_id):
+        raise HTTPException(status_code=403, detail="Only team admins or system admins can edit the answer library")
+    if not entry.question.strip() or not entry.answer.strip():
+        raise HTTPException(status_code=400, detail="Question and answer are required")
+    try:
+        return {"success": True, "entry": answer_library.add_entry(team_id, entry.question, entry.answer, user["id"])}
+    except Exception as e:
+        logger.error(f"Error adding answer library entry: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _library_entry_for_admin(request: Request, entry_id: int) -> dict:
+    user = get_user_from_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    entry = get_library_entry(entry_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Library entry not found")
+    if not can_manage_team_content(user["id"], entry["team_id"]):
+        raise HTTPException(status_code=403, detail="Only team admins or system admins can edit the answer library")
+    return entry
+
+@app.put("/api/answer_library/{entry_id}")
+def update_answer_library_entry(request: Request, entry_id: int, changes: UpdateLibraryEntryRequest):
+    """Edit or disable an approved Q&A pair (a changed question is re-embedded)"""
+    _library_entry_for_admin(request, entry_id)
+    if (changes.question is not None and not changes.question.strip()) or (changes.answer is not None and not changes.answer.strip()):
+        raise HTTPException(status_code=400, detail="Question and answer cannot be empty")
+    try:
+        return {"success": True, "entry": answer_library.update_entry(entry_id, changes.question, changes.answer,
+                                                                      changes.enabled)}
+    except Exception as e:
+        logger.error(f"Error updating answer library entry {entry_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/answer_library/{entry_id}")
+def delete_answer_library_entry(request: Request, entry_id: int):
+    _library_entry_for_admin(request, entry_id)
+    try:
+        answer_library.delete_entry(entry_id)
+        return {"success": True}
+    except Exception as e:
+        logger.error(f"Error deleting answer library entry {entry_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/all-users")
 async def get_all_users_endpoint(request: Request):
     """Get all users for team management"""
@@ -497,14 +806,16 @@ async def api_create_module(
     request: Request, 
     name: str = Form(...), 
     description: str = Form(None),
-    team_id: int = Form(None)
+    team_id: int = Form(None),
+    chunk_size: int = Form(None),
+    chunk_overlap: int = Form(None)
 ):
+    # Extract user from JWT token
+    user = get_user_from_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    _validate_chunking(chunk_size, chunk_overlap)
     try:
-        # Extract user from JWT token
-        user = get_user_from_token(request)
-        if not user:
-            raise HTTPException(status_code=401, detail="Authentication required")
-        
         user_id = user["id"]
 
         # Check permissions
@@ -518,11 +829,40 @@ async def api_create_module(
             if team_id and not is_team_admin(user_id, team_id):
                 raise HTTPException(status_code=403, detail="Only team admins can create modules for this team")
 
-        module_id = create_module(name, description, team_id)
+        module_id = create_module(name, description, team_id, chunk_size, chunk_overlap)
         return {"success": True, "module_id": module_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _validate_chunking(chunk_size, chunk_overlap):
+    if chunk_size is not None and not 16 <= chunk_size <= 8191:
+        raise HTTPException(status_code=400, detail="chunk_size must be between 16 and 8191 tokens")
+    if chunk_overlap is not None and (chunk_overlap < 0 or chunk_overlap >= (chunk_size or DEFAULT_CHUNK_SIZE)):
+        raise HTTPException(status_code=400, detail="chunk_overlap must be non-negative and smaller than chunk_size")
+
+@app.put("/api/modules/{module_id}/chunking")
+async def update_module_chunking(request: Request, module_id: int, settings: ModuleChunkingRequest):
+    """Set a module's chunk size/overlap; applies to documents ingested afterwards"""
+    user = get_user_from_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    _validate_chunking(settings.chunk_size, settings.chunk_overlap)
+
+    conn = get_db_connection()
+    user_data = conn.execute("SELECT role FROM users WHERE id = ?", (user["id"],)).fetchone()
+    module_data = conn.execute("SELECT team_id FROM module WHERE module_id = ?", (module_id,)).fetchone()
+    conn.close()
+    if not module_data:
+        raise HTTPException(status_code=404, detail="Module not found")
+    if user_data["role"] != 1 and not (module_data["team_id"] and is_team_admin(user["id"], module_data["team_id"])):
+        raise HTTPException(status_code=403, detail="Only team admins or system admins can change module settings")
+
+    set_module_chunking(module_id, settings.chunk_size, settings.chunk_overlap)
+    return {"success": True, "module_id": module_id,
+            "chunk_size": settings.chunk_size, "chunk_overlap": settings.chunk_overlap}
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -689,17 +1029,30 @@ async def ask(request: Request):
                     search_team_ids = None
                     logger.info(f"General query for admin: no team restrictions")
                 
-                for chunk in answer_question_stream(
-                    question, 
-                    module_id=module_id, 
-                    team_id=team_id, 
-                    user_config=user_config, 
-                    chat_history=chat_history,
-                    user_team_ids=search_team_ids,
-                    use_general_llm=use_general_llm
-                ):
-                    response_chunks.append(chunk)
-                    yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+                # Approved answers from the libraries of the teams being searched skip retrieval and the LLM
+                # (greetings are answered by answer_question_stream without either)
+                library_entry = None
+                if not use_general_llm and not is_greeting(question):
+                    library_team_ids = ([team_id] if team_id is not None else []) if module_id is not None else search_team_ids
+                    try:
+                        library_entry = answer_library.match_library_answer(question, library_team_ids)
+                    except Exception as e:
+                        logger.warning(f"Answer library lookup failed: {e}")
+                if library_entry:
+                    response_chunks.append(library_entry["answer"])
+                    yield f"data: {json.dumps({'chunk': library_entry['answer'], 'from_library': True, 'library_entry_id': library_entry['entry_id']})}\n\n"
+                else:
+                    for chunk in answer_question_stream(
+                        question, 
+                        module_id=module_id, 
+                        team_id=team_id, 
+                        user_config=user_config, 
+                        chat_history=chat_history,
+                        user_team_ids=search_team_ids,
+                        use_general_llm=use_general_llm
+                    ):
+                        response_chunks.append(chunk)
+                        yield f"data: {json.dumps({'chunk': chunk})}\n\n"
                 
                 # Save assistant response if session_id is provided
                 if session_id and user_id and response_chunks:
@@ -710,7 +1063,7 @@ async def ask(request: Request):
                     except Exception as e:
                         logger.warning(f"Failed to save assistant message: {e}")
                 
-                yield f"data: {json.dumps({'done': True})}\n\n"
+                yield f"data: {json.dumps({'done': True, 'from_library': library_entry is not None})}\n\n"
             except Exception as e:
                 logger.error(f"Error in streaming: {e}")
                 yield f"data: {json.dumps({'error': 'Internal server error'})}\n\n"
@@ -887,7 +1240,14 @@ def api_delete_document(document_id: int):
         if result:
             file_path = result[0]
             
-            # Delete embeddings for this document first
+            # Cancel its ingest jobs and delete the document record first: an ingest still
+            # running then finds the document gone and removes what it indexed itself
+            cancel_ingest_jobs(cursor, [document_id])
+            cursor.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+            conn.commit()
+            conn.close()
+            
+            # Delete embeddings for this document
             try:
                 from semantic_indexing import delete_document_embeddings
                 delete_document_embeddings(document_id)
@@ -895,15 +1255,9 @@ def api_delete_document(document_id: int):
             except Exception as e:
                 logger.warning(f"Failed to delete embeddings for document {document_id}: {e}")
             
-            # Delete document record
-            cursor.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
-            conn.commit()
-            conn.close()
-            
-            # Delete physical file
+            # Delete physical file, unless another document still uses it
             try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+                remove_unreferenced_file(file_path, is_file_referenced)
             except Exception as e:
                 logger.warning(f"Failed to delete file {file_path}: {e}")
             
@@ -994,6 +1348,17 @@ def get_document_file(module_id: int, filename: str):
         raise HTTPException(status_code=404, detail="File not found")
     return FileResponse(file_path)
 
+@app.get("/api/images/{sha256}")
+def get_image_by_hash(sha256: str):
+    """Serve an extracted document image from the content-addressed image store"""
+    from image_store import image_path, image_mime
+    path = image_path(sha256)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="Image not found")
+    # Content-addressed: the bytes behind a hash never change
+    return FileResponse(path, media_type=image_mime(sha256),
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
 @app.get("/api/document_text/{module_id}/{filename}")
 async def get_document_text(module_id: int, filename: str, token: HTTPAuthorizationCredentials = Depends(security)):
     """Extract and return text content from documents for preview"""
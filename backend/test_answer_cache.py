@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test script for the versioned answer cache
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from answer_cache import AnswerCache, search_scopes, content_scopes, GLOBAL_SCOPE
+
+CONFIG = {"show_source": "Yes", "chat_persona": "Friendly", "response_mode": "concise"}
+
+def test_answer_cache():
+    print("Testing answer cache...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AnswerCache(os.path.join(tmp, "answers.db"), similarity=0.95)
+        module = search_scopes(module_id=3, team_id=1)
+        bucket = cache.bucket(module, CONFIG)
+        cache.store(bucket, "What is our SLA for P1 incidents?", "Four hours.", [1.0, 0.0, 0.0])
+
+        assert cache.lookup(cache.bucket(module, CONFIG), "what is our SLA for p1  incidents?") == "Four hours."
+        assert cache.lookup(cache.bucket(module, {**CONFIG, "response_mode": "detailed"}), "What is our SLA for P1 incidents?")
+        assert cache.lookup(cache.bucket(module, {**CONFIG, "chat_persona": "Professional"}), "What is our SLA for P1 incidents?") is None
+        assert cache.lookup(cache.bucket(search_scopes(module_id=4), CONFIG), "What is our SLA for P1 incidents?") is None
+        assert cache.lookup(cache.bucket(module, CONFIG, [{"role": "user", "content": "hi"}]),
+                            "What is our SLA for P1 incidents?") is None
+        print("✅ Exact hits keyed by normalized question, scope, answer-shaping config and history")
+
+        assert cache.lookup(bucket, "P1 incident SLA?", lambda: [0.99, 0.1, 0.0]) == "Four hours."
+        assert cache.lookup(bucket, "Who approves travel?", lambda: [0.0, 1.0, 0.0]) is None
+        print("✅ Near-duplicate questions hit above the similarity threshold")
+
+        cache.bump(content_scopes(module_id=4, team_id=1))
+        assert cache.lookup(cache.bucket(module, CONFIG), "What is our SLA for P1 incidents?") == "Four hours."
+        cache.bump(content_scopes(module_id=3, team_id=1))
+        assert cache.lookup(cache.bucket(module, CONFIG), "What is our SLA for P1 incidents?") is None
+        print("✅ Index version bumps invalidate only the scopes they touch")
+
+        teams = search_scopes(user_team_ids=[2, 1])
+        cache.store(cache.bucket(teams, CONFIG), "Q", "A")
+        cache.bump([GLOBAL_SCOPE])
+        assert cache.lookup(cache.bucket(teams, CONFIG), "Q") is None
+        print("✅ The global version invalidates every scope")
+
+        stats = cache.stats()
+        assert stats["hits"] == 3 and stats["semantic_hits"] == 1 and stats["misses"] == 6
+        print(f"✅ Hit/miss counters: {stats}")
+
+    print("\n🎉 All answer cache tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_answer_cache()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test script for answer library matching (team scoping and disabled entries)
+"""
+
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+import db
+import answer_library
+from vector_store import LocalANNStore
+
+QUESTION = "What is our SLA for P1 incidents?"
+
+def fake_embedding(text):
+    """Same text, same vector; different texts are near-orthogonal"""
+    seed = int.from_bytes(hashlib.sha256(text.strip().lower().encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).normal(size=answer_library.TXT_DIM).tolist()
+
+def test_answer_library():
+    print("Testing answer library matching...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A scratch copy of the database: initialize_db() migrates, but does not create, the base schema
+        db_path = shutil.copy(db.DB_PATH, os.path.join(tmp, "users.db"))
+        store = LocalANNStore(os.path.join(tmp, "store"))
+        answer_library._ensure_library_collection(store)
+        with mock.patch.object(db, "DB_PATH", db_path), \
+                mock.patch.object(answer_library, "store", store), \
+                mock.patch.object(answer_library, "openai_embed", lambda texts: [fake_embedding(t) for t in texts]), \
+                mock.patch.object(answer_library, "embed_query", lambda q: (fake_embedding(q), None)):
+            db.initialize_db()
+            team, other_team = db.create_team("Bids"), db.create_team("Other")
+            entry = answer_library.add_entry(team, QUESTION, "Four hours, 24/7.")
+
+            assert answer_library.match_library_answer(QUESTION, [team])["entry_id"] == entry["entry_id"]
+            assert answer_library.match_library_answer(QUESTION, None)["answer"] == "Four hours, 24/7."
+            assert answer_library.match_library_answer("Who approves travel?", [team]) is None
+            print("✅ The team's own library answers its question")
+
+            assert answer_library.match_library_answer(QUESTION, [other_team]) is None
+            assert answer_library.match_library_answer(QUESTION, []) is None  # e.g. a module without a team
+            print("✅ Another team's entry never matches")
+
+            answer_library.update_entry(entry["entry_id"], enabled=False)
+            assert answer_library.match_library_answer(QUESTION, [team]) is None
+            assert answer_library.match_library_answer(QUESTION, None) is None
+            answer_library.update_entry(entry["entry_id"], question="P1 incident SLA?")  # re-embedded, still disabled
+            assert answer_library.match_library_answer("P1 incident SLA?", [team]) is None
+            answer_library.update_entry(entry["entry_id"], enabled=True)
+            assert answer_library.match_library_answer("P1 incident SLA?", [team])["entry_id"] == entry["entry_id"]
+            print("✅ A disabled entry never matches until it is enabled again")
+
+            answer_library.delete_entry(entry["entry_id"])
+            assert answer_library.match_library_answer("P1 incident SLA?", [team]) is None
+            print("✅ Deleted entries no longer match")
+
+    print("\n🎉 All answer library tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_answer_library()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
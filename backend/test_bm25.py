@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test script for BM25 sparse vectors and sparse search in the local ANN store
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from qdrant_client.http import models as qmodels
+
+from bm25 import BM25_VECTOR, tokenize, term_id, document_vector, query_vector
+from vector_store import LocalANNStore
+
+DOCS = {
+    1: "Call GET /api/v2/users to list accounts. The endpoint pages results.",
+    2: "The XR-200B controller replaces the XR-100 series.",
+    3: "Our support team answers P1 incidents within four hours.",
+    4: "Users can list their own accounts from the dashboard.",
+}
+
+def test_bm25():
+    print("Testing BM25 sparse vectors...")
+
+    tokens = tokenize("Call GET /api/v2/users for the XR-200B")
+    assert "api/v2/users" in tokens and "users" in tokens and "xr-200b" in tokens and "200b" in tokens
+    assert "the" not in tokens and "for" not in tokens
+    assert term_id("xr-200b") == term_id("xr-200b") and 0 <= term_id("xr-200b") < 2 ** 31
+    print(f"✅ Compound tokens kept whole alongside their parts: {tokens}")
+
+    short, long = document_vector("xr-200b controller"), document_vector("xr-200b controller " + "filler words " * 100)
+    weight = lambda v, token: v.values[v.indices.index(term_id(token))]
+    assert weight(short, "xr-200b") > weight(long, "xr-200b")
+    assert document_vector("the and of") is None and query_vector("") is None
+    print("✅ Term weights are length-normalised; empty texts have no vector")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LocalANNStore(tmp)
+        store.create_collection("chunks", vectors_config={"text": qmodels.VectorParams(size=2, distance="Cosine")},
+                                sparse_vectors_config={BM25_VECTOR: qmodels.SparseVectorParams(modifier=qmodels.Modifier.IDF)})
+        store.upsert("chunks", points=[
+            qmodels.PointStruct(id=i, vector={"text": [1.0, float(i)], BM25_VECTOR: document_vector(text)},
+                                payload={"team_id": i % 2, "text": text})
+            for i, text in DOCS.items()
+        ])
+
+        hits = store.query_points("chunks", query=query_vector("/api/v2/users"), using=BM25_VECTOR, limit=3).points
+        assert hits[0].id == 1 and len(hits) == 2
+        hits = store.query_points("chunks", query=query_vector("XR-200B"), using=BM25_VECTOR, limit=3).points
+        assert [h.id for h in hits] == [2]
+        print("✅ Endpoint paths and product codes rank their chunk first")
+
+        flt = qmodels.Filter(must=[qmodels.FieldCondition(key="team_id", match=qmodels.MatchValue(value=0))])
+        hits = store.query_points("chunks", query=query_vector("list accounts"), using=BM25_VECTOR, query_filter=flt, limit=3).points
+        assert [h.id for h in hits] == [4]
+        print("✅ Payload filters apply to sparse search")
+
+        store.delete("chunks", points_selector=qmodels.PointIdsList(points=[2]))
+        assert not store.query_points("chunks", query=query_vector("XR-200B"), using=BM25_VECTOR, limit=3).points
+        record = next(r for r in store.scroll("chunks", limit=10, with_vectors=True)[0] if r.id == 1)
+        assert record.vector[BM25_VECTOR].indices == document_vector(DOCS[1]).indices
+        assert BM25_VECTOR in store.get_collection("chunks").config.params.sparse_vectors
+        print("✅ Deleted points leave the postings; stored sparse vectors round-trip")
+
+    print("\n🎉 All BM25 tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_bm25()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
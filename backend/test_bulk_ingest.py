@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test script for bulk ingestion (shared embedder, checkpoint resume, directories and zip archives)
+"""
+
+import os
+import sys
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from qdrant_client.http import models as qmodels
+
+import db
+import vector_store
+import keyword_index
+import answer_cache
+import bulk_ingest
+import semantic_indexing
+from bulk_ingest import SharedEmbedder, Checkpoint, iter_sources
+
+class CountingEmbed:
+    """Deterministic fake openai_embed recording each call's input count"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self.lock:
+            self.calls.append(len(texts))
+        return [np.random.default_rng(int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:8], "little"))
+                .normal(size=semantic_indexing.TXT_DIM).tolist() for t in texts]
+
+def document(topic, n=6):
+    return "\n\n".join(f"The {topic} procedure step {i} requires sign-off from the duty manager." for i in range(n))
+
+def stored_docs(module_id):
+    points, _ = semantic_indexing.qdrant.scroll(semantic_indexing.COLL_NAME, limit=10000, with_payload=True,
+                                                scroll_filter=qmodels.Filter(must=[qmodels.FieldCondition(
+                                                    key="module_id", match=qmodels.MatchValue(value=module_id))]))
+    return {p.payload["doc_id"] for p in points}
+
+def test_bulk_ingest():
+    print("Testing bulk ingestion...")
+
+    # Shared embedder: concurrent callers share requests and each gets its own vectors back
+    embed = CountingEmbed()
+    embedder = SharedEmbedder(embed, max_inputs=64, max_wait=0.2)
+    results, barrier = {}, threading.Barrier(8)
+    def worker(n):
+        texts = [f"worker {n} text {i}" for i in range(3)]
+        barrier.wait()
+        results[n] = (texts, embedder.embed(texts))
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    requests = len(embed.calls)
+    assert sum(embed.calls) == 24 and requests < 8, embed.calls
+    assert all(vectors == embed(texts) for texts, vectors in results.values())
+    assert embedder.embed([]) == []
+    embedder.close()
+
+    failing = SharedEmbedder(lambda texts: 1 / 0)
+    try:
+        failing.embed(["x"])
+        raise AssertionError("the embedding error was swallowed")
+    except ZeroDivisionError:
+        pass
+    failing.close()
+    print(f"✅ 8 concurrent callers served by {requests} embedding request(s); errors reach every caller")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Checkpoint: last entry per key wins, a torn last line is ignored
+        path = os.path.join(tmp, "run.jsonl")
+        checkpoint = Checkpoint(path)
+        checkpoint.record("a", status="registered", document_id=1)
+        checkpoint.record("a", status="done")
+        with open(path, "a") as f:
+            f.write('{"key": "b", "sta')
+        reloaded = Checkpoint(path)
+        assert reloaded.get("a")["status"] == "done" and reloaded.get("a")["document_id"] == 1
+        assert reloaded.get("b") is None
+        print("✅ The checkpoint survives a torn last line; the last entry per file wins")
+
+        # Sources: directories recursively, zip members, unsupported files skipped
+        source = Path(tmp) / "rfps"
+        (source / "2023").mkdir(parents=True)
+        (source / "2024").mkdir()
+        (source / "2023" / "policy.txt").write_text(document("escalation"))
+        (source / "2024" / "policy.txt").write_text(document("onboarding"))
+        (source / "2024" / "notes.md").write_text(document("release"))
+        (source / "2024" / "logo.png").write_bytes(b"\x89PNG")
+        (source / "2024" / "broken.pdf").write_bytes(b"not a pdf")
+        archive = Path(tmp) / "archive.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("old/policy.txt", document("procurement"))
+            zf.writestr("__MACOSX/old/._policy.txt", "resource fork")
+            zf.writestr("old/readme.html", "<p>skip</p>")
+        keys = [key for key, _, _ in iter_sources([str(source), str(archive)])]
+        assert len(keys) == 5 and f"{archive.resolve()}::old/policy.txt" in keys
+        assert not [k for k in keys if "MACOSX" in k or k.endswith((".png", ".html"))]
+        print("✅ Directories and zip archives yield only supported files")
+
+        # A scratch copy of the database: initialize_db() migrates, but does not create, the base schema
+        db_path = shutil.copy(db.DB_PATH, os.path.join(tmp, "users.db"))
+        semantic_indexing.store_manager.close()
+        embed = CountingEmbed()
+        with mock.patch.object(db, "DB_PATH", db_path), \
+                mock.patch.multiple(vector_store, VECTOR_STORE="ann", ANN_PATH=os.path.join(tmp, "store")), \
+                mock.patch.object(keyword_index, "_keyword_index", keyword_index.KeywordIndex(os.path.join(tmp, "keywords.db"))), \
+                mock.patch.object(answer_cache, "_answer_cache", answer_cache.AnswerCache(os.path.join(tmp, "answers.db"))), \
+                mock.patch.object(semantic_indexing, "openai_embed", embed), \
+                mock.patch.object(bulk_ingest, "UPLOAD_DIR", Path(tmp) / "uploads"):
+            try:
+                db.initialize_db()
+                module = db.create_module("Past RFPs")
+                run_checkpoint = os.path.join(tmp, "bulk.jsonl")
+                totals = bulk_ingest.bulk_ingest([str(source), str(archive)], module, workers=4, checkpoint_path=run_checkpoint)
+                assert (totals["documents"], totals["failed"], totals["skipped"]) == (4, 1, 0), totals
+                staged = sorted(os.listdir(Path(tmp) / "uploads" / str(module)))
+                assert len(staged) == 5 and not [name for name in staged if name.endswith(".part")]
+                entries = Checkpoint(run_checkpoint).entries
+                assert sorted(e["status"] for e in entries.values()) == ["done"] * 4 + ["failed"]
+                documents = {key: e["document_id"] for key, e in entries.items()}
+                assert stored_docs(module) == {str(d) for key, d in documents.items() if not key.endswith("broken.pdf")}
+                print("✅ A bulk run ingests every file with its own staged copy; the broken one is recorded as failed")
+
+                jobs = {job["document_id"]: job for job in db.get_module_ingest_jobs(module)}
+                assert sorted(job["status"] for job in jobs.values()) == ["done"] * 4 + ["failed"]
+                assert all(jobs[d]["chunks_done"] > 0 for key, d in documents.items() if not key.endswith("broken.pdf"))
+                policy = str((source / "2024" / "policy.txt").resolve())
+                digest = hashlib.sha256(open(policy, "rb").read()).hexdigest()
+                assert db.find_ingested_document_by_hash(digest, module)["document_id"] == documents[policy]
+                print("✅ Bulk ingests are recorded as jobs and hashed, so their documents serve as dedupe sources")
+
+                embed.calls.clear()
+                totals = bulk_ingest.bulk_ingest([str(source), str(archive)], module, workers=4, checkpoint_path=run_checkpoint)
+                assert (totals["documents"], totals["failed"], totals["skipped"]) == (0, 1, 4), totals
+                assert embed.calls == []
+                print("✅ A re-run skips finished files and retries the failed one")
+
+                changed = source / "2023" / "policy.txt"
+                changed.write_text(document("escalation") + "\n\nA new final step covers weekend cover.")
+                os.utime(changed, (1, 1))  # a different size and mtime: a new fingerprint
+                totals = bulk_ingest.bulk_ingest([str(source), str(archive)], module, workers=2, checkpoint_path=run_checkpoint)
+                assert (totals["documents"], totals["skipped"]) == (1, 3), totals
+                assert sum(embed.calls) == 1  # only the new chunk is embedded
+                assert Checkpoint(run_checkpoint).get(str(changed.resolve()))["document_id"] == documents[str(changed.resolve())]
+                assert len(os.listdir(Path(tmp) / "uploads" / str(module))) == 5
+                print("✅ A changed file is re-ingested incrementally under its existing document id")
+            finally:
+                semantic_indexing.store_manager.close()
+
+    print("\n🎉 All bulk ingest tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_bulk_ingest()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
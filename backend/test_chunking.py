@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for the chunking engine: legacy compatibility, size limits, overlap and speed
+"""
+
+import os
+import re
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chunking import chunk_text, extract_entities, enc_tok
+
+def _legacy_entities(text):
+    entities = set()
+    for match in re.finditer(r"[A-Z][a-z]+[A-Za-z0-9_]*|[A-Z0-9_]{2,}", text):
+        entities.add(match.group(0))
+    for match in re.finditer(r"(?:GET|POST|PUT|DELETE|PATCH)\s+[/\w\-:]+", text):
+        entities.add(match.group(0))
+    for match in re.finditer(r"/[/\w\-:]+", text):
+        entities.add(match.group(0))
+    tech_keywords = [
+        "endpoint", "endpoints", "API", "backend", "frontend", "database",
+        "service", "server", "client", "authentication", "authorization",
+        "register", "login", "profile", "update", "tech stack", "technology"
+    ]
+    text_lower = text.lower()
+    for keyword in tech_keywords:
+        if keyword.lower() in text_lower:
+            entities.add(keyword)
+    return entities
+
+def _legacy_chunks(text, max_tokens=150):
+    """The original _sentence_chunk(), kept here as the compatibility reference"""
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if any(k in paragraph.lower() for k in ["endpoint", "api", "post", "get", "put", "delete", "patch"]):
+            lines = [paragraph]
+        else:
+            lines = [s.strip() for s in re.split(r"[.?!]", paragraph) if s.strip()]
+        for line in lines:
+            line_tokens = len(enc_tok.encode(line))
+            if current_tokens + line_tokens > max_tokens and current:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(line)
+            current_tokens += line_tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+CORPUS = "\n".join(
+    f"Section {i}. The Payments service talks to the database through an ORM! Is the backend stateless? "
+    f"Yes, mostly.\nPOST /api/v1/orders/{i} creates an order; GET /api/v1/orders lists the endpoints.\n"
+    f"{'Long sentence without punctuation ' * (i % 40)}\n"
+    for i in range(400)
+)
+
+def test_chunking():
+    print("Testing chunking engine...")
+
+    for size in (40, 150, 512):
+        chunks = chunk_text(CORPUS, chunk_size=size, compat=True)
+        assert [c.text for c in chunks] == _legacy_chunks(CORPUS, size)
+        assert all(set(c.entities) == _legacy_entities(c.text) for c in chunks)
+    print("✅ Compatibility mode reproduces legacy chunks and entities")
+
+    chunks = chunk_text(CORPUS, chunk_size=64, chunk_overlap=0)
+    assert all(len(enc_tok.encode(c.text)) <= 64 + 8 for c in chunks)
+    overlapping = chunk_text(CORPUS, chunk_size=64, chunk_overlap=16)
+    assert len(overlapping) > len(chunks)
+    shared = sum(1 for a, b in zip(overlapping, overlapping[1:]) if a.text.split(" ")[-1] in b.text)
+    assert shared > len(overlapping) // 2
+    print(f"✅ Token-bounded chunks with overlap ({len(chunks)} -> {len(overlapping)} chunks)")
+
+    assert "endpoint" in extract_entities("Two endpoints") and "endpoints" in extract_entities("Two endpoints")
+    print("✅ Keyword matcher keeps implied keywords")
+
+    started = time.perf_counter()
+    _legacy_chunks(CORPUS)
+    [_legacy_entities(c) for c in _legacy_chunks(CORPUS)]
+    legacy = time.perf_counter() - started
+    started = time.perf_counter()
+    chunk_text(CORPUS, compat=True)
+    current = time.perf_counter() - started
+    print(f"✅ Legacy {legacy * 1000:.0f} ms vs engine {current * 1000:.0f} ms ({legacy / current:.1f}x)")
+
+    print("\n🎉 All chunking tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_chunking()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for batched CLIP image embedding (batching, decode failures and the embedding cache)
+"""
+
+import io
+import os
+import sys
+import tempfile
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from PIL import Image
+
+import semantic_indexing
+from semantic_indexing import clip_image_embed_batch, clip_image_embed, IMG_DIM
+from embedding_cache import EmbeddingCache
+
+def png(i):
+    """A small image with its own colours"""
+    pixels = np.zeros((32, 32, 3), dtype=np.uint8)
+    pixels[:, :16] = (i * 37 % 256, i * 91 % 256, i * 53 % 256)
+    pixels[:, 16:] = (255 - i * 37 % 256, i * 19 % 256, 128)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, format="PNG")
+    return out.getvalue()
+
+class CountingModel:
+    """Wraps the CLIP model, recording the size of every encode_image batch"""
+
+    def __init__(self, model, fail_on_call=None):
+        self.model = model
+        self.batches = []
+        self.fail_on_call = fail_on_call
+
+    def encode_image(self, batch):
+        self.batches.append(batch.shape[0])
+        if len(self.batches) == self.fail_on_call:
+            raise RuntimeError("out of memory")
+        return self.model.encode_image(batch)
+
+def test_clip_batch():
+    print("Testing batched CLIP image embedding...")
+    if semantic_indexing._clip_model is None:
+        print("⚠️ CLIP model unavailable - skipping")
+        return True
+
+    images = [png(i) for i in range(10)]
+    images.insert(6, b"not an image")
+    with mock.patch.object(semantic_indexing, "get_cache", lambda: None):
+        model = CountingModel(semantic_indexing._clip_model)
+        with mock.patch.object(semantic_indexing, "_clip_model", model):
+            vectors, indices = clip_image_embed_batch(images, batch_size=4)
+        assert indices == [i for i in range(11) if i != 6]
+        assert vectors.shape == (10, IMG_DIM) and vectors.dtype == np.float32
+        assert model.batches == [4, 3, 3]  # the undecodable image is dropped from its batch
+        print(f"✅ {len(indices)} images embedded in forward passes of {model.batches}; the undecodable one skipped")
+
+        for i, vector in zip(indices, vectors):
+            single = clip_image_embed(images[i])
+            assert np.allclose(vector, single, atol=1e-4)
+        print("✅ Batched vectors match one-at-a-time embeddings")
+
+        model = CountingModel(semantic_indexing._clip_model, fail_on_call=2)
+        with mock.patch.object(semantic_indexing, "_clip_model", model):
+            vectors, indices = clip_image_embed_batch(images, batch_size=4)
+        assert indices == [0, 1, 2, 3, 8, 9, 10] and vectors.shape == (7, IMG_DIM)
+        print("✅ A failing forward pass only loses its own batch")
+
+        with mock.patch.object(semantic_indexing, "_clip_model", None):
+            vectors, indices = clip_image_embed_batch(images)
+        assert indices == [] and vectors.shape == (0, IMG_DIM)
+        assert clip_image_embed_batch([])[1] == []
+        print("✅ Without a CLIP model (or images) nothing is embedded")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(os.path.join(tmp, "cache.db"))
+        with mock.patch.object(semantic_indexing, "get_cache", lambda: cache):
+            model = CountingModel(semantic_indexing._clip_model)
+            with mock.patch.object(semantic_indexing, "_clip_model", model):
+                first, first_indices = clip_image_embed_batch(images[:5], batch_size=4)
+                again, again_indices = clip_image_embed_batch(images, batch_size=4)
+            assert model.batches == [4, 1, 3, 2]  # only the images not seen before
+            assert again_indices == [i for i in range(11) if i != 6]
+            assert np.allclose(again[:5], first, atol=1e-6)
+        print("✅ Cached images skip the model; results keep the input order")
+
+    print("\n🎉 All CLIP batch tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_clip_batch()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
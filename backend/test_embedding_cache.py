@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent embedding cache
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from embedding_cache import EmbeddingCache, text_digest, bytes_digest
+
+def test_embedding_cache():
+    print("Testing embedding cache...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(os.path.join(tmp, "cache.db"), max_bytes=64 * 1024)
+
+        # Normalized text shares a key; model and dimension are part of the key
+        assert text_digest("Hello   world\n") == text_digest("Hello world")
+        d = text_digest("Hello world")
+        cache.put_many("model-a", 4, [(d, [1.0, 2.0, 3.0, 4.0])])
+        hit, = cache.get_many("model-a", 4, [d])
+        assert hit is not None and hit.dtype == np.float32 and hit.tolist() == [1.0, 2.0, 3.0, 4.0]
+        assert cache.get_many("model-b", 4, [d])[0] is None
+        print("✅ Lookups keyed by model, dimension and normalized content")
+
+        # Re-storing a key replaces it: the byte count must not grow, or eviction would start early
+        e = text_digest("Goodbye")
+        for _ in range(50):
+            cache.put_many("model-a", 4, [(d, [4.0, 3.0, 2.0, 1.0]), (e, [0.0] * 4), (e, [1.0] * 4)])
+        on_disk = cache._conn().execute("SELECT SUM(length(vector)) FROM embeddings").fetchone()[0]
+        assert cache.stats()["bytes"] == on_disk == 32 and cache.stats()["entries"] == 2
+        assert [v.tolist() for v in cache.get_many("model-a", 4, [d, e])] == [[4.0, 3.0, 2.0, 1.0], [1.0] * 4]
+        assert EmbeddingCache(os.path.join(tmp, "cache.db"), max_bytes=64 * 1024).stats()["bytes"] == 32
+        print("✅ Replaced entries are not double-counted towards the size bound")
+
+        # Fill well past the size bound: oldest entries are evicted, recent ones kept
+        for i in range(400):
+            cache.put_many("model-a", 64, [(bytes_digest(str(i).encode()), np.full(64, i, dtype=np.float32))])
+        stats = cache.stats()
+        assert stats["bytes"] <= 64 * 1024
+        assert cache.get_many("model-a", 64, [bytes_digest(b"0")])[0] is None
+        assert cache.get_many("model-a", 64, [bytes_digest(b"399")])[0] is not None
+        print(f"✅ LRU eviction keeps cache bounded: {stats}")
+
+        assert cache.hits >= 2 and cache.misses >= 2
+        print("✅ Hit/miss counters updated")
+
+    print("\n🎉 All embedding cache tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_embedding_cache()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test script for pre-embedding image dedupe and junk filtering
+"""
+
+import io
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageDraw
+from image_filter import ImageFilter, dhash
+
+def _png(size, color=(200, 30, 30), shapes=0):
+    img = Image.new("RGB", size, color)
+    draw = ImageDraw.Draw(img)
+    for i in range(shapes):
+        draw.rectangle([i * 20, i * 10, i * 20 + 40, i * 10 + 60], fill=(0, 0, 255 - i * 30))
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+def test_image_filter():
+    print("Testing image filter...")
+
+    f = ImageFilter(use_phash=False)
+    photo = _png((300, 200), shapes=3)
+    assert f.accept(photo)
+    assert not f.accept(photo)
+    print("✅ Exact duplicates within a document are dropped")
+
+    assert not f.accept(_png((32, 32)))
+    assert not f.accept(_png((1200, 100)))
+    assert not f.accept(b"not an image")
+    assert f.stats == {"accepted": 1, "duplicate": 1, "near_duplicate": 0, "too_small": 1, "bad_aspect": 1, "unreadable": 1}
+    print(f"✅ Icons, rules and unreadable images are dropped: {f.stats}")
+
+    # Same picture at a different resolution is a near-duplicate by dHash
+    resized = io.BytesIO()
+    Image.open(io.BytesIO(photo)).resize((600, 400)).save(resized, "PNG")
+    assert dhash(photo) is not None and bin(dhash(photo) ^ dhash(resized.getvalue())).count("1") <= 4
+    f = ImageFilter(use_phash=True)
+    assert f.accept(photo)
+    assert not f.accept(resized.getvalue())
+    assert f.accept(_png((300, 200), color=(10, 200, 10), shapes=6))
+    print(f"✅ Perceptual-hash near-duplicates dropped when enabled: {f.stats}")
+
+    print("\n🎉 All image filter tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_image_filter()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
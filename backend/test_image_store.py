@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for the content-addressed image store and the image payload migration
+"""
+
+import io
+import os
+import sys
+import uuid
+import hashlib
+import tempfile
+from pathlib import Path
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from PIL import Image
+from qdrant_client.http import models as qmodels
+
+import vector_store
+import image_store
+import semantic_indexing
+from image_store import put_image, get_image, image_path, image_mime
+from semantic_indexing import COLL_NAME, IMG_DIM, migrate_image_payloads
+
+def png(color, size=(3, 2)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+def test_image_store():
+    print("Testing the content-addressed image store...")
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.object(image_store, "IMAGE_STORE_PATH", Path(tmp) / "images"):
+        data = png("red")
+        digest = hashlib.sha256(data).hexdigest()
+        info = put_image(data)
+        assert info == {"sha256": digest, "size": len(data), "width": 3, "height": 2, "mime": "image/png"}
+        path = Path(tmp) / "images" / digest[:2] / digest[2:4] / digest
+        assert image_path(digest) == path and path.read_bytes() == data
+        print("✅ Images are stored under <aa>/<bb>/<sha256> with their dimensions and mime type")
+
+        mtime = path.stat().st_mtime_ns
+        with mock.patch("builtins.open", side_effect=AssertionError("rewritten")):
+            assert put_image(data)["sha256"] == digest
+        assert path.stat().st_mtime_ns == mtime
+        other = put_image(png("blue"))["sha256"]
+        files = sorted(p for p in (Path(tmp) / "images").rglob("*") if p.is_file())
+        assert files == sorted([path, image_path(other)])  # no temp files left behind
+        print("✅ Storing the same bytes again writes nothing; each distinct image gets one file")
+
+        assert get_image(digest.upper()) == data and image_mime(digest) == "image/png"
+        for bad in ["", digest[:63], digest + "0", "g" * 64, "../" + digest[3:], f"{digest[:2]}/../../{digest[8:]}",
+                    "/etc/passwd", "..", digest[:62] + "/."]:
+            assert image_path(bad) is None, bad
+            assert get_image(bad) is None
+        assert get_image("0" * 64) is None
+        print("✅ Malformed or traversal digests are rejected; unknown digests read as missing")
+
+        # Older ingests kept the image bytes hex-encoded in the payload
+        semantic_indexing.store_manager.close()
+        with mock.patch.multiple(vector_store, VECTOR_STORE="ann", ANN_PATH=os.path.join(tmp, "store")):
+            try:
+                rng = np.random.default_rng(0)
+                legacy = [png((i * 40, 0, 0), size=(i + 1, 5)) for i in range(5)]
+                semantic_indexing.qdrant.upsert(COLL_NAME, [
+                    qmodels.PointStruct(id=str(uuid.UUID(int=i + 1)), vector={"image": rng.normal(size=IMG_DIM).tolist()},
+                                        payload={"type": "image", "image": image.hex(), "doc_id": "1", "module_id": 1})
+                    for i, image in enumerate(legacy)
+                ] + [
+                    qmodels.PointStruct(id=str(uuid.UUID(int=100)), vector={"image": rng.normal(size=IMG_DIM).tolist()},
+                                        payload={"type": "image", "image_sha256": digest, "doc_id": "2", "module_id": 1}),
+                ])
+                assert migrate_image_payloads(batch_size=2) == 5
+                points, _ = semantic_indexing.qdrant.scroll(COLL_NAME, limit=100, with_payload=True)
+                by_id = {p.id: p.payload for p in points}
+                for i, image in enumerate(legacy):
+                    payload = by_id[str(uuid.UUID(int=i + 1))]
+                    assert "image" not in payload and get_image(payload["image_sha256"]) == image
+                    assert (payload["width"], payload["height"], payload["mime"]) == (i + 1, 5, "image/png")
+                    assert payload["doc_id"] == "1" and payload["module_id"] == 1
+                assert by_id[str(uuid.UUID(int=100))] == {"type": "image", "image_sha256": digest, "doc_id": "2", "module_id": 1}
+                assert migrate_image_payloads() == 0
+                print("✅ Hex-encoded payload images move to the store; migrated points are skipped on the next run")
+            finally:
+                semantic_indexing.store_manager.close()
+
+    print("\n🎉 All image store tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_image_store()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for incremental re-ingestion of revised documents (re-upload diffing)
+"""
+
+import io
+import os
+import sys
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from fastapi import UploadFile
+
+import db
+import vector_store
+import keyword_index
+import answer_cache
+import upload_storage
+import semantic_indexing
+from chunking import enc_tok
+
+def section(i, topic="status reporting"):
+    """A one-sentence paragraph (a single chunking unit)"""
+    return ", ".join(f"section {i} part {n} covers {topic} of the XR-{i}00 controller" for n in range(6)) + "."
+
+def fake_embed(texts):
+    """Same text, same vector"""
+    return [np.random.default_rng(int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:8], "little"))
+            .normal(size=semantic_indexing.TXT_DIM).tolist() for t in texts]
+
+class CountingEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return fake_embed(texts)
+
+def write(path, sections):
+    with open(path, "w") as f:
+        f.write("\n\n".join(sections))
+    return path
+
+def stored_texts(doc_id):
+    points, _ = semantic_indexing.qdrant.scroll(semantic_indexing.COLL_NAME, scroll_filter=semantic_indexing._doc_filter(doc_id),
+                                                limit=1000, with_payload=True)
+    return sorted(p.payload["text"] for p in points)
+
+def test_incremental_ingest():
+    print("Testing incremental re-ingestion...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A scratch copy of the database: initialize_db() migrates, but does not create, the base schema
+        db_path = shutil.copy(db.DB_PATH, os.path.join(tmp, "users.db"))
+        keywords = keyword_index.KeywordIndex(os.path.join(tmp, "keywords.db"))
+        semantic_indexing.store_manager.close()
+        with mock.patch.object(db, "DB_PATH", db_path), \
+                mock.patch.multiple(vector_store, VECTOR_STORE="ann", ANN_PATH=os.path.join(tmp, "store")), \
+                mock.patch.object(keyword_index, "_keyword_index", keywords), \
+                mock.patch.object(answer_cache, "_answer_cache", answer_cache.AnswerCache(os.path.join(tmp, "answers.db"))), \
+                mock.patch.object(semantic_indexing, "openai_embed", fake_embed), \
+                mock.patch.object(upload_storage, "UPLOAD_DIR", os.path.join(tmp, "uploads")):
+            try:
+                db.initialize_db()
+                # Chunks hold one section each: two never fit, so an edit cannot shift other chunks' boundaries
+                module = db.create_module("Manuals", chunk_size=len(enc_tok.encode_ordinary(section(0))) * 3 // 2, chunk_overlap=0)
+                sections = [section(i) for i in range(10)]
+                path = write(os.path.join(tmp, "manual.txt"), sections)
+
+                embedder = CountingEmbedder()
+                first = semantic_indexing.ingest(path, "42", module, "manual.txt", embed_texts=embedder)
+                assert first["chunks"] == first["chunks_indexed"] == len(sections) == len(embedder.texts)
+                assert stored_texts("42") == sorted(sections)
+                print(f"✅ First ingest embeds all {first['chunks']} chunks")
+
+                embedder = CountingEmbedder()
+                again = semantic_indexing.ingest(path, "42", module, "manual.txt", embed_texts=embedder)
+                assert embedder.texts == [] and again["unchanged"] == len(sections) and again["deleted"] == 0
+                assert stored_texts("42") == sorted(sections)
+                print("✅ Re-ingesting identical content embeds nothing")
+
+                # A re-upload under a new title (or of a module that moved team) keeps every point but relabels it
+                team = db.create_team("Manuals team")
+                embedder = CountingEmbedder()
+                relabelled = semantic_indexing.ingest(path, "42", module, "manual v2.txt", team_id=team, embed_texts=embedder)
+                assert embedder.texts == [] and relabelled["unchanged"] == len(sections)
+                points, _ = semantic_indexing.qdrant.scroll(semantic_indexing.COLL_NAME, scroll_filter=semantic_indexing._doc_filter("42"),
+                                                            limit=1000, with_payload=True)
+                assert {(p.payload["doc_title"], p.payload["team_id"]) for p in points} == {("manual v2.txt", team)}
+                hits = keywords.search('"xr-300"', keyword_index.scope_expression(team_id=team))
+                assert [h["payload"]["doc_title"] for h in hits] == ["manual v2.txt"]
+                semantic_indexing.ingest(path, "42", module, "manual.txt", embed_texts=embedder)  # back to the module's team
+                assert not keywords.search('"xr-300"', keyword_index.scope_expression(team_id=team))
+                print("✅ Unchanged points take the document's new title and scope without re-embedding")
+
+                # Revision: one section edited, one removed, one added
+                revised = sections[:3] + [section(3, "firmware updates")] + sections[4:8] + sections[9:] + [section(10)]
+                write(path, revised)
+                embedder = CountingEmbedder()
+                stats = semantic_indexing.ingest(path, "42", module, "manual.txt", embed_texts=embedder)
+                assert sorted(embedder.texts) == sorted([section(3, "firmware updates"), section(10)])
+                assert stats["unchanged"] == len(revised) - 2 and stats["deleted"] == 2, stats
+                assert stored_texts("42") == sorted(revised)
+                print("✅ A revision embeds only new chunks and deletes vanished ones")
+
+                assert not keywords.search('"xr-800"', keyword_index.scope_expression(module))
+                assert keywords.search('"xr-1000"', keyword_index.scope_expression(module))
+                assert keywords.count() == len(revised)
+                hits = semantic_indexing.retrieve("XR-800 controller", top_k=3, module_id=module)
+                assert all("XR-800" not in h["payload"]["text"] for h in hits)
+                print("✅ Deleted chunks leave the keyword index and retrieval")
+
+                embedder = CountingEmbedder()
+                full = semantic_indexing.ingest(path, "42", module, "manual.txt", incremental=False, embed_texts=embedder)
+                assert len(embedder.texts) == full["chunks"] == len(revised)
+                assert stored_texts("42") == sorted(revised)
+                print("✅ A non-incremental ingest re-embeds everything")
+
+                # Re-upload storage: the revision gets a new file, never another document's
+                other = asyncio.run(upload_storage.save_upload(UploadFile(io.BytesIO(b"other"), filename="manual.txt"), module))
+                revision = asyncio.run(upload_storage.save_upload(UploadFile(io.BytesIO(b"revised"), filename="manual.txt"), module))
+                assert revision["file_path"] != other["file_path"]
+                assert open(other["file_path"], "rb").read() == b"other"
+                assert revision["sha256"] == hashlib.sha256(b"revised").hexdigest() and revision["size"] == 7
+                print("✅ A re-upload never overwrites the stored file of another document")
+            finally:
+                semantic_indexing.store_manager.close()
+
+    print("\n🎉 All incremental ingest tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_incremental_ingest()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
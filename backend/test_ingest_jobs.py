@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Test script for the background ingestion job queue (claiming, requeueing, failure states and cancellation)
+"""
+
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+import db
+import vector_store
+import keyword_index
+import answer_cache
+import ingest_jobs
+import semantic_indexing
+
+def fake_ingest(file_path, doc_id, module_id, doc_title=None, team_id=None, progress=None):
+    progress(pages_total=2, pages_done=2, chunks_total=5, chunks_done=5)
+    return {"doc_id": str(doc_id), "chunks": 5, "images": 0}
+
+def failing_ingest(file_path, doc_id, module_id, doc_title=None, team_id=None, progress=None):
+    progress(pages_total=4, pages_done=1)
+    raise RuntimeError("PDF is encrypted")
+
+def fake_embed(texts):
+    """Same text, same vector"""
+    return [np.random.default_rng(int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:8], "little"))
+            .normal(size=semantic_indexing.TXT_DIM).tolist() for t in texts]
+
+def delete_document(document_id):
+    """What DELETE /api/documents/{id} does: cancel jobs and drop the row, then the embeddings"""
+    conn = db.get_db_connection()
+    db.cancel_ingest_jobs(conn.cursor(), [document_id])
+    conn.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+    conn.close()
+    semantic_indexing.delete_document_embeddings(document_id)
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+def test_ingest_jobs():
+    print("Testing ingestion jobs...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A scratch copy of the database: initialize_db() migrates, but does not create, the base schema
+        db_path = shutil.copy(db.DB_PATH, os.path.join(tmp, "users.db"))
+        with mock.patch.object(db, "DB_PATH", db_path):
+            db.initialize_db()
+            while db.claim_next_ingest_job():  # whatever the copied database had queued
+                pass
+            module = db.create_module("Jobs")
+
+            documents = [db.add_document(module, f"Doc {i}", f"doc{i}.pdf") for i in range(6)]
+            jobs = [db.create_ingest_job(documents[i], module, f"doc{i}.pdf", f"Doc {i}") for i in range(6)]
+            assert all(db.get_ingest_job(j)["status"] == "queued" for j in jobs)
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                claimed = [job for job in pool.map(lambda _: db.claim_next_ingest_job(), range(8)) if job]
+            assert sorted(job["job_id"] for job in claimed) == jobs  # each job claimed exactly once
+            assert all(db.get_ingest_job(j)["status"] == "running" and db.get_ingest_job(j)["attempts"] == 1 for j in jobs)
+            assert db.claim_next_ingest_job() is None
+            print("✅ Concurrent workers claim every queued job exactly once")
+
+            db.update_ingest_job_progress(jobs[0], pages_done=3, pages_total=9, status="done")  # unknown fields ignored
+            job = db.get_ingest_job(jobs[0])
+            assert (job["pages_done"], job["pages_total"], job["status"]) == (3, 9, "running")
+            print("✅ Progress updates only touch the progress counters")
+
+            # Jobs whose worker died (no heartbeat) go back to the queue and are retried
+            for job_id in jobs[2:]:
+                db.finish_ingest_job(job_id, "done")
+            assert db.requeue_stale_ingest_jobs(3600) == 0  # heartbeats are fresh
+            conn = db.get_db_connection()
+            conn.execute("UPDATE ingest_jobs SET updated_at = datetime('now', '-2 hours') WHERE job_id = ?", (jobs[1],))
+            conn.close()
+            assert db.requeue_stale_ingest_jobs(3600) == 1
+            assert db.get_ingest_job(jobs[1])["status"] == "queued" and db.get_ingest_job(jobs[0])["status"] == "running"
+            assert db.requeue_stale_ingest_jobs(0) == 1  # jobs[0]: any heartbeat counts as stale
+            retry = db.claim_next_ingest_job()
+            assert retry["job_id"] == jobs[0] and db.get_ingest_job(jobs[0])["attempts"] == 2
+            assert db.get_ingest_job(jobs[2])["status"] == "done"  # finished jobs are never requeued
+            print("✅ Stale running jobs are requeued and retried; finished jobs are not")
+
+            with mock.patch.object(semantic_indexing, "ingest", failing_ingest):
+                ingest_jobs._run_job(retry)
+            job = db.get_ingest_job(jobs[0])
+            assert job["status"] == "failed" and job["error"] == "PDF is encrypted", job
+            assert (job["pages_done"], job["pages_total"]) == (1, 4)  # progress flushed before failing
+            assert job["finished_at"] and job["duration_seconds"] is not None
+            assert db.claim_next_ingest_job()["job_id"] == jobs[1]  # a failed job is not retried by itself
+            print("✅ A failing ingest marks its job failed with the error and last progress")
+
+            with mock.patch.object(semantic_indexing, "ingest", fake_ingest):
+                ingest_jobs._run_job(db.get_ingest_job(jobs[1]))
+            job = db.get_ingest_job(jobs[1])
+            assert job["status"] == "done" and job["error"] is None and (job["chunks_done"], job["chunks_total"]) == (5, 5)
+            print("✅ A successful ingest marks its job done with its final progress")
+
+            # Workers: stale jobs are requeued at startup, new jobs are picked up when enqueued
+            stale = db.create_ingest_job(db.add_document(module, "Stale", "stale.pdf"), module, "stale.pdf")
+            db.claim_next_ingest_job()
+            with mock.patch.object(semantic_indexing, "ingest", fake_ingest), \
+                    mock.patch.object(ingest_jobs, "INGEST_JOB_STALE_SECONDS", 0):
+                ingest_jobs.start_workers(2)
+                try:
+                    queued = ingest_jobs.enqueue_ingest(db.add_document(module, "New", "new.pdf"), module, "new.pdf")
+                    wait_for(lambda: all(db.get_ingest_job(j)["status"] == "done" for j in (stale, queued)))
+                finally:
+                    ingest_jobs.stop_workers()
+            assert db.get_ingest_job(stale)["attempts"] == 2 and db.get_ingest_job(queued)["attempts"] == 1
+            assert [j["job_id"] for j in db.get_module_ingest_jobs(module, limit=2)] == [queued, stale]
+            print("✅ Workers requeue stale jobs at startup and run newly queued ones")
+
+            # Deleting a document cancels its jobs, whether still queued or already running
+            semantic_indexing.store_manager.close()
+            with mock.patch.multiple(vector_store, VECTOR_STORE="ann", ANN_PATH=os.path.join(tmp, "store")), \
+                    mock.patch.object(keyword_index, "_keyword_index", keyword_index.KeywordIndex(os.path.join(tmp, "keywords.db"))), \
+                    mock.patch.object(answer_cache, "_answer_cache", answer_cache.AnswerCache(os.path.join(tmp, "answers.db"))), \
+                    mock.patch.object(semantic_indexing, "openai_embed", fake_embed):
+                try:
+                    path = os.path.join(tmp, "manual.txt")
+                    with open(path, "w") as f:
+                        f.write("\n\n".join(f"Torque setting {i} for the XR-{i}00 flange is listed in table {i}." for i in range(8)))
+
+                    done_doc = db.add_document(module, "Done", path)
+                    done_job = db.create_ingest_job(done_doc, module, path)
+                    db.claim_next_ingest_job()
+                    db.finish_ingest_job(done_job, "done")
+                    queued_doc = db.add_document(module, "Queued", path)
+                    queued_job = ingest_jobs.enqueue_ingest(queued_doc, module, path)
+                    claimed = db.claim_next_ingest_job()  # a worker takes it just before the delete
+                    assert claimed["job_id"] == queued_job
+                    late_job = db.create_ingest_job(done_doc, module, path)  # a re-upload's job, still queued
+                    delete_document(done_doc)
+                    delete_document(queued_doc)
+                    assert db.get_ingest_job(done_job) is None  # finished jobs go with the document
+                    assert db.get_ingest_job(late_job)["status"] == "cancelled"
+                    assert db.claim_next_ingest_job() is None
+                    ingested = []
+                    with mock.patch.object(semantic_indexing, "ingest", lambda *args, **kwargs: ingested.append(args)):
+                        ingest_jobs._run_job(claimed)
+                    assert ingested == [] and db.get_ingest_job(queued_job)["status"] == "cancelled"
+                    print("✅ Deleting a document cancels its queued jobs; a worker holding one skips it")
+
+                    running_doc = db.add_document(module, "Running", path)
+                    running_job = ingest_jobs.enqueue_ingest(running_doc, module, path)
+                    real_ingest = semantic_indexing.ingest
+                    def ingest_racing_delete(*args, **kwargs):
+                        delete_document(running_doc)  # the delete lands while the chunks are being embedded
+                        return real_ingest(*args, **kwargs)
+                    with mock.patch.object(semantic_indexing, "ingest", ingest_racing_delete):
+                        ingest_jobs._run_job(db.claim_next_ingest_job())
+                    job = db.get_ingest_job(running_job)
+                    assert job["status"] == "cancelled" and job["error"] == "document deleted", job
+                    assert semantic_indexing.qdrant.count(semantic_indexing.COLL_NAME,
+                                                          count_filter=semantic_indexing._doc_filter(running_doc)).count == 0
+                    assert keyword_index.get_keyword_index().search('"torque"', None, 10) == []
+                    print("✅ A job whose document is deleted mid-ingest removes the points and keyword rows it wrote")
+                finally:
+                    semantic_indexing.store_manager.close()
+
+    print("\n🎉 All ingestion job tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_ingest_jobs()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
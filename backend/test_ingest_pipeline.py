@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming ingestion pipeline (bounded stages, batching and error propagation)
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import semantic_indexing
+from semantic_indexing import _background_iter, _iter_ingest_batches, _iter_document
+from chunking import SentenceChunker, chunk_text
+
+TEXT = " ".join(f"Sentence {i} explains how the pipeline streams part {i % 7} of the document." for i in range(600))
+
+class RejectOdd:
+    """Image filter accepting only images whose first byte is even"""
+
+    def accept(self, data):
+        return data[0] % 2 == 0
+
+def pieces(text, seed=0):
+    """Split text at random positions, as extraction hands it over"""
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(text)), 40))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+def test_ingest_pipeline():
+    print("Testing streaming ingestion pipeline...")
+
+    # Bounded hand-over: the producer never runs far ahead of a slow consumer
+    produced = []
+    def numbers():
+        for i in range(50):
+            produced.append(i)
+            yield i
+    consumed = []
+    for item in _background_iter(numbers(), maxsize=3):
+        time.sleep(0.002)
+        assert len(produced) - len(consumed) <= 3 + 2, (len(produced), len(consumed))
+        consumed.append(item)
+    assert consumed == list(range(50))
+    print("✅ Items arrive in order through a bounded queue")
+
+    def failing():
+        yield 1
+        yield 2
+        raise ValueError("corrupt page")
+    received = []
+    try:
+        for item in _background_iter(failing()):
+            received.append(item)
+        raise AssertionError("the producer's error was swallowed")
+    except ValueError as e:
+        assert str(e) == "corrupt page" and received == [1, 2]
+    print("✅ A producer error reaches the consumer after the items before it")
+
+    produced.clear()
+    stream = _background_iter(numbers(), maxsize=2)
+    assert next(stream) == 0
+    stream.close()
+    time.sleep(0.3)
+    stopped_at = len(produced)
+    time.sleep(0.3)
+    assert len(produced) == stopped_at < 10
+    print("✅ Abandoning the consumer stops the producer")
+
+    # Batching: chunks and images come out in bounded batches, identical to chunking in one go
+    items = [("text", piece) for piece in pieces(TEXT)]
+    images = [bytes([i]) * 10 for i in range(9)]
+    items[5:5] = [("image", b) for b in images[:4]]
+    items[20:20] = [("image", b) for b in images[4:]]
+    with mock.patch.multiple(semantic_indexing, INGEST_UPSERT_BATCH=5, INGEST_IMAGE_BATCH=2):
+        batches = list(_iter_ingest_batches(iter(items), SentenceChunker(doc_id="7"), RejectOdd()))
+    assert all(len(chunks) <= 5 and len(batch_images) <= 2 for chunks, batch_images in batches)
+    assert all(not (chunks and batch_images) for chunks, batch_images in batches)
+    streamed = [c for chunks, _ in batches for c in chunks]
+    expected = chunk_text(TEXT, doc_id="7")
+    assert [c.text for c in streamed] == [c.text for c in expected]
+    assert [c.chunk_id for c in streamed] == [c.chunk_id for c in expected]
+    assert [b for _, batch_images in batches for b in batch_images] == [b for b in images if b[0] % 2 == 0]
+    print(f"✅ {len(streamed)} chunks and 5 images in {len(batches)} bounded batches, same chunks as one-shot chunking")
+
+    # A plain text document is read in blocks and chunked the same way across block boundaries
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.txt")
+        text = (TEXT + "\n\n") * 60  # several 1 MiB blocks
+        with open(path, "w") as f:
+            f.write(text)
+        blocks = list(_iter_document(path))
+        assert len(blocks) > 1 and all(kind == "text" for kind, _ in blocks)
+        assert "".join(block for _, block in blocks) == text
+        chunks = [c.text for batch, _ in _iter_ingest_batches(_background_iter(_iter_document(path))) for c in batch]
+        assert chunks == [c.text for c in chunk_text(text)]
+        print(f"✅ A {len(text) // (1 << 20)} MiB text file streams in {len(blocks)} blocks into the same chunks")
+
+    print("\n🎉 All ingestion pipeline tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_ingest_pipeline()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script for the FTS5 keyword index
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from keyword_index import KeywordIndex, match_expression, scope_expression
+
+CHUNKS = [
+    {"point_id": "a", "doc_id": "1", "doc_title": "API guide", "module_id": 3, "team_id": 1,
+     "text": "Provision users with POST /api/v2/provision and the XR-200B licence key."},
+    {"point_id": "b", "doc_id": "2", "doc_title": "Contract", "module_id": 4, "team_id": 1,
+     "text": "Clause 14.3.2 limits liability. The XR-100 series is discontinued."},
+    {"point_id": "c", "doc_id": "3", "doc_title": "Other team", "module_id": 5, "team_id": 2,
+     "text": "The XR-200B controller ships in March."},
+]
+
+def test_keyword_index():
+    print("Testing FTS5 keyword index...")
+
+    assert match_expression('Does POST /api/v2/provision need the XR-200B key per "licence key" or XR-2*?') == \
+        '"api v2 provision" OR "xr 200b" OR "licence key" OR "xr 2"*'
+    assert match_expression("what is our refund policy") is None
+    assert scope_expression(user_team_ids=[2, 1, 2]) == "scope : (t1 OR t2)" and scope_expression() is None
+    print("✅ Precise terms become phrases, prefixes and scope filters")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = KeywordIndex(os.path.join(tmp, "keywords.db"))
+        index.add(CHUNKS)
+
+        hits = index.search(match_expression("XR-200B"))
+        assert {h["point_id"] for h in hits} == {"a", "c"}
+        assert [h["point_id"] for h in index.search(match_expression("XR-200B"), scope_expression(team_id=1))] == ["a"]
+        assert [h["point_id"] for h in index.search(match_expression("XR-200B"), scope_expression(module_id=5))] == ["c"]
+        assert [h["point_id"] for h in index.search(match_expression("clause 14.3.2"), scope_expression(user_team_ids=[1]))] == ["b"]
+        assert hits[0]["payload"]["doc_title"] in ("API guide", "Other team") and hits[0]["payload"]["type"] == "text"
+        print("✅ Matches respect module, team and user-teams scoping")
+
+        assert [h["point_id"] for h in index.search(match_expression("/api/v2/prov*"))] == ["a"]
+        assert not index.search(match_expression("/api/v3/provision"))
+        print("✅ Exact-phrase and prefix lookups")
+
+        index.add([{"point_id": "d", "doc_id": "4", "doc_title": "Notes", "module_id": 12, "team_id": 5,
+                    "text": "Completely unrelated prose."}])
+        assert not index.search(match_expression("what is the m12 torque?"))
+        assert not index.search(match_expression("t5 limits"), scope_expression(team_id=5))
+        assert [h["point_id"] for h in index.search('"completely"', scope_expression(module_id=12))] == ["d"]
+        index.delete_points(["d"])
+        print("✅ Question terms shaped like scope tokens (m12, t5) only match chunk text")
+
+        index.add([{**CHUNKS[0], "text": "Rewritten chunk without codes."}])
+        assert [h["point_id"] for h in index.search(match_expression("XR-200B"))] == ["c"]
+        index.delete_points(["c"])
+        index.delete_where(team_id=1)
+        assert index.count() == 0 and not index.search(match_expression("clause 14.3.2"))
+        print("✅ Upserts and deletes keep the FTS index in sync")
+
+    print("\n🎉 All keyword index tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_keyword_index()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
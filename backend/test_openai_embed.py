@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test script for OpenAI text embedding batches (alignment, packing, truncation, retries and fault isolation)
+"""
+
+import os
+import sys
+import types
+import threading
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tenacity
+from openai import APIConnectionError
+
+import semantic_indexing
+from semantic_indexing import openai_embed, enc_tok
+
+def vector_of(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 997)]
+
+class FakeEmbeddings:
+    """Records every request; inputs containing POISON fail, `transient` calls fail with a connection error"""
+
+    def __init__(self, transient=0):
+        self.requests = []
+        self.transient = transient
+        self.lock = threading.Lock()
+
+    def create(self, model, input, encoding_format="float"):
+        with self.lock:
+            self.requests.append(list(input))
+            if self.transient:
+                self.transient -= 1
+                raise APIConnectionError(request=None)
+        if any("POISON" in text for text in input):
+            raise ValueError("invalid input")
+        # Out of order on purpose: results must be matched by index
+        return types.SimpleNamespace(data=[types.SimpleNamespace(index=i, embedding=vector_of(t))
+                                           for i, t in reversed(list(enumerate(input)))])
+
+def run(texts, embeddings, **limits):
+    limits.setdefault("OPENAI_EMB_CONCURRENCY", semantic_indexing.OPENAI_EMB_CONCURRENCY)
+    client = types.SimpleNamespace(embeddings=embeddings)
+    with mock.patch.object(semantic_indexing, "openai_client", client), \
+            mock.patch.object(semantic_indexing, "get_cache", lambda: None), \
+            mock.patch.object(semantic_indexing._openai_embed_request.retry, "wait", tenacity.wait_none()), \
+            mock.patch.multiple(semantic_indexing, **limits):
+        return openai_embed(texts)
+
+def test_openai_embed():
+    print("Testing OpenAI embedding batches...")
+
+    texts = ["alpha", "", "   ", None, "beta gamma", "delta"]
+    embeddings = FakeEmbeddings()
+    results = run(texts, embeddings)
+    assert results == [vector_of("alpha"), [], [], [], vector_of("beta gamma"), vector_of("delta")]
+    assert embeddings.requests == [["alpha", "beta gamma", "delta"]]
+    assert run(["", None], FakeEmbeddings()) == [[], []]
+    print("✅ Output stays aligned with the input; blank inputs get [] without a request")
+
+    texts = [f"chunk {i} " + "word " * (i % 5) for i in range(40)]
+    tokens = [len(enc_tok.encode_ordinary(t.strip())) for t in texts]
+    budget = max(tokens) * 3
+    embeddings = FakeEmbeddings()
+    results = run(texts, embeddings, OPENAI_EMB_BATCH_TOKENS=budget, OPENAI_EMB_BATCH_INPUTS=4, OPENAI_EMB_CONCURRENCY=3)
+    assert results == [vector_of(t.strip()) for t in texts]
+    assert len(embeddings.requests) > 1
+    assert all(len(batch) <= 4 for batch in embeddings.requests)
+    assert all(sum(len(enc_tok.encode_ordinary(t)) for t in batch) <= budget for batch in embeddings.requests)
+    assert sorted(t for batch in embeddings.requests for t in batch) == sorted(t.strip() for t in texts)
+    print(f"✅ {len(texts)} inputs packed into {len(embeddings.requests)} token- and count-bounded requests")
+
+    long_text = " ".join(f"token{i}" for i in range(200))
+    embeddings = FakeEmbeddings()
+    results = run([long_text, "short"], embeddings, OPENAI_EMB_MAX_INPUT_TOKENS=50)
+    sent = embeddings.requests[0][0]
+    assert len(enc_tok.encode_ordinary(sent)) <= 50 and results[0] == vector_of(sent) and results[1] == vector_of("short")
+    print("✅ Inputs over the per-input token limit are truncated, not dropped")
+
+    embeddings = FakeEmbeddings(transient=2)
+    results = run(["one", "two"], embeddings)
+    assert results == [vector_of("one"), vector_of("two")] and len(embeddings.requests) == 3
+    print("✅ Transient errors are retried")
+
+    texts = [f"text {i}" for i in range(16)]
+    texts[11] = "POISON pill"
+    embeddings = FakeEmbeddings()
+    results = run(texts, embeddings, OPENAI_EMB_BATCH_INPUTS=8)
+    assert results[11] == [] and all(results[i] == vector_of(texts[i]) for i in range(16) if i != 11)
+    assert len(embeddings.requests) <= 2 + 2 * 3  # two batches, then one bisection path of depth 3
+    print("✅ A failing input only loses its own vector (the batch is bisected)")
+
+    print("\n🎉 All OpenAI embedding tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_openai_embed()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for payload index bootstrap and the doc_id payload migration
+"""
+
+import os
+import sys
+import uuid
+import tempfile
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from qdrant_client.http import models as qmodels
+
+import vector_store
+import semantic_indexing
+from vector_store import LocalANNStore
+from semantic_indexing import PAYLOAD_INDEXES, COLL_NAME, TXT_DIM, IMG_DIM, migrate_doc_id_payloads, _doc_filter
+
+def legacy_collection(path, n=40):
+    """A collection from before payload indexes, half its doc_ids stored as integers"""
+    rng = np.random.default_rng(0)
+    store = LocalANNStore(path)
+    with mock.patch.object(vector_store, "ANN_INDEXED_KEYS", ()):
+        store.create_collection(COLL_NAME, vectors_config={"text": qmodels.VectorParams(size=TXT_DIM, distance="Cosine"),
+                                                           "image": qmodels.VectorParams(size=IMG_DIM, distance="Cosine")})
+    assert not store.get_collection(COLL_NAME).payload_schema
+    store.upsert(COLL_NAME, [
+        qmodels.PointStruct(id=str(uuid.UUID(int=i + 1)), vector={"text": rng.normal(size=TXT_DIM).tolist()},
+                            payload={"doc_id": i % 4 if i < n // 2 else str(i % 4), "module_id": i % 2,
+                                     "team_id": 1, "type": "text", "text": f"chunk {i}"})
+        for i in range(n)
+    ])
+    store.close()
+
+def doc_id_is(value):
+    return qmodels.Filter(must=[qmodels.FieldCondition(key="doc_id", match=qmodels.MatchValue(value=value))])
+
+def test_payload_indexes():
+    print("Testing payload index bootstrap...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "store")
+        legacy_collection(path)
+        semantic_indexing.store_manager.close()
+        with mock.patch.multiple(vector_store, VECTOR_STORE="ann", ANN_PATH=path):
+            try:
+                schema = semantic_indexing.qdrant.get_collection(COLL_NAME).payload_schema
+                assert set(schema) == set(PAYLOAD_INDEXES)
+                assert all(schema[name].data_type == data_type for name, data_type in PAYLOAD_INDEXES.items())
+                assert all(index.points == 40 for index in schema.values())
+                print("✅ Opening the store adds the missing indexes to an existing collection and backfills them")
+
+                semantic_indexing.store_manager.close()
+                with mock.patch.object(LocalANNStore, "create_payload_index", side_effect=AssertionError("index recreated")):
+                    semantic_indexing.store_manager.open()
+                print("✅ Reopening leaves existing indexes alone")
+
+                assert semantic_indexing.qdrant.count(COLL_NAME, count_filter=doc_id_is("3")).count == 5
+                assert semantic_indexing.qdrant.count(COLL_NAME, count_filter=_doc_filter("3")).count == 10  # either type
+                assert migrate_doc_id_payloads(batch_size=7) == 20
+                points, _ = semantic_indexing.qdrant.scroll(COLL_NAME, limit=100, with_payload=True)
+                assert all(isinstance(p.payload["doc_id"], str) for p in points)
+                assert all(p.payload["text"].startswith("chunk ") for p in points)  # other payload keys untouched
+                assert semantic_indexing.qdrant.count(COLL_NAME, count_filter=doc_id_is("3")).count == 10
+                assert migrate_doc_id_payloads() == 0
+                print("✅ Integer doc_ids are rewritten as strings, so a keyword match finds every point")
+            finally:
+                semantic_indexing.store_manager.close()
+
+    print("\n🎉 All payload index tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_payload_indexes()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
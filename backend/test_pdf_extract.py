@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for page-parallel PDF extraction (pooled page order and the sequential fallback)
+"""
+
+import os
+import sys
+import tempfile
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import fitz
+
+import pdf_extract
+from pdf_extract import iter_pdf_pages
+
+def make_pdf(path, pages, image_pages=()):
+    """A PDF whose page N reads "Page N", with a small image on each of image_pages"""
+    doc = fitz.open()
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 4, 4), False)
+    pixmap.clear_with(128)
+    for n in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {n}")
+        if n in image_pages:
+            page.insert_image(fitz.Rect(72, 100, 172, 200), pixmap=pixmap)
+    doc.save(path)
+    doc.close()
+
+def test_pdf_extract():
+    print("Testing page-parallel PDF extraction...")
+
+    assert pdf_extract.EXTRACT_MP_START != "fork"
+    print(f"✅ Workers are started with {pdf_extract.EXTRACT_MP_START!r}, not fork")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "large.pdf")
+        make_pdf(path, 50, image_pages={7, 30})
+
+        pdf_extract.shutdown_pool()
+        with mock.patch.multiple(pdf_extract, PARALLEL_EXTRACT_MIN_PAGES=10, EXTRACT_PAGES_PER_TASK=3):
+            try:
+                pages = list(iter_pdf_pages(path, 50, processes=3))
+                assert pdf_extract._pool is not None  # the pooled path was taken
+            finally:
+                pdf_extract.shutdown_pool()
+        assert [page_no for page_no, _, _ in pages] == list(range(1, 51))
+        assert all(text.strip() == f"Page {page_no}" for page_no, text, _ in pages)
+        assert [page_no for page_no, _, xrefs in pages if xrefs] == [7, 30]
+        assert pdf_extract._pool is None
+        print("✅ Pages extracted across pool workers come back in page order, with their image xrefs")
+
+        with mock.patch.multiple(pdf_extract, PARALLEL_EXTRACT_MIN_PAGES=10, EXTRACT_PAGES_PER_TASK=3):
+            pages = iter_pdf_pages(path, 50, processes=3)
+            assert next(pages)[0] == 1
+            pages.close()  # the consumer stops early; queued ranges are cancelled
+            pdf_extract.shutdown_pool()
+        print("✅ Abandoning the iterator part way through cancels the ranges still in flight")
+
+        small = os.path.join(tmp, "small.pdf")
+        make_pdf(small, 9, image_pages={2})
+        with mock.patch.multiple(pdf_extract, PARALLEL_EXTRACT_MIN_PAGES=10, EXTRACT_PAGES_PER_TASK=4), \
+                mock.patch.object(pdf_extract, "_get_pool", side_effect=AssertionError("pool used")):
+            pages = list(iter_pdf_pages(small, 9, processes=3))
+            assert [text.strip() for _, text, _ in iter_pdf_pages(path, 50, processes=1)] == [f"Page {n}" for n in range(1, 51)]
+        assert [(page_no, text.strip()) for page_no, text, _ in pages] == [(n, f"Page {n}") for n in range(1, 10)]
+        assert [page_no for page_no, _, xrefs in pages if xrefs] == [2]
+        print("✅ Below the page threshold, or with one process, pages are extracted in-process")
+
+    print("\n🎉 All PDF extraction tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_pdf_extract()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
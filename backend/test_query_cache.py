@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-process query embedding cache
+"""
+
+import os
+import sys
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from embedding_cache import EmbeddingCache
+from query_cache import QueryEmbeddingCache
+
+def test_query_cache():
+    print("Testing query embedding cache...")
+
+    cache = QueryEmbeddingCache(ttl=60, max_bytes=4 * 16)
+    calls = []
+    compute = lambda q: calls.append(q) or [1.0, 2.0, 3.0, 4.0]
+    assert cache.get_or_compute("model-a", 4, "What is our SLA for P1?", compute) == [1.0, 2.0, 3.0, 4.0]
+    assert cache.get_or_compute("model-a", 4, "  what is our  SLA for p1?\n", compute) == [1.0, 2.0, 3.0, 4.0]
+    assert len(calls) == 1 and cache.get("model-b", 4, "What is our SLA for P1?") is None
+    print("✅ Normalized question and model form the key")
+
+    assert cache.get_or_compute("model-a", 4, "failing", lambda q: None) is None
+    assert cache.get("model-a", 4, "failing") is None
+    print("✅ Failed embeddings are not cached")
+
+    for i in range(10):
+        cache.put("model-a", 4, f"question {i}", [float(i)] * 4)
+    stats = cache.stats()
+    assert stats["entries"] == 4 and stats["bytes"] <= 64 and stats["evictions"] == 7
+    assert cache.get("model-a", 4, "question 9") == [9.0] * 4 and cache.get("model-a", 4, "question 0") is None
+    print(f"✅ LRU eviction keeps the cache within its byte bound: {stats}")
+
+    short = QueryEmbeddingCache(ttl=0.05)
+    short.put("model-a", 4, "q", [1.0] * 4)
+    time.sleep(0.1)
+    assert short.get("model-a", 4, "q") is None and short.stats()["expired"] == 1
+    print("✅ Entries expire after the TTL")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shared = EmbeddingCache(os.path.join(tmp, "cache.db"))
+        QueryEmbeddingCache(shared=shared).put("model-a", 4, "Shared question", [5.0] * 4)
+        other = QueryEmbeddingCache(shared=shared)  # e.g. another worker process
+        assert other.get("model-a", 4, "shared QUESTION") == [5.0] * 4
+        assert other.get("model-a", 4, "shared QUESTION") == [5.0] * 4
+        stats = other.stats()
+        assert stats["shared_hits"] == 1 and stats["hits"] == 1 and stats["hit_rate"] == 1.0
+        print("✅ Shared tier serves other processes and refills the in-memory LRU")
+
+    print("\n🎉 All query cache tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_query_cache()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for concurrent query embedding (one embedder timing out or failing, retrieval in the other space)
+"""
+
+import os
+import sys
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+import threading
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from qdrant_client.http import models as qmodels
+
+import db
+import vector_store
+import keyword_index
+import answer_cache
+import semantic_indexing
+from semantic_indexing import embed_query, retrieve, COLL_NAME, IMG_DIM
+
+def fake_embed(texts):
+    """Same text, same vector"""
+    return [np.random.default_rng(int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:8], "little"))
+            .normal(size=semantic_indexing.TXT_DIM).tolist() for t in texts]
+
+def test_query_embed():
+    print("Testing concurrent query embedding...")
+
+    release = threading.Event()  # holds the "slow" embedder until the test ends
+    def slow(result):
+        def embed(*args):
+            release.wait(10)
+            return result
+        return embed
+    def failing(*args):
+        raise RuntimeError("embedder down")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = shutil.copy(db.DB_PATH, os.path.join(tmp, "users.db"))
+        semantic_indexing.store_manager.close()
+        with mock.patch.object(db, "DB_PATH", db_path), \
+                mock.patch.multiple(vector_store, VECTOR_STORE="ann", ANN_PATH=os.path.join(tmp, "store")), \
+                mock.patch.object(keyword_index, "_keyword_index", keyword_index.KeywordIndex(os.path.join(tmp, "keywords.db"))), \
+                mock.patch.object(answer_cache, "_answer_cache", answer_cache.AnswerCache(os.path.join(tmp, "answers.db"))), \
+                mock.patch.object(semantic_indexing, "openai_embed", fake_embed), \
+                mock.patch.object(semantic_indexing, "get_query_cache", lambda: None), \
+                mock.patch.multiple(semantic_indexing, QUERY_EMBED_TIMEOUT=0.5, CLIP_QUERY_TIMEOUT=0.3):
+            try:
+                db.initialize_db()
+                module = db.create_module("Hangar", team_id=db.create_team("Operations"))
+                path = os.path.join(tmp, "hangar.txt")
+                with open(path, "w") as f:
+                    f.write("\n\n".join(f"Hangar door {i} is inspected by the duty engineer." for i in range(4)))
+                semantic_indexing.ingest(path, "1", module, "hangar.txt")
+                images = np.random.default_rng(0).normal(size=(3, IMG_DIM))
+                semantic_indexing.qdrant.upsert(COLL_NAME, [
+                    qmodels.PointStruct(id=str(uuid.UUID(int=i + 1)), vector={"image": images[i].tolist()},
+                                        payload={"type": "image", "image_sha256": f"{i:064x}", "doc_id": "1",
+                                                 "module_id": module, "team_id": None})
+                    for i in range(3)
+                ])
+                points, _ = semantic_indexing.qdrant.scroll(COLL_NAME, limit=1, with_payload=True,
+                                                            scroll_filter=qmodels.Filter(must=[qmodels.FieldCondition(
+                                                                key="type", match=qmodels.MatchValue(value="text"))]))
+                chunk = points[0].payload["text"]
+
+                # The OpenAI embedding hangs past its deadline; the CLIP one arrives
+                with mock.patch.object(semantic_indexing, "openai_embed", slow(fake_embed(["x"]))), \
+                        mock.patch.object(semantic_indexing, "clip_text_embed", lambda q: images[2].tolist()):
+                    started = time.monotonic()
+                    text_vector, image_vector = embed_query("zzqx")
+                    assert time.monotonic() - started < 2
+                    assert text_vector is None and image_vector == images[2].tolist()
+                    results = retrieve("zzqx", top_k=3, module_id=module)
+                assert results and results[0]["payload"]["image_sha256"] == f"{2:064x}"
+                assert {r["payload"]["type"] for r in results} == {"image"}
+                print("✅ An OpenAI timeout leaves the CLIP vector; retrieve() returns the image hits")
+
+                # CLIP raises; the text vector still arrives
+                with mock.patch.object(semantic_indexing, "clip_text_embed", failing):
+                    text_vector, image_vector = embed_query(chunk)
+                    assert image_vector is None and text_vector == fake_embed([chunk])[0]
+                    results = retrieve(chunk, top_k=3, module_id=module)
+                assert results[0]["payload"]["text"] == chunk
+                assert {r["payload"]["type"] for r in results} == {"text"}
+                print("✅ A CLIP failure leaves the text vector; retrieve() returns the text hits")
+
+                # The reverse: OpenAI raises, CLIP hangs past its (shorter) deadline
+                with mock.patch.object(semantic_indexing, "openai_embed", failing), \
+                        mock.patch.object(semantic_indexing, "clip_text_embed", slow(images[0].tolist())):
+                    started = time.monotonic()
+                    assert embed_query("hangar door") == (None, None)
+                    assert time.monotonic() - started < 2
+                    results = retrieve("hangar door", top_k=3, module_id=module)
+                assert results and all("Hangar door" in r["payload"]["text"] for r in results)
+                print("✅ With both embedders unavailable the keyword searches still answer")
+            finally:
+                release.set()
+                semantic_indexing.store_manager.close()
+
+    print("\n🎉 All query embedding tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_query_embed()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
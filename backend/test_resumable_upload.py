@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test script for resumable uploads (parts, assembly and concurrent completes)
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+
+import db
+import resumable_upload
+
+async def body(data, piece=64 * 1024):
+    """A request body arriving in pieces, yielding to other writers in between"""
+    for start in range(0, len(data), piece):
+        await asyncio.sleep(0)
+        yield data[start:start + piece]
+
+def expect_http_error(status_code, call, *args):
+    try:
+        result = call(*args)
+        if asyncio.iscoroutine(result):
+            asyncio.run(result)
+    except HTTPException as e:
+        assert e.status_code == status_code, (e.status_code, e.detail)
+        return e
+    raise AssertionError(f"expected HTTP {status_code}")
+
+def new_session(data, part_size):
+    upload_id = resumable_upload.new_upload_id()
+    part_size, total_parts = resumable_upload.plan_parts(len(data), part_size)
+    db.create_upload_session(upload_id, 1, "tester", 1, None, "Big file", "big.bin", len(data),
+                             part_size, total_parts, time.time() + 3600)
+    return db.get_upload_session(upload_id)
+
+def parts_of(session, data):
+    size = session["part_size"]
+    return {n: data[(n - 1) * size:n * size] for n in range(1, session["total_parts"] + 1)}
+
+def test_resumable_upload():
+    print("Testing resumable uploads...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A scratch copy of the database: initialize_db() migrates, but does not create, the base schema
+        db_path = shutil.copy(db.DB_PATH, os.path.join(tmp, "users.db"))
+        with mock.patch.object(db, "DB_PATH", db_path), \
+                mock.patch.object(resumable_upload, "SESSIONS_DIR", Path(tmp) / "sessions"):
+            db.initialize_db()
+            part_size = resumable_upload.UPLOAD_MIN_PART_SIZE
+            data = os.urandom(2 * part_size + 12345)
+
+            expect_http_error(400, resumable_upload.plan_parts, 0)
+            expect_http_error(413, resumable_upload.plan_parts, resumable_upload.MAX_UPLOAD_BYTES + 1)
+            assert resumable_upload.plan_parts(len(data), 1) == (part_size, 3)  # part size clamped to the minimum
+            expect_http_error(404, resumable_upload.session_dir, "../../etc")
+            print("✅ Sizes and upload ids are validated")
+
+            session = new_session(data, part_size)
+            parts = parts_of(session, data)
+            expect_http_error(400, resumable_upload.write_part, session, 4, body(b"x"))
+            expect_http_error(400, resumable_upload.write_part, session, 1, body(parts[1][:-1]))
+            expect_http_error(400, resumable_upload.write_part, session, 3, body(parts[3] + b"x"))
+            assert resumable_upload.present_parts(session) == []
+            assert os.listdir(resumable_upload.session_dir(session["upload_id"])) == []  # no partial files left
+            print("✅ A part of the wrong size is rejected without leaving anything behind")
+
+            # Parts in any order; the same part sent twice at once ends up whole either way
+            async def send_parallel():
+                return await asyncio.gather(
+                    resumable_upload.write_part(session, 3, body(parts[3])),
+                    resumable_upload.write_part(session, 1, body(parts[1])),
+                    resumable_upload.write_part(session, 1, body(parts[1], piece=4096)),
+                )
+            results = asyncio.run(send_parallel())
+            assert [r["sha256"] for r in results] == [hashlib.sha256(parts[n]).hexdigest() for n in (3, 1, 1)]
+            assert resumable_upload.present_parts(session) == [1, 3]
+            assert sorted(os.listdir(resumable_upload.session_dir(session["upload_id"]))) == ["part-000001", "part-000003"]
+            print("✅ Parallel and duplicate part uploads leave exactly one complete file per part")
+
+            target = os.path.join(tmp, "big.bin")
+            assert db.claim_upload_session(session["upload_id"])
+            error = expect_http_error(409, resumable_upload.assemble, session, target)
+            assert "2" in error.detail and not os.path.exists(target)
+            assert not [f for f in os.listdir(tmp) if f.startswith("big.bin")]  # no temporary assembly left
+            db.update_upload_session(session["upload_id"], "open")  # what the complete endpoint does on failure
+            print("✅ Completing with a missing part fails with 409 and keeps the parts")
+
+            asyncio.run(resumable_upload.write_part(session, 2, body(parts[2])))
+            asyncio.run(resumable_upload.write_part(session, 2, body(parts[2])))  # a retried part replaces itself
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                claims = list(pool.map(db.claim_upload_session, [session["upload_id"]] * 8))
+            assert claims.count(True) == 1, claims
+            assert db.get_upload_session(session["upload_id"])["status"] == "finalizing"
+            saved = resumable_upload.assemble(session, target)
+            assert saved == {"file_path": target, "sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+            assert open(target, "rb").read() == data
+            assert not resumable_upload.session_dir(session["upload_id"]).exists()
+            db.update_upload_session(session["upload_id"], "done", 7)
+            assert not db.claim_upload_session(session["upload_id"])
+            assert db.get_upload_session(session["upload_id"])["document_id"] == 7
+            print("✅ Concurrent completes: exactly one claims the session and assembles the file")
+
+            # Expired sessions and orphaned part directories are garbage-collected
+            stale = new_session(data, part_size)
+            asyncio.run(resumable_upload.write_part(stale, 1, body(parts_of(stale, data)[1])))
+            orphan = resumable_upload.session_dir(resumable_upload.new_upload_id())
+            orphan.mkdir()
+            os.utime(orphan, (0, 0))
+            with mock.patch("time.time", return_value=time.time() + 7200):
+                assert resumable_upload.gc_expired_sessions() == 2
+            assert db.get_upload_session(stale["upload_id"])["status"] == "expired"
+            assert not resumable_upload.session_dir(stale["upload_id"]).exists() and not orphan.exists()
+            assert not db.claim_upload_session(stale["upload_id"])
+            print("✅ Expired sessions and orphaned parts are garbage-collected")
+
+    print("\n🎉 All resumable upload tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_resumable_upload()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script for batched retrieval (one store round trip for the text, BM25 and image searches, under access scoping)
+"""
+
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from qdrant_client.http import models as qmodels
+
+import db
+import vector_store
+import keyword_index
+import answer_cache
+import semantic_indexing
+from semantic_indexing import retrieve
+
+SEARCHES = ("query_batch_points", "query_points", "search", "search_batch")
+
+def fake_embed(texts):
+    """Same text, same vector"""
+    return [np.random.default_rng(int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:8], "little"))
+            .normal(size=semantic_indexing.TXT_DIM).tolist() for t in texts]
+
+class CountingStore:
+    """Forwards to the shared store, recording every search call"""
+
+    def __init__(self, store):
+        self.store = store
+        self.calls = []
+
+    def __getattr__(self, name):
+        attr = getattr(self.store, name)
+        if name not in SEARCHES:
+            return attr
+
+        def call(*args, **kwargs):
+            self.calls.append((name, kwargs))
+            return attr(*args, **kwargs)
+        return call
+
+def document(topic):
+    return "\n\n".join(f"The {topic} checklist item {i} is signed off by the duty engineer." for i in range(4))
+
+def test_retrieve_batch():
+    print("Testing batched retrieval...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A scratch copy of the database: initialize_db() migrates, but does not create, the base schema
+        db_path = shutil.copy(db.DB_PATH, os.path.join(tmp, "users.db"))
+        semantic_indexing.store_manager.close()
+        with mock.patch.object(db, "DB_PATH", db_path), \
+                mock.patch.multiple(vector_store, VECTOR_STORE="ann", ANN_PATH=os.path.join(tmp, "store")), \
+                mock.patch.object(keyword_index, "_keyword_index", keyword_index.KeywordIndex(os.path.join(tmp, "keywords.db"))), \
+                mock.patch.object(answer_cache, "_answer_cache", answer_cache.AnswerCache(os.path.join(tmp, "answers.db"))), \
+                mock.patch.object(semantic_indexing, "openai_embed", fake_embed):
+            try:
+                db.initialize_db()
+                ops, sales = db.create_team("Operations"), db.create_team("Sales")
+                modules = {"safety": db.create_module("Safety", team_id=ops), "hangar": db.create_module("Hangar", team_id=ops),
+                           "pricing": db.create_module("Pricing", team_id=sales)}
+                for doc_id, (topic, module) in enumerate(modules.items(), start=1):
+                    path = os.path.join(tmp, f"{topic}.txt")
+                    with open(path, "w") as f:
+                        f.write(document(topic))
+                    semantic_indexing.ingest(path, str(doc_id), module, f"{topic}.txt")
+                assert semantic_indexing._bm25_ready
+
+                points, _ = semantic_indexing.qdrant.scroll(semantic_indexing.COLL_NAME, limit=1, with_payload=True,
+                                                            scroll_filter=semantic_indexing._doc_filter("1"))
+                query = points[0].payload["text"]
+                vectors = (fake_embed([query])[0], np.random.default_rng(0).normal(size=semantic_indexing.IMG_DIM).tolist())
+                store = CountingStore(semantic_indexing.qdrant)
+                with mock.patch.object(semantic_indexing, "qdrant", store):
+                    results = retrieve(query, top_k=3, module_id=modules["safety"], query_vectors=vectors)
+                assert [name for name, _ in store.calls] == ["query_batch_points"]
+                requests = store.calls[0][1]["requests"]
+                assert [r.using for r in requests] == ["text", semantic_indexing.BM25_VECTOR, "image"]
+                module_filter = qmodels.Filter(must=[qmodels.FieldCondition(key="module_id", match=qmodels.MatchValue(value=modules["safety"]))])
+                assert all(r.filter == module_filter for r in requests)
+                assert results[0]["payload"]["text"] == query
+                assert {r["payload"]["module_id"] for r in results} == {modules["safety"]}
+                print("✅ Text, BM25 and image searches go to the store in one batch under the module filter")
+
+                store = CountingStore(semantic_indexing.qdrant)
+                with mock.patch.object(semantic_indexing, "qdrant", store):
+                    results = retrieve("checklist item 1", top_k=12, user_team_ids=[ops], query_vectors=(vectors[0], None))
+                assert [name for name, _ in store.calls] == ["query_batch_points"]
+                requests = store.calls[0][1]["requests"]
+                assert [r.using for r in requests] == ["text", semantic_indexing.BM25_VECTOR]
+                assert all(r.filter.must[0].match == qmodels.MatchAny(any=[ops]) for r in requests)
+                assert {r["payload"]["module_id"] for r in results} == {modules["safety"], modules["hangar"]}
+                print("✅ Without an image vector the batch holds two searches; team scoping still applies")
+
+                store = CountingStore(semantic_indexing.qdrant)
+                with mock.patch.object(semantic_indexing, "qdrant", store), \
+                        mock.patch.object(semantic_indexing, "_bm25_ready", False):
+                    results = retrieve("pricing checklist", top_k=5, module_id=modules["hangar"], query_vectors=(vectors[0], None))
+                assert [name for name, _ in store.calls] == ["query_batch_points"]
+                fallback = store.calls[0][1]["requests"][1]
+                assert fallback.using == "text" and fallback.filter.should
+                assert fallback.filter.must == [qmodels.FieldCondition(key="module_id", match=qmodels.MatchValue(value=modules["hangar"]))]
+                assert results and {r["payload"]["module_id"] for r in results} == {modules["hangar"]}
+                print("✅ Before the BM25 migration the entity fallback joins the same batch, scoped the same way")
+
+                store = CountingStore(semantic_indexing.qdrant)
+                with mock.patch.object(semantic_indexing, "qdrant", store):
+                    results = retrieve("pricing", top_k=5, module_id=modules["pricing"], query_vectors=(None, None))
+                assert [name for name, _ in store.calls] == ["query_batch_points"]
+                assert [r.using for r in store.calls[0][1]["requests"]] == [semantic_indexing.BM25_VECTOR]
+                assert results and {r["payload"]["module_id"] for r in results} == {modules["pricing"]}
+                print("✅ With no embeddings available the BM25 search still runs alone")
+            finally:
+                semantic_indexing.store_manager.close()
+
+    print("\n🎉 All batched retrieval tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_retrieve_batch()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for vector store backend selection (Qdrant server mode, directory locks, copying between stores)
+"""
+
+import os
+import sys
+import uuid
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from qdrant_client.http import models as qmodels
+
+import vector_store
+from vector_store import LocalANNStore, QdrantStore, copy_collection
+
+def _match(key, value):
+    return qmodels.FieldCondition(key=key, match=qmodels.MatchValue(value=value))
+
+def fill(store, n=300, seed=0):
+    """A documents collection with dense and BM25 vectors and a module_id index"""
+    rng = np.random.default_rng(seed)
+    store.create_collection("documents", vectors_config={"text": qmodels.VectorParams(size=16, distance="Cosine")},
+                            sparse_vectors_config={"bm25": qmodels.SparseVectorParams(modifier=qmodels.Modifier.IDF)})
+    store.create_payload_index("documents", "module_id", field_schema=qmodels.PayloadSchemaType.INTEGER)
+    vectors = rng.normal(size=(n, 16))
+    store.upsert("documents", [
+        qmodels.PointStruct(id=str(uuid.UUID(int=i + 1)),
+                            vector={"text": vectors[i].tolist(),
+                                    "bm25": qmodels.SparseVector(indices=[i % 7, 100 + i % 3], values=[1.0, 2.0])},
+                            payload={"module_id": i % 3, "doc_id": str(i % 10)})
+        for i in range(n)
+    ])
+    return vectors
+
+def test_store_backends():
+    print("Testing vector store backend selection...")
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.multiple(vector_store, VECTOR_STORE="qdrant", QDRANT_URL="http://127.0.0.1:6333",
+                                QDRANT_PATH=os.path.join(tmp, "qdrant"), QDRANT_TIMEOUT=7):
+        # Server mode: a thread-safe client per process, nothing opened on disk
+        server = vector_store._open_configured_store()
+        assert type(server) is QdrantStore and vector_store._backend_name() == "qdrant-server"
+        assert server.init_options["url"] == "http://127.0.0.1:6333" and server.init_options["timeout"] == 7
+        assert not os.path.exists(os.path.join(tmp, "qdrant"))
+        server.close()
+        print("✅ QDRANT_URL selects a Qdrant server client")
+
+        # Embedded mode: serialised, and a second opener is pointed at QDRANT_URL
+        vector_store.QDRANT_URL = None
+        embedded = vector_store._open_configured_store()
+        assert isinstance(embedded, vector_store._SerializedStore) and vector_store._backend_name() == "qdrant-embedded"
+        try:
+            vector_store._open_qdrant_local()
+            raise AssertionError("a second client opened the locked embedded store")
+        except RuntimeError as e:
+            assert "QDRANT_URL" in str(e)
+        embedded.close()
+        vector_store._open_qdrant_local().close()
+        print("✅ Without QDRANT_URL the embedded store is locked to one opener until closed")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        first = LocalANNStore(os.path.join(tmp, "ann"))
+        try:
+            LocalANNStore(os.path.join(tmp, "ann"))
+            raise AssertionError("a second ANN store opened the locked directory")
+        except RuntimeError as e:
+            assert "locked" in str(e)
+        first.close()
+        LocalANNStore(os.path.join(tmp, "ann")).close()
+        print("✅ The ANN store directory is locked to one opener until closed")
+
+    # search() on newer clients: the (name, vector) and named-vector forms map to query_points()
+    client = QdrantStore(location=":memory:")
+    vectors = fill(client)
+    expected = [p.id for p in client.query_points("documents", query=vectors[5].tolist(), using="text", limit=5,
+                                                   query_filter=qmodels.Filter(must=[_match("module_id", 2)])).points]
+    for query in [("text", vectors[5].tolist()), SimpleNamespace(name="text", vector=vectors[5].tolist())]:
+        hits = client.search("documents", query_vector=query, limit=5,
+                             query_filter=qmodels.Filter(must=[_match("module_id", 2)]))
+        assert [h.id for h in hits] == expected and all(h.payload["module_id"] == 2 for h in hits)
+    print("✅ QdrantStore.search() returns the same hits as query_points()")
+
+    # --copy: vectors, sparse vectors, payloads and payload indexes move between backends
+    with tempfile.TemporaryDirectory() as tmp:
+        ann = LocalANNStore(os.path.join(tmp, "ann"))
+        try:
+            assert copy_collection(client, ann, "documents", batch_size=64) == 300
+            assert ann.count("documents").count == 300
+            assert "module_id" in ann.get_collection("documents").payload_schema
+            dense = ann.search("documents", query_vector=("text", vectors[5].tolist()), limit=5,
+                               query_filter=qmodels.Filter(must=[_match("module_id", 2)]))
+            assert [h.id for h in dense] == expected
+            sparse = ann.query_points("documents", query=qmodels.SparseVector(indices=[3], values=[1.0]), using="bm25",
+                                      limit=100).points
+            assert {h.payload["doc_id"] for h in sparse} == {str(i % 10) for i in range(300) if i % 7 == 3}
+            assert copy_collection(ann, ann, "documents", target_name="documents_copy") == 300
+            assert ann.count("documents_copy", count_filter=qmodels.Filter(must=[_match("module_id", 0)])).count == 100
+        finally:
+            ann.close()
+    client.close()
+    print("✅ copy_collection moves dense and sparse vectors, payloads and indexes between stores")
+
+    print("\n🎉 All vector store backend tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_store_backends()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared vector store client (open hooks, close and reopen, proxies and health)
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from qdrant_client.http import models as qmodels
+
+import vector_store
+from vector_store import VectorStoreManager, StoreProxy, LocalANNStore
+
+def setup(store):
+    """Open hook creating the collection, as semantic_indexing registers one"""
+    if not store.collection_exists("documents"):
+        store.create_collection("documents", vectors_config={"text": qmodels.VectorParams(size=4, distance="Cosine")})
+
+def test_store_manager():
+    print("Testing the shared vector store client...")
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.multiple(vector_store, VECTOR_STORE="ann", ANN_PATH=os.path.join(tmp, "store")):
+        manager = VectorStoreManager()
+        opened = []
+        manager.on_open(setup)
+        manager.on_open(opened.append)
+        assert opened == [] and not os.path.exists(os.path.join(tmp, "store"))
+        print("✅ Registering hooks opens nothing")
+
+        stores, barrier = [], threading.Barrier(8)
+        def worker():
+            barrier.wait()
+            stores.append(manager.get())
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        store = stores[0]
+        assert isinstance(store, LocalANNStore) and all(s is store for s in stores)
+        assert opened == [store] and store.collection_exists("documents")
+        late = []
+        manager.on_open(late.append)
+        assert late == [store]
+        print("✅ Concurrent first use opens one client; hooks run once, late hooks run immediately")
+
+        proxy = StoreProxy(manager)
+        proxy.upsert("documents", [qmodels.PointStruct(id=1, vector={"text": [1.0, 0.0, 0.0, 0.0]}, payload={"doc_id": "1"})])
+        assert store.count("documents").count == 1
+
+        manager.close()
+        manager.close()  # closing twice is harmless
+        direct = LocalANNStore(os.path.join(tmp, "store"))  # the directory lock was released
+        assert direct.count("documents").count == 1
+        direct.close()
+        print("✅ close() persists the store and releases its lock")
+
+        assert proxy.count("documents").count == 1  # reopened on demand
+        reopened = manager.get()
+        assert reopened is not store and opened == [store, reopened] and late == [store, reopened]
+        print("✅ The proxy follows the reopened client and the hooks run again")
+
+        health = manager.health("documents")
+        assert health["status"] == "ok" and health["backend"] == "ann" and health["open"]
+        assert health["collections"] == ["documents"] and health["points"] == 1 and health["latency_ms"] >= 0
+        manager.close()
+
+        failing = VectorStoreManager()
+        failing.on_open(lambda store: 1 / 0)
+        try:
+            failing.open()
+            raise AssertionError("the hook error was swallowed")
+        except ZeroDivisionError:
+            pass
+        LocalANNStore(os.path.join(tmp, "store")).close()  # the half-opened store was closed again
+        health = failing.health()
+        assert health["status"] == "error" and not health["open"] and "division" in health["error"]
+        print("✅ A failing hook closes the store; health() reports the error instead of raising")
+
+        with mock.patch.object(vector_store, "VECTOR_STORE", "faiss"):
+            health = VectorStoreManager().health()
+        assert health["status"] == "error" and "faiss" in health["error"]
+        print("✅ An unknown backend is reported as unhealthy")
+
+    print("\n🎉 All vector store manager tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_store_manager()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for duplicate upload handling (hash lookup, stored files and the clone path)
+"""
+
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+import db
+import vector_store
+import keyword_index
+import answer_cache
+import ingest_jobs
+import semantic_indexing
+from upload_storage import claim_upload_path, reuse_stored_file, remove_unreferenced_file
+
+TEXT = "\n\n".join(f"Section {i}: the XR-{i}00 controller reports its status every {i} seconds." for i in range(12))
+
+def fake_embed(texts):
+    """Same text, same vector"""
+    return [np.random.default_rng(int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:8], "little"))
+            .normal(size=semantic_indexing.TXT_DIM).tolist() for t in texts]
+
+def document_points(doc_id):
+    points, _ = semantic_indexing.qdrant.scroll(semantic_indexing.COLL_NAME, scroll_filter=semantic_indexing._doc_filter(doc_id),
+                                                limit=1000, with_payload=True, with_vectors=True)
+    return points
+
+def finished_job(document_id, module_id, file_path, status):
+    job_id = db.create_ingest_job(document_id, module_id, file_path)
+    db.finish_ingest_job(job_id, status)
+    return job_id
+
+def test_upload_dedupe():
+    print("Testing duplicate upload handling...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A scratch copy of the database: initialize_db() migrates, but does not create, the base schema
+        db_path = shutil.copy(db.DB_PATH, os.path.join(tmp, "users.db"))
+        semantic_indexing.store_manager.close()
+        with mock.patch.object(db, "DB_PATH", db_path), \
+                mock.patch.multiple(vector_store, VECTOR_STORE="ann", ANN_PATH=os.path.join(tmp, "store")), \
+                mock.patch.object(keyword_index, "_keyword_index", keyword_index.KeywordIndex(os.path.join(tmp, "keywords.db"))), \
+                mock.patch.object(answer_cache, "_answer_cache", answer_cache.AnswerCache(os.path.join(tmp, "answers.db"))), \
+                mock.patch.object(semantic_indexing, "openai_embed", fake_embed):
+            try:
+                db.initialize_db()
+                team = db.create_team("Dedupe")
+                module, other_module = db.create_module("Source", team_id=team), db.create_module("Copy", team_id=team)
+                digest = hashlib.sha256(TEXT.encode("utf-8")).hexdigest()
+
+                # Hash lookup: only documents whose latest ingest finished and none is pending
+                source = db.add_document(module, "spec.txt", os.path.join(tmp, "spec.txt"), team_id=team, content_hash=digest)
+                assert db.find_ingested_document_by_hash(digest, other_module) is None  # never ingested
+                finished_job(source, module, "spec.txt", "failed")
+                assert db.find_ingested_document_by_hash(digest, other_module) is None
+                finished_job(source, module, "spec.txt", "done")
+                assert db.find_ingested_document_by_hash(digest, other_module)["document_id"] == source
+                pending = db.create_ingest_job(source, module, "spec.txt")  # e.g. a re-upload in flight
+                assert db.find_ingested_document_by_hash(digest, other_module) is None
+                db.finish_ingest_job(pending, "failed")
+                assert db.find_ingested_document_by_hash(digest, other_module) is None  # latest attempt failed
+                finished_job(source, module, "spec.txt", "done")
+                assert db.find_ingested_document_by_hash(digest, other_module)["document_id"] == source
+                assert db.find_ingested_document_by_hash(None, other_module) is None
+                assert db.find_ingested_document_by_hash("0" * 64, other_module) is None
+                db.set_module_chunking(other_module, chunk_size=128, chunk_overlap=16)
+                assert db.find_ingested_document_by_hash(digest, other_module) is None  # would ignore its chunking
+                db.set_module_chunking(module, chunk_size=128, chunk_overlap=16)
+                assert db.find_ingested_document_by_hash(digest, other_module)["document_id"] == source
+                db.set_module_chunking(module)
+                db.set_module_chunking(other_module)
+                assert db.find_ingested_document_by_hash(digest, module)["document_id"] == source
+                print("✅ Only documents whose latest ingest is done, none pending and chunked alike are dedupe sources")
+
+                # Stored files: every upload gets its own path, identical bytes become a hard link
+                upload_dir = os.path.join(tmp, "uploads")
+                os.makedirs(upload_dir)
+                first = claim_upload_path(upload_dir, "spec.txt")
+                second = claim_upload_path(upload_dir, "spec.txt")
+                assert first == os.path.join(upload_dir, "spec.txt") and second != first
+                assert os.path.basename(second).startswith("spec-") and second.endswith(".txt")
+                for path in (first, second):
+                    with open(path, "w") as f:
+                        f.write(TEXT)
+                assert reuse_stored_file(second, first) and os.path.samefile(first, second)
+                assert reuse_stored_file(second, first)  # already linked
+                assert not reuse_stored_file(second, os.path.join(upload_dir, "missing.txt"))
+                print("✅ Uploads never share a path; duplicates are hard links to the stored file")
+
+                duplicate = db.add_document(other_module, "spec copy.txt", second, team_id=team, content_hash=digest)
+                db.update_document_file(source, first, digest)
+                assert not remove_unreferenced_file(first, db.is_file_referenced)
+                assert os.path.exists(first)
+                db.update_document_file(source, None)  # as if the source document were deleted
+                assert remove_unreferenced_file(first, db.is_file_referenced)
+                assert not os.path.exists(first) and open(second).read() == TEXT  # the duplicate keeps its bytes
+                assert not remove_unreferenced_file(first, db.is_file_referenced)  # already gone
+                print("✅ A stored file is only deleted once no document references it")
+
+                # Clone path: a duplicate's job copies the source's points into its own scope
+                stats = semantic_indexing.ingest(second, source, module, "spec.txt", team)
+                job_id = db.create_ingest_job(duplicate, other_module, second, "spec copy.txt", team, source_document_id=source)
+                with mock.patch.object(semantic_indexing, "openai_embed", side_effect=AssertionError("re-embedded")):
+                    ingest_jobs._run_job(db.claim_next_ingest_job())
+                job = db.get_ingest_job(job_id)
+                assert job["status"] == "done" and job["chunks_done"] == stats["chunks"], job
+                source_points, clones = document_points(source), document_points(duplicate)
+                assert len(clones) == len(source_points) == stats["chunks"]
+                assert all(p.payload["module_id"] == other_module and p.payload["doc_title"] == "spec copy.txt" for p in clones)
+                assert not {p.id for p in clones} & {p.id for p in source_points}
+                assert sorted(p.payload["text"] for p in clones) == sorted(p.payload["text"] for p in source_points)
+                hits = semantic_indexing.retrieve("XR-300 controller", top_k=3, module_id=other_module)
+                assert hits and all(h["payload"]["doc_id"] == str(duplicate) for h in hits)
+                print("✅ A duplicate's points are cloned into its module without re-embedding")
+
+                # A source without points (e.g. deleted meanwhile) falls back to a full ingest
+                empty = db.add_document(other_module, "again.txt", second, team_id=team, content_hash=digest)
+                job_id = db.create_ingest_job(empty, other_module, second, "again.txt", team, source_document_id=987654)
+                ingest_jobs._run_job(db.claim_next_ingest_job())
+                assert db.get_ingest_job(job_id)["status"] == "done"
+                assert len(document_points(empty)) == stats["chunks"]
+                assert {p.payload["doc_title"] for p in document_points(empty)} == {"again.txt"}  # not the stored name
+                print("✅ Cloning from a source without points ingests the file instead")
+            finally:
+                semantic_indexing.store_manager.close()
+
+    print("\n🎉 All duplicate upload tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_upload_dedupe()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test script for streaming upload writes (hashing, size limit, file names and cleanup)
+"""
+
+import io
+import os
+import sys
+import asyncio
+import hashlib
+import tempfile
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException, UploadFile
+
+import upload_storage
+from upload_storage import save_upload, check_content_length
+
+class RecordingUpload(UploadFile):
+    """UploadFile recording the size of every read"""
+
+    def __init__(self, data, filename):
+        super().__init__(io.BytesIO(data), filename=filename)
+        self.reads = []
+
+    async def read(self, size=-1):
+        self.reads.append(size)
+        return await super().read(size)
+
+def files_in(directory):
+    return sorted(name for _, _, names in os.walk(directory) for name in names)
+
+def test_upload_storage():
+    print("Testing streaming upload writes...")
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.multiple(upload_storage, UPLOAD_DIR=tmp, UPLOAD_CHUNK_BYTES=4096, MAX_UPLOAD_BYTES=64 * 1024):
+        data = os.urandom(50 * 1024 + 17)
+        upload = RecordingUpload(data, "proposal.pdf")
+        saved = asyncio.run(save_upload(upload, 3))
+        assert saved == {"file_path": os.path.join(tmp, "3", "proposal.pdf"),
+                         "sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+        assert open(saved["file_path"], "rb").read() == data
+        assert set(upload.reads) == {4096}  # never the whole body at once
+        print(f"✅ Streamed in {len(upload.reads)} reads of 4 KiB, hashed and measured on the way")
+
+        too_big = RecordingUpload(os.urandom(64 * 1024 + 1), "huge.pdf")
+        try:
+            asyncio.run(save_upload(too_big, 3))
+            raise AssertionError("oversized upload accepted")
+        except HTTPException as e:
+            assert e.status_code == 413
+        assert files_in(tmp) == ["proposal.pdf"]  # no partial file left behind
+        assert sum(too_big.reads) <= (64 * 1024 // 4096 + 1) * 4096  # reading stopped at the limit
+        print("✅ An upload over the limit is rejected with 413 and leaves nothing behind")
+
+        check_content_length(str(64 * 1024))
+        check_content_length(None)
+        check_content_length("chunked")
+        try:
+            check_content_length(str(64 * 1024 + 1))
+            raise AssertionError("oversized Content-Length accepted")
+        except HTTPException as e:
+            assert e.status_code == 413
+        print("✅ A declared Content-Length over the limit is rejected up front")
+
+        escaped = asyncio.run(save_upload(RecordingUpload(b"evil", "../../etc/passwd"), 3))
+        assert escaped["file_path"] == os.path.join(tmp, "3", "passwd")
+        unnamed = asyncio.run(save_upload(RecordingUpload(b"anonymous", ""), 3))
+        assert os.path.dirname(unnamed["file_path"]) == os.path.join(tmp, "3")
+        assert os.path.basename(unnamed["file_path"]).startswith("upload-")
+        renamed = asyncio.run(save_upload(RecordingUpload(b"first", "x.txt"), 3, filename="stored name.txt"))
+        assert renamed["file_path"] == os.path.join(tmp, "3", "stored name.txt")
+        print("✅ Files land in the module directory whatever name the client sends")
+
+        empty = asyncio.run(save_upload(RecordingUpload(b"", "empty.txt"), 4))
+        assert empty["size"] == 0 and empty["sha256"] == hashlib.sha256(b"").hexdigest()
+        assert os.path.exists(empty["file_path"])
+        print("✅ Empty uploads are stored with the empty hash")
+
+    print("\n🎉 All upload storage tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_upload_storage()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test script for the local ANN vector store (IVF index, payload filters, persistence)
+"""
+
+import os
+import sys
+import uuid
+import tempfile
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from qdrant_client.http import models as qmodels
+import vector_store
+from vector_store import LocalANNStore
+
+def _match(key, value):
+    return qmodels.FieldCondition(key=key, match=qmodels.MatchValue(value=value))
+
+def test_vector_store():
+    print("Testing local ANN vector store...")
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(16, 32))
+    vectors = centers[np.arange(4000) % 16] + 0.4 * rng.normal(size=(4000, 32))
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(4000)]
+
+    # Small thresholds so a few thousand points exercise the IVF path (whatever imported vector_store first)
+    with mock.patch.multiple(vector_store, ANN_MIN_TRAIN_POINTS=1000, ANN_EXACT_MAX_CANDIDATES=100), \
+            tempfile.TemporaryDirectory() as directory:
+        store = LocalANNStore(directory)
+        store.create_collection("documents", {"text": qmodels.VectorParams(size=32, distance="Cosine")})
+        for start in range(0, 4000, 500):
+            store.upsert("documents", [
+                qmodels.PointStruct(id=ids[i], vector={"text": vectors[i].tolist()},
+                                    payload={"module_id": i % 4, "doc_id": str(i % 40), "ents": [f"e{i % 3}"]})
+                for i in range(start, start + 500)
+            ])
+        store.build_index("documents")
+
+        query = vectors[5] + 0.2
+        scores = unit @ (query / np.linalg.norm(query))
+        hits = store.search("documents", ("text", query.tolist()), limit=10)
+        recall = len({h.id for h in hits} & {ids[i] for i in np.argsort(-scores)[:10]}) / 10
+        assert recall >= 0.9, recall
+        print(f"✅ IVF search recall@10 vs exact: {recall:.2f}")
+
+        flt = qmodels.Filter(must=[_match("module_id", 1)],
+                             should=[qmodels.FieldCondition(key="ents", match=qmodels.MatchAny(any=["e2"]))])
+        hits = store.search("documents", ("text", query.tolist()), query_filter=flt, limit=10)
+        expected = [i for i in np.argsort(-scores) if i % 4 == 1 and i % 3 == 2][:10]
+        assert all(h.payload["module_id"] == 1 and h.payload["ents"] == ["e2"] for h in hits)
+        assert {h.id for h in hits} == {ids[i] for i in expected}
+        print("✅ Indexed (module_id) and payload-checked (ents) filters are honoured")
+
+        store.create_payload_index("documents", "ents", field_schema=qmodels.PayloadSchemaType.KEYWORD)
+        assert store.get_collection("documents").payload_schema["ents"].points == 4000
+        hits = store.search("documents", ("text", query.tolist()), query_filter=flt, limit=10)
+        assert {h.id for h in hits} == {ids[i] for i in expected}
+        print("✅ A payload index created later is backfilled from existing points")
+
+        store.delete("documents", qmodels.FilterSelector(filter=qmodels.Filter(must=[_match("doc_id", "3")])))
+        store.set_payload("documents", {"module_id": 9}, points=[ids[0]])
+        assert store.count("documents").count == 3900
+        assert store.count("documents", qmodels.Filter(must=[_match("module_id", 9)])).count == 1
+        records, offset = store.scroll("documents", scroll_filter=qmodels.Filter(must=[_match("doc_id", "5")]), limit=60)
+        assert len(records) == 60 and offset is not None
+        print("✅ Delete by filter, set_payload, count and scroll")
+
+        store.close()
+        store = LocalANNStore(directory)
+        assert store.count("documents").count == 3900
+        assert store.count("documents", qmodels.Filter(must=[_match("module_id", 9)])).count == 1
+        assert store._collections["documents"].spaces["text"].centroids is not None
+        assert store.compact("documents") == 3900 and store._collections["documents"].dead == 0
+        assert len(store.search("documents", ("text", query.tolist()), limit=5)) == 5
+        store.close()
+        print("✅ Points, payload index and IVF lists persist; compaction drops dead rows")
+
+    print("\n🎉 All vector store tests passed!")
+    return True
+
+if __name__ == "__main__":
+    try:
+        test_vector_store()
+    except Exception as e:
+        print(f"❌ Test failed with error: {e}")
+        sys.exit(1)
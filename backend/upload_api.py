@@ -2,6 +2,8 @@ import os
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from typing import Optional
 from db import create_module, add_document
+from ingest_jobs import enqueue_ingest
+from upload_storage import save_upload
 
 router = APIRouter()
 
@@ -25,20 +27,20 @@ async def upload_file(
     file: UploadFile = File(...)
 ):
     try:
-        # Create module directory if it doesn't exist
-        module_dir = os.path.join(UPLOAD_DIR, str(module_id))
-        os.makedirs(module_dir, exist_ok=True)
+        # Stream the upload into uploads/<module_id>/ (hashed and size-limited as it is written)
+        saved = await save_upload(file, module_id)
+        file_location = saved["file_path"]
 
-        # Save the uploaded file
-        file_location = os.path.join(module_dir, file.filename)
-        with open(file_location, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Save file info to the database (the hash makes it findable as a dedupe source)
+        doc_id = add_document(module_id, title, file_location, uploaded_by, team_id, saved["sha256"])
 
-        # Save file info to the database
-        doc_id = add_document(module_id, title, file_location, uploaded_by, team_id)
+        # Queue background ingestion, as the server's /api/upload does
+        job_id = enqueue_ingest(doc_id, module_id, file_location, title, team_id=team_id)
 
-        return {"success": True, "file_path": file_location, "document_id": doc_id, "module_id": module_id}
+        return {"success": True, "file_path": file_location, "document_id": doc_id, "module_id": module_id,
+                "job_id": job_id, "status": "queued", "sha256": saved["sha256"], "size": saved["size"]}
+    except HTTPException:
+        raise
     except Exception as e:
         # Log the error for debugging
         print(f"Error in upload_file: {e}")
@@ -0,0 +1,101 @@
+"""
+upload_storage.py - Streaming, size-limited upload writes
+
+Uploads are copied from the request in fixed-size chunks to a temp file next to their
+destination with async file I/O, hashed (sha256) and measured while they stream, and
+atomically renamed into uploads/<module_id>/ once complete. Memory per upload stays at
+one chunk no matter how large the file is. Every upload gets a path of its own (a suffixed
+name when another file already uses the filename), so it never overwrites the stored file
+of another document. Bytes that are already stored for another document are replaced by a
+hard link to the existing file.
+"""
+import os
+import uuid
+import hashlib
+from typing import Callable, Optional
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_KB", "1024")) * 1024
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit")
+
+def check_content_length(content_length: Optional[str]):
+    """Reject an upload up front when the request declares a body over the limit"""
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        raise _too_large()
+
+def claim_upload_path(directory: str, name: str) -> str:
+    """Reserve a new file in the directory: `name`, or name-<random>.ext when that is taken.
+    Creates an empty placeholder, so concurrent uploads cannot claim the same path."""
+    stem, ext = os.path.splitext(name)
+    candidate = name
+    while True:
+        path = os.path.join(directory, candidate)
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+            return path
+        except FileExistsError:
+            candidate = f"{stem}-{uuid.uuid4().hex[:8]}{ext}"
+
+async def save_upload(file: UploadFile, module_id: int, filename: Optional[str] = None) -> dict:
+    """Stream an upload into a new file in uploads/<module_id>/. Returns {file_path, sha256, size}."""
+    module_dir = os.path.join(UPLOAD_DIR, str(module_id))
+    await aiofiles.os.makedirs(module_dir, exist_ok=True)
+    # Only the base name is used so a crafted filename cannot escape the module directory
+    name = os.path.basename(filename or file.filename or "") or f"upload-{uuid.uuid4().hex}"
+    tmp_location = os.path.join(module_dir, f".{name}.{uuid.uuid4().hex}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_location, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise _too_large()
+                digest.update(chunk)
+                await out.write(chunk)
+        file_location = claim_upload_path(module_dir, name)
+        await aiofiles.os.replace(tmp_location, file_location)
+    except BaseException:
+        try:
+            await aiofiles.os.remove(tmp_location)
+        except OSError:
+            pass
+        raise
+    return {"file_path": file_location, "sha256": digest.hexdigest(), "size": size}
+
+def remove_unreferenced_file(file_path: str, is_referenced: Callable[[str], bool]) -> bool:
+    """Delete a stored upload unless a document still points at it (duplicates of legacy uploads
+    may share one path). Returns whether the file was removed."""
+    if not file_path or is_referenced(file_path):
+        return False
+    try:
+        os.remove(file_path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def reuse_stored_file(file_location: str, existing_location: str) -> bool:
+    """Replace a just-written upload with a hard link to an identical stored file"""
+    if not existing_location or not os.path.exists(existing_location):
+        return False
+    if os.path.exists(file_location) and os.path.samefile(file_location, existing_location):
+        return True
+    tmp_location = f"{file_location}.{uuid.uuid4().hex}.link"
+    try:
+        os.link(existing_location, tmp_location)
+        os.replace(tmp_location, file_location)
+        return True
+    except OSError:
+        # Different filesystem or no hard link support: keep the copy just written
+        return False
@@ -0,0 +1,1284 @@
+"""
+vector_store.py - Vector store behind retrieve() and the ingest pipeline
+
+VECTOR_STORE selects the backend:
+  qdrant  Qdrant - a server at QDRANT_URL, or embedded in qdrant_store/ when that is unset
+  ann     LocalANNStore in ann_store/: an IVF index over memory-mapped vector matrices
+
+The embedded backends (qdrant_store/ and ann_store/) lock their directory and serve a
+single process. To run several uvicorn workers, point QDRANT_URL at a Qdrant server;
+every worker then shares it through its own pooled HTTP (or gRPC) connection.
+
+Both expose the subset of the QdrantClient API used here (upsert, search, scroll, count,
+delete, set_payload, delete_payload and collection management), so callers build the
+same qmodels points and filters whichever backend is configured.
+
+LocalANNStore keeps one directory per collection:
+  points.db         SQLite: point ids, JSON payloads, indexed payload terms, vector rows
+  <vector>.vec      unit vectors of one named vector (ANN_DTYPE), mmap'd and append-only
+  <vector>.ivf.npz  IVF centroids and list assignments
+Sparse vectors (e.g. BM25 term weights) are stored as postings in points.db and scored
+term-at-a-time; with the idf modifier each term is weighted by ln((N - df + 0.5) / (df + 0.5) + 1)
+over live points, as Qdrant does.
+
+Once a named vector holds ANN_MIN_TRAIN_POINTS vectors a spherical k-means quantiser is
+trained in the background, and retrained whenever the count doubles; searches then score
+only the ANN_NPROBE nearest lists. Filters on payload-indexed keys (create_payload_index,
+by default ANN_INDEXED_KEYS) become row masks, and a filter leaving at most
+ANN_EXACT_MAX_CANDIDATES rows is searched exactly. Conditions on other keys (e.g. ents) are checked against the
+payloads of the best-scoring candidates. Overwritten and deleted points leave dead rows
+behind until compact().
+
+    python vector_store.py --copy embedded server   # move qdrant_store/ to the server at QDRANT_URL
+    python vector_store.py --copy embedded ann      # fill the ANN store from qdrant_store/
+    python vector_store.py --compact                # drop dead rows and retrain the ANN index
+"""
+import os
+import json
+import math
+import uuid
+import shutil
+import sqlite3
+import logging
+import time
+import argparse
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks
+    fcntl = None
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qmodels
+
+log = logging.getLogger(__name__)
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "qdrant").lower()  # "qdrant" or "ann"
+QDRANT_PATH = Path(__file__).parent / "qdrant_store"
+QDRANT_URL = os.getenv("QDRANT_URL")  # e.g. http://localhost:6333; unset = embedded store in QDRANT_PATH
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "0") == "1"  # gRPC on port 6334 instead of REST
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))  # seconds per request to the server
+ANN_PATH = Path(os.getenv("ANN_STORE_PATH", str(Path(__file__).parent / "ann_store")))
+ANN_DTYPE = os.getenv("ANN_DTYPE", "float16")  # stored vector precision; float16 halves memory and disk
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))  # IVF lists scored per search
+ANN_MIN_TRAIN_POINTS = int(os.getenv("ANN_MIN_TRAIN_POINTS", "20000"))  # below this every search is exact
+ANN_EXACT_MAX_CANDIDATES = int(os.getenv("ANN_EXACT_MAX_CANDIDATES", "8192"))  # filtered sets this small are searched exactly
+ANN_INDEXED_KEYS = tuple(k.strip() for k in os.getenv("ANN_INDEXED_KEYS", "module_id,team_id,doc_id,type").split(",") if k.strip())  # default payload indexes of new collections
+ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "32768"))  # vectors sampled for k-means
+ANN_TRAIN_ITERATIONS = 12
+ANN_SCORE_BLOCK = 65536  # rows scored per matmul in exact scans
+
+# ---------------------------------------------------------------------------
+# Helpers
+
+def _reserve(array: np.ndarray, size: int, fill=0) -> np.ndarray:
+    """`array`, or a copy with room for at least `size` entries (capacity doubles)"""
+    if len(array) >= size:
+        return array
+    grown = np.full(max(size, 2 * len(array), 1024), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _term(value):
+    """Hashable index term that keeps 1, True and "1" apart (as Qdrant's typed indexes do)"""
+    return (type(value).__name__, value)
+
+def _point_key(point_id):
+    """Qdrant point ids are unsigned ints or UUIDs (stored in canonical form)"""
+    if isinstance(point_id, (int, np.integer)) and not isinstance(point_id, bool):
+        return int(point_id)
+    return str(uuid.UUID(str(point_id)))
+
+_MISSING = object()
+
+def _lookup(payload: dict, key: str):
+    """Value at a (dotted) payload key, or _MISSING"""
+    value = payload
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _payload_values(payload: dict, key: str) -> list:
+    """Values at a payload key, with lists flattened"""
+    value = _lookup(payload, key)
+    if value is _MISSING or value is None:
+        return []
+    return list(value) if isinstance(value, list) else [value]
+
+def _schema_name(schema) -> str:
+    """"keyword", "integer", ... from a PayloadSchemaType, index params object or string"""
+    schema = getattr(schema, "type", schema)
+    return str(getattr(schema, "value", schema) or "keyword")
+
+def _index_terms(payload: dict, keys: Iterable[str]) -> List[tuple[str, object]]:
+    terms = []
+    for key in keys:
+        for value in _payload_values(payload, key):
+            if isinstance(value, (str, int, float, bool)):
+                terms.append((key, value))
+    return terms
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, block: int = 8192) -> np.ndarray:
+    """Nearest centroid (max inner product) of every vector"""
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block):
+        scores = np.asarray(vectors[start:start + block], dtype=np.float32) @ centroids.T
+        lists[start:start + block] = scores.argmax(axis=1)
+    return lists
+
+def _kmeans(sample: np.ndarray, k: int, iterations: int = ANN_TRAIN_ITERATIONS, seed: int = 0, block: int = 4096) -> np.ndarray:
+    """Spherical k-means: unit centroids maximising inner product with their members.
+    The sample stays in its stored dtype and is converted one block at a time."""
+    rng = np.random.default_rng(seed)
+    centroids = np.asarray(sample[np.sort(rng.choice(len(sample), k, replace=False))], dtype=np.float32)
+    for _ in range(iterations):
+        sums = np.zeros_like(centroids)
+        counts = np.zeros(k, dtype=np.int64)
+        for start in range(0, len(sample), block):
+            vectors = np.asarray(sample[start:start + block], dtype=np.float32)
+            lists = (vectors @ centroids.T).argmax(axis=1)
+            members = np.zeros((len(vectors), k), dtype=np.float32)
+            members[np.arange(len(vectors)), lists] = 1.0
+            sums += members.T @ vectors
+            counts += np.bincount(lists, minlength=k)
+        filled = counts > 0
+        centroids[filled] = _normalize(sums[filled])
+        if not filled.all():
+            reseed = rng.choice(len(sample), int((~filled).sum()), replace=False)
+            centroids[~filled] = np.asarray(sample[np.sort(reseed)], dtype=np.float32)
+    return centroids
+
+def ivf_list_count(n: int) -> int:
+    return int(min(max(2 * np.sqrt(n), 16), 8192))
+
+# ---------------------------------------------------------------------------
+# Filters
+
+def _match_values(values: list, match) -> bool:
+    if isinstance(match, qmodels.MatchValue):
+        return any(_term(v) == _term(match.value) for v in values)
+    if isinstance(match, qmodels.MatchAny):
+        wanted = {_term(v) for v in match.any}
+        return any(_term(v) in wanted for v in values)
+    if isinstance(match, qmodels.MatchExcept):
+        excluded = {_term(v) for v in getattr(match, "except_")}
+        return not any(_term(v) in excluded for v in values)
+    if isinstance(match, qmodels.MatchText):
+        return any(isinstance(v, str) and match.text in v for v in values)
+    raise ValueError(f"Unsupported match condition: {type(match).__name__}")
+
+def _condition_holds(condition, point_id, payload: dict) -> bool:
+    """Evaluate one filter condition against a point (the full, unindexed path)"""
+    if isinstance(condition, qmodels.Filter):
+        return filter_matches(condition, point_id, payload)
+    if isinstance(condition, qmodels.HasIdCondition):
+        return point_id in {_point_key(i) for i in condition.has_id}
+    if isinstance(condition, qmodels.IsEmptyCondition):
+        return not _payload_values(payload, condition.is_empty.key)
+    if isinstance(condition, qmodels.IsNullCondition):
+        return _lookup(payload, condition.is_null.key) is None
+    if isinstance(condition, qmodels.FieldCondition):
+        values = _payload_values(payload, condition.key)
+        if condition.match is not None:
+            return _match_values(values, condition.match)
+        if condition.range is not None:
+            r = condition.range
+            return any(isinstance(v, (int, float)) and not isinstance(v, bool)
+                       and (r.gt is None or v > r.gt) and (r.gte is None or v >= r.gte)
+                       and (r.lt is None or v < r.lt) and (r.lte is None or v <= r.lte) for v in values)
+    raise ValueError(f"Unsupported filter condition: {condition!r}")
+
+def filter_matches(flt: Optional[qmodels.Filter], point_id, payload: dict) -> bool:
+    """Qdrant filter semantics: all `must`, at least one `should` (if any), no `must_not`"""
+    if flt is None:
+        return True
+    if not all(_condition_holds(c, point_id, payload) for c in flt.must or []):
+        return False
+    if flt.should and not any(_condition_holds(c, point_id, payload) for c in flt.should):
+        return False
+    return not any(_condition_holds(c, point_id, payload) for c in flt.must_not or [])
+
+def _sparse_parts(vector) -> tuple[list, list]:
+    """(indices, values) of a SparseVector or its dict form"""
+    indices, values = (vector.indices, vector.values) if hasattr(vector, "indices") else (vector["indices"], vector["values"])
+    if len(indices) != len(values):
+        raise ValueError("Sparse vector indices and values differ in length")
+    return list(indices), list(values)
+
+def _as_list(conditions) -> list:
+    if conditions is None:
+        return []
+    return conditions if isinstance(conditions, list) else [conditions]
+
+# ---------------------------------------------------------------------------
+# Local ANN backend
+
+class _VectorSpace:
+    """One named vector: an append-only mmap'd matrix of unit vectors and its IVF quantiser"""
+
+    def __init__(self, directory: Path, name: str, dim: int, distance: str, dtype: str = ANN_DTYPE):
+        self.name, self.dim = name, dim
+        self.normalize = str(distance).lower() == "cosine"
+        self.dtype = np.dtype(dtype)
+        self.path = directory / f"{name}.vec"
+        self.ivf_path = directory / f"{name}.ivf.npz"
+        self.size = 0
+        self.point_rows = np.zeros(0, dtype=np.int64)  # vector row -> point row
+        self.lists = np.zeros(0, dtype=np.int32)  # vector row -> IVF list (-1 before training)
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_rows = 0  # vector rows covered by the inverted lists below
+        self._list_order = np.zeros(0, dtype=np.int64)  # trained vector rows grouped by list
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+        self.training = False
+        self._matrix: Optional[np.memmap] = None
+        self._capacity = 0
+
+    def open(self, point_rows: np.ndarray):
+        self.size = len(point_rows)
+        self.point_rows = _reserve(point_rows.astype(np.int64), self.size)
+        row_bytes = self.dim * self.dtype.itemsize
+        if self.path.exists() and self.path.stat().st_size >= row_bytes:
+            self._map(self.path.stat().st_size // row_bytes)
+        self._reserve_rows(self.size)
+        self.lists = np.full(max(self.size, 1024), -1, dtype=np.int32)
+        if self.ivf_path.exists() and self.size:
+            with np.load(self.ivf_path) as ivf:
+                centroids, lists = ivf["centroids"], ivf["lists"][:self.size]
+            tail = _assign(self.matrix()[len(lists):], centroids)
+            self._install(centroids, np.concatenate([lists, tail]))
+
+    def _map(self, capacity: int):
+        self._matrix = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def _reserve_rows(self, rows: int):
+        if rows <= self._capacity and self._matrix is not None:
+            return
+        capacity = max(rows, 2 * self._capacity, 1024)
+        if self._matrix is not None:
+            self._matrix.flush()
+        with open(self.path, "ab") as f:
+            f.truncate(capacity * self.dim * self.dtype.itemsize)
+        # Readers holding the previous mapping keep a valid view of the rows they snapshot
+        self._map(capacity)
+
+    def matrix(self) -> np.ndarray:
+        return self._matrix[:self.size] if self._matrix is not None else np.zeros((0, self.dim), dtype=self.dtype)
+
+    def prepare(self, vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        array = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim) if len(vectors) else np.zeros((0, self.dim), np.float32)
+        return _normalize(array) if self.normalize else array
+
+    def append(self, vectors: np.ndarray, point_rows: np.ndarray) -> range:
+        start, end = self.size, self.size + len(vectors)
+        self._reserve_rows(end)
+        self._matrix[start:end] = vectors.astype(self.dtype)
+        self._matrix.flush()
+        self.point_rows = _reserve(self.point_rows, end)
+        self.point_rows[start:end] = point_rows
+        self.lists = _reserve(self.lists, end, fill=-1)
+        if self.centroids is not None:
+            self.lists[start:end] = _assign(vectors, self.centroids)
+        self.size = end
+        return range(start, end)
+
+    def truncate(self, size: int):
+        """Forget rows appended after `size` (an upsert whose metadata write failed)"""
+        self.size = min(self.size, size)
+
+    def vector(self, vector_row: int) -> List[float]:
+        return np.asarray(self._matrix[vector_row], dtype=np.float32).tolist()
+
+    # IVF training and probing
+
+    def needs_training(self) -> bool:
+        return not self.training and self.size >= ANN_MIN_TRAIN_POINTS and self.size >= 2 * self.trained_rows
+
+    def train(self, lock: threading.RLock):
+        """Fit centroids on a sample and assign every row; the bulk of the work runs unlocked"""
+        with lock:
+            n, matrix = self.size, self._matrix
+        k = min(ivf_list_count(n), n)
+        rng = np.random.default_rng(n)
+        sample_rows = np.sort(rng.choice(n, min(n, max(ANN_TRAIN_SAMPLE, k)), replace=False))
+        centroids = _kmeans(matrix[sample_rows], k)
+        lists = _assign(matrix[:n], centroids)
+        with lock:
+            # Rows appended while training get their lists from the new centroids too
+            lists = np.concatenate([lists, _assign(self._matrix[n:self.size], centroids)])
+            self._install(centroids, lists)
+            np.savez(self.ivf_path, centroids=centroids, lists=lists)
+        log.info(f"ANN index '{self.name}': trained {k} lists over {len(lists)} vectors")
+
+    def _install(self, centroids: np.ndarray, lists: np.ndarray):
+        self.centroids = centroids
+        self.lists = _reserve(lists.astype(np.int32), len(lists), fill=-1)
+        self.trained_rows = len(lists)
+        self._list_order = np.argsort(lists, kind="stable")
+        self._list_offsets = np.searchsorted(lists[self._list_order], np.arange(len(centroids) + 1))
+
+    def snapshot(self) -> SimpleNamespace:
+        """State needed to search, so scoring can run without holding the collection lock"""
+        return SimpleNamespace(size=self.size, matrix=self.matrix(), point_rows=self.point_rows[:self.size],
+                               centroids=self.centroids, lists=self.lists, trained_rows=self.trained_rows,
+                               list_order=self._list_order, list_offsets=self._list_offsets)
+
+    @staticmethod
+    def probe(state: SimpleNamespace, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Vector rows in the `nprobe` lists whose centroids are closest to the query"""
+        nprobe = min(nprobe, len(state.centroids))
+        probes = np.argpartition(-(state.centroids @ query), nprobe - 1)[:nprobe]
+        parts = [state.list_order[state.list_offsets[p]:state.list_offsets[p + 1]] for p in probes]
+        if state.size > state.trained_rows:
+            tail = state.lists[state.trained_rows:state.size]
+            parts.append(state.trained_rows + np.flatnonzero(np.isin(tail, probes)))
+        candidates = np.concatenate(parts)
+        candidates.sort()  # sequential reads from the mmap
+        return candidates
+
+    @staticmethod
+    def score(state: SimpleNamespace, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        if rows is None:
+            return np.concatenate([np.asarray(state.matrix[s:s + ANN_SCORE_BLOCK], dtype=np.float32) @ query
+                                   for s in range(0, state.size, ANN_SCORE_BLOCK)] or [np.zeros(0, np.float32)])
+        return np.concatenate([np.asarray(state.matrix[rows[s:s + ANN_SCORE_BLOCK]], dtype=np.float32) @ query
+                               for s in range(0, len(rows), ANN_SCORE_BLOCK)] or [np.zeros(0, np.float32)])
+
+    @classmethod
+    def search(cls, state: SimpleNamespace, query: np.ndarray, allowed: Optional[np.ndarray], limit: int,
+               nprobe: int, exact: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        """(vector rows, scores) of the best `limit` allowed rows, best first.
+        `allowed` is a bool mask over vector rows, or None for all of them."""
+        if state.size == 0 or limit <= 0:
+            return np.zeros(0, np.int64), np.zeros(0, np.float32)
+        n_allowed = state.size if allowed is None else int(np.count_nonzero(allowed))
+        rows = None
+        if not exact and state.centroids is not None and n_allowed > ANN_EXACT_MAX_CANDIDATES:
+            rows = cls.probe(state, query, nprobe)
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            if len(rows) < limit:
+                rows = None  # a selective filter emptied the probed lists; fall back to exact
+        if rows is None and allowed is not None:
+            rows = np.flatnonzero(allowed)
+        scores = cls.score(state, query, rows)
+        if rows is None:
+            rows = np.arange(state.size)
+        if len(rows) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+class _Collection:
+    """Points of one collection: SQLite metadata plus one _VectorSpace per named vector"""
+
+    def __init__(self, directory: Path, vectors_config: Optional[Dict[str, qmodels.VectorParams]] = None, auto_train: bool = True,
+                 payload_schema: Optional[Dict[str, str]] = None,
+                 sparse_config: Optional[Dict[str, qmodels.SparseVectorParams]] = None):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.dir = directory
+        self.auto_train = auto_train
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(directory / "points.db", check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS points (
+                row INTEGER PRIMARY KEY,
+                id NOT NULL,
+                payload TEXT NOT NULL,
+                alive INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE INDEX IF NOT EXISTS idx_points_id ON points(id);
+            CREATE TABLE IF NOT EXISTS terms (row INTEGER NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_terms_row ON terms(row);
+            CREATE TABLE IF NOT EXISTS vector_rows (
+                name TEXT NOT NULL,
+                vrow INTEGER NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (name, vrow)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sparse_postings (
+                name TEXT NOT NULL,
+                term INTEGER NOT NULL,
+                row INTEGER NOT NULL,
+                weight REAL NOT NULL,
+                PRIMARY KEY (name, term, row)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_sparse_postings_row ON sparse_postings(row);
+        """)
+        if vectors_config is not None:
+            config = {name: {"size": p.size, "distance": str(getattr(p.distance, "value", p.distance))}
+                      for name, p in vectors_config.items()}
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('vectors', ?)", (json.dumps(config),))
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'vectors'").fetchone()
+        if row is None:
+            raise ValueError(f"Collection at {directory} has no vector configuration")
+        self.config = json.loads(row[0])
+        if payload_schema is None and vectors_config is not None and \
+                self.db.execute("SELECT 1 FROM meta WHERE key = 'payload_schema'").fetchone() is None:
+            # Fix a new collection's indexes at creation, so a later ANN_INDEXED_KEYS cannot claim unindexed keys
+            payload_schema = {key: "keyword" for key in ANN_INDEXED_KEYS}
+        if payload_schema is not None:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('payload_schema', ?)", (json.dumps(payload_schema),))
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'payload_schema'").fetchone()
+        self.payload_schema: Dict[str, str] = json.loads(row[0]) if row else {key: "keyword" for key in ANN_INDEXED_KEYS}
+        if sparse_config is not None:
+            sparse = {name: {"modifier": str(getattr(p.modifier, "value", p.modifier) or "none").lower()}
+                      for name, p in sparse_config.items()}
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sparse_vectors', ?)", (json.dumps(sparse),))
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'sparse_vectors'").fetchone()
+        self.sparse_config: Dict[str, dict] = json.loads(row[0]) if row else {}
+        for name, params in self.config.items():
+            if params["distance"].lower() not in ("cosine", "dot"):
+                raise ValueError(f"Distance {params['distance']} is not supported by the ANN store")
+
+        # In-memory state: id map, liveness, term index; payloads stay in SQLite
+        self.row_ids: List = []
+        self.ids: Dict = {}
+        self.alive = np.zeros(1024, dtype=bool)
+        self.dead = 0
+        for row, point_id, alive in self.db.execute("SELECT row, id, alive FROM points ORDER BY row"):
+            self.row_ids.append(point_id)
+            if alive:
+                self.ids[point_id] = row
+        self.alive = _reserve(self.alive, len(self.row_ids))
+        self.alive[list(self.ids.values())] = True
+        self.dead = len(self.row_ids) - len(self.ids)
+        self.index: Dict[str, Dict[tuple, set]] = {}
+        for row, key, value in self.db.execute("SELECT row, key, value FROM terms"):
+            self.index.setdefault(key, {}).setdefault(_term(json.loads(value)), set()).add(row)
+        self._masks: Dict[tuple, np.ndarray] = {}
+
+        self.spaces: Dict[str, _VectorSpace] = {}
+        self.row_vrows: Dict[str, np.ndarray] = {}  # point row -> vector row, per named vector
+        for name, params in self.config.items():
+            space = _VectorSpace(directory, name, params["size"], params["distance"])
+            point_rows = np.fromiter((r for (r,) in self.db.execute(
+                "SELECT row FROM vector_rows WHERE name = ? ORDER BY vrow", (name,))), dtype=np.int64)
+            space.open(point_rows)
+            self.spaces[name] = space
+            vrows = np.full(len(self.alive), -1, dtype=np.int64)
+            vrows[point_rows] = np.arange(len(point_rows))
+            self.row_vrows[name] = vrows
+        self._maybe_train()
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.row_ids)
+
+    def close(self):
+        with self.lock:
+            for space in self.spaces.values():
+                if space._matrix is not None:
+                    space._matrix.flush()
+            self.db.close()
+
+    def vectors_config(self) -> Dict[str, qmodels.VectorParams]:
+        return {name: qmodels.VectorParams(size=p["size"], distance=p["distance"].capitalize())
+                for name, p in self.config.items()}
+
+    def sparse_vectors_config(self) -> Dict[str, qmodels.SparseVectorParams]:
+        return {name: qmodels.SparseVectorParams(modifier=qmodels.Modifier.IDF if p["modifier"] == "idf" else None)
+                for name, p in self.sparse_config.items()}
+
+    # Masks
+
+    def _term_mask(self, key: str, values: Iterable) -> np.ndarray:
+        cache_key = (key, tuple(sorted(map(repr, values))))
+        mask = self._masks.get(cache_key)
+        if mask is None:
+            mask = np.zeros(self.n_rows, dtype=bool)
+            terms = self.index.get(key, {})
+            for value in values:
+                rows = terms.get(_term(value))
+                if rows:
+                    mask[np.fromiter(rows, dtype=np.int64, count=len(rows))] = True
+            self._masks[cache_key] = mask
+        return mask
+
+    def _condition_mask(self, condition) -> tuple[Optional[np.ndarray], bool]:
+        """(mask, exact): a row mask that is a superset of the matching rows (None = all rows),
+        and whether it is exact or candidates still need checking against their payloads"""
+        if isinstance(condition, qmodels.Filter):
+            return self._filter_mask(condition)
+        if isinstance(condition, qmodels.HasIdCondition):
+            mask = np.zeros(self.n_rows, dtype=bool)
+            rows = [self.ids[k] for k in map(_point_key, condition.has_id) if k in self.ids]
+            mask[rows] = True
+            return mask, True
+        if isinstance(condition, qmodels.FieldCondition) and condition.key in self.payload_schema:
+            if isinstance(condition.match, qmodels.MatchValue):
+                return self._term_mask(condition.key, [condition.match.value]), True
+            if isinstance(condition.match, qmodels.MatchAny):
+                return self._term_mask(condition.key, condition.match.any), True
+        return None, False
+
+    def _filter_mask(self, flt: Optional[qmodels.Filter]) -> tuple[Optional[np.ndarray], bool]:
+        if flt is None:
+            return None, True
+        mask, exact = None, True
+        for condition in _as_list(flt.must):
+            m, e = self._condition_mask(condition)
+            exact &= e
+            if m is not None:
+                mask = m if mask is None else mask & m
+        should = _as_list(flt.should)
+        if should:
+            masks = [self._condition_mask(c) for c in should]
+            exact &= all(e for _, e in masks)
+            if all(m is not None for m, _ in masks):
+                any_mask = np.logical_or.reduce([m for m, _ in masks])
+                mask = any_mask if mask is None else mask & any_mask
+        for condition in _as_list(flt.must_not):
+            m, e = self._condition_mask(condition)
+            if m is not None and e:
+                mask = ~m if mask is None else mask & ~m
+            else:
+                exact = False  # cannot exclude from a superset; payload checks do it
+        return mask, exact
+
+    def _live_mask(self, flt: Optional[qmodels.Filter]) -> tuple[Optional[np.ndarray], bool]:
+        """Filter mask restricted to live rows (None when every row qualifies)"""
+        mask, exact = self._filter_mask(flt)
+        if mask is None:
+            return (self.alive[:self.n_rows].copy() if self.dead else None), exact
+        return mask & self.alive[:self.n_rows], exact
+
+    # Payloads
+
+    def _payloads(self, rows: Sequence[int]) -> Dict[int, dict]:
+        payloads = {}
+        rows = [int(r) for r in rows]
+        for start in range(0, len(rows), 500):
+            part = rows[start:start + 500]
+            query = f"SELECT row, payload FROM points WHERE row IN ({','.join('?' * len(part))})"
+            payloads.update((row, json.loads(payload)) for row, payload in self.db.execute(query, part))
+        return payloads
+
+    def _filtered_rows(self, rows: Sequence[int], flt, exact: bool, payloads: Optional[Dict[int, dict]] = None) -> List[int]:
+        if exact:
+            return list(rows)
+        payloads = payloads if payloads is not None else self._payloads(rows)
+        return [r for r in rows if filter_matches(flt, self.row_ids[r], payloads[int(r)])]
+
+    def _record_fields(self, row: int, payload: Optional[dict], with_payload, with_vectors) -> dict:
+        fields = {"id": self.row_ids[row], "payload": None, "vector": None}
+        if with_payload and payload is not None:
+            fields["payload"] = payload if with_payload is True else {k: payload[k] for k in with_payload if k in payload}
+        if with_vectors:
+            names = [*self.spaces, *self.sparse_config] if with_vectors is True else with_vectors
+            vectors = {}
+            for name in names:
+                if name in self.spaces and self.row_vrows[name][row] >= 0:
+                    vectors[name] = self.spaces[name].vector(self.row_vrows[name][row])
+                elif name in self.sparse_config:
+                    postings = self.db.execute("SELECT term, weight FROM sparse_postings WHERE row = ? AND name = ? ORDER BY term",
+                                               (row, name)).fetchall()
+                    if postings:
+                        vectors[name] = qmodels.SparseVector(indices=[t for t, _ in postings], values=[w for _, w in postings])
+            fields["vector"] = vectors
+        return fields
+
+    # Writes
+
+    def _kill(self, rows: Sequence[int]):
+        """Mark rows dead and drop them from the term index (caller commits)"""
+        rows = [int(r) for r in rows]
+        if not rows:
+            return
+        for start in range(0, len(rows), 500):
+            part = rows[start:start + 500]
+            marks = ",".join("?" * len(part))
+            for row, key, value in self.db.execute(f"SELECT row, key, value FROM terms WHERE row IN ({marks})", part).fetchall():
+                self.index.get(key, {}).get(_term(json.loads(value)), set()).discard(row)
+            self.db.execute(f"DELETE FROM terms WHERE row IN ({marks})", part)
+            self.db.execute(f"DELETE FROM sparse_postings WHERE row IN ({marks})", part)
+            self.db.execute(f"UPDATE points SET alive = 0 WHERE row IN ({marks})", part)
+        for row in rows:
+            self.ids.pop(self.row_ids[row], None)
+        self.alive[rows] = False
+        self.dead += len(rows)
+
+    def _add_terms(self, row: int, payload: dict):
+        terms = _index_terms(payload, self.payload_schema)
+        self.db.executemany("INSERT INTO terms (row, key, value) VALUES (?, ?, ?)",
+                            [(row, key, json.dumps(value)) for key, value in terms])
+        for key, value in terms:
+            self.index.setdefault(key, {}).setdefault(_term(value), set()).add(row)
+
+    def upsert(self, points: Sequence[qmodels.PointStruct]):
+        batch: Dict = {}
+        for point in points:
+            batch[_point_key(point.id)] = point  # last write of an id wins, as in Qdrant
+        with self.lock:
+            first_row = self.n_rows
+            per_space: Dict[str, tuple[list, list]] = {}
+            postings = []  # (name, term, row, weight) of sparse vectors
+            for offset, (point_id, point) in enumerate(batch.items()):
+                vectors = point.vector
+                if not isinstance(vectors, dict):
+                    if len(self.spaces) != 1:
+                        raise ValueError("Points need named vectors in a collection with several vector spaces")
+                    vectors = {next(iter(self.spaces)): vectors}
+                for name, vector in vectors.items():
+                    if name in self.sparse_config:
+                        indices, values = _sparse_parts(vector)
+                        postings.extend((name, int(t), first_row + offset, float(w)) for t, w in zip(indices, values))
+                        continue
+                    if name not in self.spaces:
+                        raise ValueError(f"Unknown vector name: {name}")
+                    if len(vector) != self.spaces[name].dim:
+                        raise ValueError(f"Vector '{name}' must have {self.spaces[name].dim} dimensions, got {len(vector)}")
+                    per_space.setdefault(name, ([], []))
+                    per_space[name][0].append(vector)
+                    per_space[name][1].append(first_row + offset)
+
+            sizes = {name: space.size for name, space in self.spaces.items()}
+            appended = {name: self.spaces[name].append(self.spaces[name].prepare(vectors), np.asarray(rows, np.int64))
+                        for name, (vectors, rows) in per_space.items()}
+            try:
+                self.db.execute("BEGIN")
+                self._kill([self.ids[k] for k in batch if k in self.ids])
+                self.db.executemany("INSERT INTO points (row, id, payload) VALUES (?, ?, ?)",
+                                    [(first_row + i, k, json.dumps(p.payload or {})) for i, (k, p) in enumerate(batch.items())])
+                for i, point in enumerate(batch.values()):
+                    self._add_terms(first_row + i, point.payload or {})
+                for name, vrows in appended.items():
+                    self.db.executemany("INSERT INTO vector_rows (name, vrow, row) VALUES (?, ?, ?)",
+                                        zip([name] * len(vrows), vrows, per_space[name][1]))
+                self.db.executemany("INSERT INTO sparse_postings (name, term, row, weight) VALUES (?, ?, ?, ?)", postings)
+                self.db.execute("COMMIT")
+            except BaseException:
+                if self.db.in_transaction:
+                    self.db.execute("ROLLBACK")
+                for name, size in sizes.items():
+                    self.spaces[name].truncate(size)
+                self._reload_index()
+                raise
+
+            n = len(batch)
+            self.row_ids.extend(batch.keys())
+            self.alive = _reserve(self.alive, first_row + n)
+            self.alive[first_row:first_row + n] = True
+            for i, k in enumerate(batch):
+                self.ids[k] = first_row + i
+            for name in self.spaces:
+                self.row_vrows[name] = _reserve(self.row_vrows[name], first_row + n, fill=-1)
+            for name, vrows in appended.items():
+                self.row_vrows[name][per_space[name][1]] = list(vrows)
+            self._masks.clear()
+        self._maybe_train()
+
+    def _reload_index(self):
+        """Rebuild in-memory liveness and terms from SQLite after a failed write"""
+        self.ids = {}
+        self.alive[:] = False
+        for row, point_id, alive in self.db.execute("SELECT row, id, alive FROM points WHERE row < ?", (self.n_rows,)):
+            if alive:
+                self.ids[point_id] = row
+                self.alive[row] = True
+        self.dead = self.n_rows - len(self.ids)
+        self.index = {}
+        for row, key, value in self.db.execute("SELECT row, key, value FROM terms"):
+            self.index.setdefault(key, {}).setdefault(_term(json.loads(value)), set()).add(row)
+        self._masks.clear()
+
+    def _maybe_train(self):
+        if not self.auto_train:
+            return
+        for space in self.spaces.values():
+            with self.lock:
+                if not space.needs_training():
+                    continue
+                space.training = True
+            threading.Thread(target=self._train, args=(space,), name=f"ann-train-{space.name}", daemon=True).start()
+
+    def _train(self, space: _VectorSpace):
+        try:
+            space.train(self.lock)
+        except Exception as e:
+            log.error(f"ANN index training for '{space.name}' failed: {e}")
+        finally:
+            space.training = False
+
+    def build_index(self):
+        """Train every vector space now, in the calling thread"""
+        for space in self.spaces.values():
+            if space.size >= ANN_MIN_TRAIN_POINTS:
+                space.training = True
+                try:
+                    space.train(self.lock)
+                finally:
+                    space.training = False
+
+    def select_rows(self, selector) -> List[int]:
+        """Live rows named by ids, PointIdsList, Filter or FilterSelector"""
+        if isinstance(selector, qmodels.FilterSelector):
+            selector = selector.filter
+        if isinstance(selector, qmodels.Filter):
+            mask, exact = self._live_mask(selector)
+            rows = np.flatnonzero(mask) if mask is not None else np.arange(self.n_rows)
+            return self._filtered_rows(rows.tolist(), selector, exact)
+        if isinstance(selector, qmodels.PointIdsList):
+            selector = selector.points
+        return [self.ids[k] for k in map(_point_key, selector) if k in self.ids]
+
+    def delete(self, selector):
+        with self.lock:
+            rows = self.select_rows(selector)
+            self.db.execute("BEGIN")
+            try:
+                self._kill(rows)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                self._reload_index()
+                raise
+            self._masks.clear()
+
+    def update_payloads(self, selector, update):
+        """Rewrite the payload of selected points with update(payload) -> payload"""
+        with self.lock:
+            rows = self.select_rows(selector)
+            payloads = self._payloads(rows)
+            self.db.execute("BEGIN")
+            try:
+                for row in rows:
+                    payload = update(payloads[row])
+                    self.db.execute("UPDATE points SET payload = ? WHERE row = ?", (json.dumps(payload), row))
+                    for _, key, value in self.db.execute("SELECT row, key, value FROM terms WHERE row = ?", (row,)).fetchall():
+                        self.index.get(key, {}).get(_term(json.loads(value)), set()).discard(row)
+                    self.db.execute("DELETE FROM terms WHERE row = ?", (row,))
+                    self._add_terms(row, payload)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                self._reload_index()
+                raise
+            self._masks.clear()
+
+    def create_payload_index(self, key: str, schema: str):
+        """Index a payload key, backfilling terms from every live point"""
+        with self.lock:
+            if key in self.payload_schema:
+                return
+            self.db.execute("BEGIN")
+            try:
+                rows = self.db.execute("SELECT row, payload FROM points WHERE alive = 1").fetchall()
+                terms = [(row, k, json.dumps(value)) for row, payload in rows for k, value in _index_terms(json.loads(payload), [key])]
+                self.db.executemany("INSERT INTO terms (row, key, value) VALUES (?, ?, ?)", terms)
+                self.payload_schema[key] = schema
+                self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('payload_schema', ?)", (json.dumps(self.payload_schema),))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                self.payload_schema.pop(key, None)
+                raise
+            values = self.index.setdefault(key, {})
+            for row, _, value in terms:
+                values.setdefault(_term(json.loads(value)), set()).add(row)
+            self._masks.clear()
+
+    def delete_payload_index(self, key: str):
+        with self.lock:
+            if self.payload_schema.pop(key, None) is None:
+                return
+            self.db.execute("BEGIN")
+            self.db.execute("DELETE FROM terms WHERE key = ?", (key,))
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('payload_schema', ?)", (json.dumps(self.payload_schema),))
+            self.db.execute("COMMIT")
+            self.index.pop(key, None)
+            self._masks.clear()
+
+    def payload_index_info(self) -> Dict[str, qmodels.PayloadIndexInfo]:
+        with self.lock:
+            return {key: qmodels.PayloadIndexInfo(data_type=schema, points=sum(len(rows) for rows in self.index.get(key, {}).values()))
+                    for key, schema in self.payload_schema.items()}
+
+    # Reads
+
+    def search(self, name: str, vector, flt, limit: int, offset: int, with_payload, with_vectors,
+               score_threshold: Optional[float], exact: bool, nprobe: Optional[int]) -> List[qmodels.ScoredPoint]:
+        if name not in self.spaces:
+            raise ValueError(f"Unknown vector name: {name}")
+        space = self.spaces[name]
+        query = space.prepare([vector])[0]
+        with self.lock:
+            mask, residual_exact = self._live_mask(flt)
+            state = space.snapshot()
+            allowed = mask[state.point_rows] if mask is not None else None
+        wanted = limit + offset
+        # Unindexed conditions are checked on payloads, so rank extra candidates for them
+        fetch = wanted if residual_exact else max(4 * wanted, 64)
+        while True:
+            vrows, scores = _VectorSpace.search(state, query, allowed, fetch, nprobe or ANN_NPROBE, exact)
+            if score_threshold is not None:
+                keep = scores >= score_threshold
+                vrows, scores = vrows[keep], scores[keep]
+            rows = state.point_rows[vrows]
+            with self.lock:
+                payloads = self._payloads(rows) if (with_payload or not residual_exact) else {}
+                matched = set(self._filtered_rows(rows.tolist(), flt, residual_exact, payloads))
+                hits = [(int(r), float(s)) for r, s in zip(rows, scores) if int(r) in matched]
+                if len(hits) >= wanted or len(vrows) < fetch:
+                    return [qmodels.ScoredPoint(version=0, score=s, **self._record_fields(r, payloads.get(r), with_payload, with_vectors))
+                            for r, s in hits[offset:wanted]]
+            fetch *= 4
+
+    def search_sparse(self, name: str, vector, flt, limit: int, offset: int, with_payload, with_vectors,
+                      score_threshold: Optional[float]) -> List[qmodels.ScoredPoint]:
+        """Sum over query terms of query weight x stored weight (x IDF), from the postings"""
+        if name not in self.sparse_config:
+            raise ValueError(f"Unknown sparse vector name: {name}")
+        indices, values = _sparse_parts(vector)
+        idf = self.sparse_config[name]["modifier"] == "idf"
+        with self.lock:
+            mask, residual_exact = self._live_mask(flt)
+            n_live = self.n_rows - self.dead
+            scores = np.zeros(self.n_rows, dtype=np.float32)
+            for term, weight in zip(indices, values):
+                postings = np.array(self.db.execute("SELECT row, weight FROM sparse_postings WHERE name = ? AND term = ?",
+                                                    (name, int(term))).fetchall(), dtype=np.float64).reshape(-1, 2)
+                if not len(postings):
+                    continue
+                if idf:
+                    weight *= math.log((n_live - len(postings) + 0.5) / (len(postings) + 0.5) + 1)
+                scores[postings[:, 0].astype(np.int64)] += weight * postings[:, 1]
+            rows = np.flatnonzero(scores)  # dead rows have no postings
+            if mask is not None:
+                rows = rows[mask[rows]]
+            rows = rows[np.argsort(-scores[rows], kind="stable")]
+            if score_threshold is not None:
+                rows = rows[scores[rows] >= score_threshold]
+            wanted = limit + offset
+            hits, payloads = [], {}
+            for start in range(0, len(rows), max(4 * wanted, 64)):
+                part = rows[start:start + max(4 * wanted, 64)].tolist()
+                part_payloads = self._payloads(part) if (with_payload or not residual_exact) else {}
+                payloads.update(part_payloads)
+                hits.extend(self._filtered_rows(part, flt, residual_exact, part_payloads))
+                if len(hits) >= wanted:
+                    break
+            return [qmodels.ScoredPoint(version=0, score=float(scores[r]), **self._record_fields(r, payloads.get(r), with_payload, with_vectors))
+                    for r in hits[offset:wanted]]
+
+    def scroll(self, flt, limit: int, offset, with_payload, with_vectors) -> tuple[List[qmodels.Record], Optional[int]]:
+        with self.lock:
+            mask, exact = self._live_mask(flt)
+            start = int(offset or 0)
+            rows = np.flatnonzero(mask[start:]) + start if mask is not None else np.arange(start, self.n_rows)
+            records = []
+            for begin in range(0, len(rows), max(limit, 256)):
+                part = rows[begin:begin + max(limit, 256)].tolist()
+                payloads = self._payloads(part) if (with_payload or not exact) else {}
+                for row in self._filtered_rows(part, flt, exact, payloads):
+                    if len(records) == limit:
+                        return records, row
+                    records.append(qmodels.Record(**self._record_fields(row, payloads.get(row), with_payload, with_vectors)))
+            return records, None
+
+    def count(self, flt) -> int:
+        with self.lock:
+            mask, exact = self._live_mask(flt)
+            if exact:
+                return int(np.count_nonzero(mask)) if mask is not None else self.n_rows - self.dead
+            rows = np.flatnonzero(mask) if mask is not None else np.arange(self.n_rows)
+            return len(self._filtered_rows(rows.tolist(), flt, exact))
+
+class LocalANNStore:
+    """Embedded vector store with an IVF index; a drop-in for the QdrantClient calls used here"""
+
+    def __init__(self, path: Path = ANN_PATH):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Appends to the mmap'd matrices are not coordinated across processes
+        self._lock_file = open(self.path / ".lock", "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                raise RuntimeError(f"{self.path} is locked by another process. The ANN store supports one process; "
+                                   "set QDRANT_URL to a Qdrant server to run several workers") from None
+        self._collections: Dict[str, _Collection] = {}
+        for entry in sorted(self.path.iterdir()):
+            if (entry / "points.db").exists():
+                self._collections[entry.name] = _Collection(entry)
+
+    def _collection(self, collection_name: str) -> _Collection:
+        try:
+            return self._collections[collection_name]
+        except KeyError:
+            raise ValueError(f"Collection {collection_name} not found") from None
+
+    # Collections
+
+    def get_collections(self):
+        return qmodels.CollectionsResponse(collections=[qmodels.CollectionDescription(name=n) for n in self._collections])
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return collection_name in self._collections
+
+    def get_collection(self, collection_name: str):
+        collection = self._collection(collection_name)
+        return SimpleNamespace(
+            points_count=collection.count(None),
+            dead_points=collection.dead,
+            payload_schema=collection.payload_index_info(),
+            config=SimpleNamespace(params=SimpleNamespace(vectors=collection.vectors_config(),
+                                                          sparse_vectors=collection.sparse_vectors_config() or None)),
+        )
+
+    def create_collection(self, collection_name: str, vectors_config, sparse_vectors_config=None, **kwargs) -> bool:
+        if not isinstance(vectors_config, dict):
+            vectors_config = {"": vectors_config}
+        with self._lock:
+            if collection_name in self._collections:
+                raise ValueError(f"Collection {collection_name} already exists")
+            self._collections[collection_name] = _Collection(self.path / collection_name, vectors_config,
+                                                             sparse_config=sparse_vectors_config or {})
+        return True
+
+    def delete_collection(self, collection_name: str, **kwargs) -> bool:
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+            if collection is None:
+                return False
+            collection.close()
+            shutil.rmtree(collection.dir, ignore_errors=True)
+        return True
+
+    def recreate_collection(self, collection_name: str, vectors_config, sparse_vectors_config=None, **kwargs) -> bool:
+        self.delete_collection(collection_name)
+        return self.create_collection(collection_name, vectors_config, sparse_vectors_config)
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, wait: bool = True, **kwargs):
+        self._collection(collection_name).create_payload_index(field_name, _schema_name(field_schema))
+        return qmodels.UpdateResult(operation_id=0, status=qmodels.UpdateStatus.COMPLETED)
+
+    def delete_payload_index(self, collection_name: str, field_name: str, wait: bool = True, **kwargs):
+        self._collection(collection_name).delete_payload_index(field_name)
+        return qmodels.UpdateResult(operation_id=0, status=qmodels.UpdateStatus.COMPLETED)
+
+    # Points
+
+    def upsert(self, collection_name: str, points, wait: bool = True, **kwargs):
+        if isinstance(points, qmodels.Batch):
+            vectors = points.vectors
+            points = [qmodels.PointStruct(id=point_id,
+                                          vector=({n: v[i] for n, v in vectors.items()} if isinstance(vectors, dict) else vectors[i]),
+                                          payload=(points.payloads or [{}] * len(points.ids))[i])
+                      for i, point_id in enumerate(points.ids)]
+        self._collection(collection_name).upsert(points)
+        return qmodels.UpdateResult(operation_id=0, status=qmodels.UpdateStatus.COMPLETED)
+
+    def search(self, collection_name: str, query_vector, query_filter: Optional[qmodels.Filter] = None,
+               search_params: Optional[qmodels.SearchParams] = None, limit: int = 10, offset: Optional[int] = None,
+               with_payload=True, with_vectors=False, score_threshold: Optional[float] = None,
+               nprobe: Optional[int] = None, **kwargs) -> List[qmodels.ScoredPoint]:
+        """Qdrant-style search; `nprobe` overrides ANN_NPROBE and search_params.exact forces an exact scan.
+        A SparseVector query is scored against the postings of the named sparse vector."""
+        collection = self._collection(collection_name)
+        if hasattr(query_vector, "name") and hasattr(query_vector, "vector"):  # qmodels.NamedVector / NamedSparseVector
+            name, vector = query_vector.name, query_vector.vector
+        elif isinstance(query_vector, tuple):
+            name, vector = query_vector
+        else:
+            name, vector = next(iter(collection.spaces)), query_vector
+        if isinstance(vector, qmodels.SparseVector):
+            return collection.search_sparse(name, vector, query_filter, limit, offset or 0, with_payload, with_vectors,
+                                            score_threshold)
+        exact = bool(search_params and search_params.exact)
+        return collection.search(name, vector, query_filter, limit, offset or 0, with_payload, with_vectors,
+                                 score_threshold, exact, nprobe)
+
+    def query_points(self, collection_name: str, query, using: Optional[str] = None, query_filter: Optional[qmodels.Filter] = None,
+                     search_params: Optional[qmodels.SearchParams] = None, limit: int = 10, offset: Optional[int] = None,
+                     with_payload=True, with_vectors=False, score_threshold: Optional[float] = None, **kwargs) -> qmodels.QueryResponse:
+        """Nearest-neighbour form of QdrantClient.query_points (a dense or sparse vector, or NearestQuery)"""
+        vector = query.nearest if isinstance(query, qmodels.NearestQuery) else query
+        query_vector = (using, vector) if using else vector
+        return qmodels.QueryResponse(points=self.search(collection_name, query_vector, query_filter, search_params, limit, offset,
+                                                        with_payload, with_vectors, score_threshold, **kwargs))
+
+    def query_batch_points(self, collection_name: str, requests: Sequence[qmodels.QueryRequest], **kwargs) -> List[qmodels.QueryResponse]:
+        return [self.query_points(collection_name, r.query, using=r.using, query_filter=r.filter, search_params=r.params,
+                                  limit=r.limit or 10, offset=r.offset, with_payload=True if r.with_payload is None else r.with_payload,
+                                  with_vectors=r.with_vector or False, score_threshold=r.score_threshold)
+                for r in requests]
+
+    def scroll(self, collection_name: str, scroll_filter: Optional[qmodels.Filter] = None, limit: int = 10,
+               offset=None, with_payload=True, with_vectors=False, **kwargs):
+        return self._collection(collection_name).scroll(scroll_filter, limit, offset, with_payload, with_vectors)
+
+    def count(self, collection_name: str, count_filter: Optional[qmodels.Filter] = None, exact: bool = True, **kwargs):
+        return qmodels.CountResult(count=self._collection(collection_name).count(count_filter))
+
+    def delete(self, collection_name: str, points_selector, wait: bool = True, **kwargs):
+        self._collection(collection_name).delete(points_selector)
+        return qmodels.UpdateResult(operation_id=0, status=qmodels.UpdateStatus.COMPLETED)
+
+    def set_payload(self, collection_name: str, payload: dict, points, wait: bool = True, **kwargs):
+        self._collection(collection_name).update_payloads(points, lambda current: {**current, **payload})
+        return qmodels.UpdateResult(operation_id=0, status=qmodels.UpdateStatus.COMPLETED)
+
+    def delete_payload(self, collection_name: str, keys: List[str], points, wait: bool = True, **kwargs):
+        self._collection(collection_name).update_payloads(points, lambda current: {k: v for k, v in current.items() if k not in keys})
+        return qmodels.UpdateResult(operation_id=0, status=qmodels.UpdateStatus.COMPLETED)
+
+    # Maintenance
+
+    def build_index(self, collection_name: str):
+        """Train the IVF quantisers synchronously (normally done in the background)"""
+        self._collection(collection_name).build_index()
+
+    def compact(self, collection_name: str, batch_size: int = 1024) -> int:
+        """Rewrite a collection without its dead rows and retrain. Returns the points kept."""
+        with self._lock:
+            source = self._collection(collection_name)
+            with source.lock:
+                target_dir = self.path / f".{collection_name}.compact"
+                shutil.rmtree(target_dir, ignore_errors=True)
+                target = _Collection(target_dir, source.vectors_config(), auto_train=False, payload_schema=source.payload_schema,
+                                     sparse_config=source.sparse_vectors_config())
+                kept, offset = 0, None
+                while True:
+                    records, offset = source.scroll(None, batch_size, offset, True, True)
+                    target.upsert([qmodels.PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records])
+                    kept += len(records)
+                    if offset is None:
+                        break
+                source.close()
+                target.close()
+                retired = self.path / f".{collection_name}.old"
+                shutil.rmtree(retired, ignore_errors=True)
+                os.replace(source.dir, retired)
+                os.replace(target_dir, source.dir)
+                shutil.rmtree(retired, ignore_errors=True)
+                # Drop the IVF files so the reopened collection retrains on the compacted rows
+                for ivf in source.dir.glob("*.ivf.npz"):
+                    ivf.unlink()
+                self._collections[collection_name] = _Collection(source.dir)
+        self._collections[collection_name].build_index()
+        log.info(f"Compacted collection {collection_name}: {kept} points")
+        return kept
+
+    def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._lock_file.close()
+
+# ---------------------------------------------------------------------------
+# Backend selection
+
+class QdrantStore(QdrantClient):
+    """QdrantClient plus the search() call used here, which newer clients replaced with query_points()"""
+
+    if not hasattr(QdrantClient, "search"):
+        def search(self, collection_name: str, query_vector, query_filter: Optional[qmodels.Filter] = None,
+                   search_params: Optional[qmodels.SearchParams] = None, limit: int = 10, offset: Optional[int] = None,
+                   with_payload=True, with_vectors=False, score_threshold: Optional[float] = None,
+                   **kwargs) -> List[qmodels.ScoredPoint]:
+            if isinstance(query_vector, tuple):
+                using, vector = query_vector
+            elif hasattr(query_vector, "name") and hasattr(query_vector, "vector"):
+                using, vector = query_vector.name, query_vector.vector
+            else:
+                using, vector = None, query_vector
+            return self.query_points(
+                collection_name=collection_name, query=vector, using=using, query_filter=query_filter,
+                search_params=search_params, limit=limit, offset=offset, with_payload=with_payload,
+                with_vectors=with_vectors, score_threshold=score_threshold, **kwargs,
+            ).points
+
+class _SerializedStore:
+    """Runs every call on a wrapped client under one lock (embedded Qdrant is not thread-safe)"""
+
+    def __init__(self, store):
+        self._store = store
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return call
+
+def _open_qdrant_local() -> QdrantStore:
+    try:
+        return QdrantStore(path=str(QDRANT_PATH))
+    except RuntimeError as e:
+        if "already accessed by another instance" in str(e):
+            # The embedded store holds an exclusive file lock for the life of the process
+            raise RuntimeError(f"{QDRANT_PATH} is locked by another process. Embedded Qdrant supports one process; "
+                               "set QDRANT_URL to a Qdrant server to run several workers") from e
+        raise
+
+def _open_qdrant_server() -> QdrantStore:
+    client = QdrantStore(url=QDRANT_URL, api_key=QDRANT_API_KEY, prefer_grpc=QDRANT_PREFER_GRPC, timeout=QDRANT_TIMEOUT)
+    log.info(f"Using Qdrant server at {QDRANT_URL}{' (gRPC)' if QDRANT_PREFER_GRPC else ''}")
+    return client
+
+def _open_configured_store():
+    if VECTOR_STORE == "ann":
+        log.info(f"Using the local ANN vector store at {ANN_PATH}")
+        return LocalANNStore(ANN_PATH)
+    if VECTOR_STORE == "qdrant":
+        # The server client is thread-safe (pooled HTTP/gRPC); the embedded one is serialised
+        return _open_qdrant_server() if QDRANT_URL else _SerializedStore(_open_qdrant_local())
+    raise ValueError(f"Unknown VECTOR_STORE '{VECTOR_STORE}' (expected 'qdrant' or 'ann')")
+
+def _backend_name() -> str:
+    if VECTOR_STORE == "qdrant":
+        return "qdrant-server" if QDRANT_URL else "qdrant-embedded"
+    return VECTOR_STORE
+
+class VectorStoreManager:
+    """Owns the process-wide vector store client.
+
+    The server opens it at startup (FastAPI lifespan) and closes it on shutdown; scripts
+    open it on first use. Every code path shares the one client. Hooks registered with
+    on_open() (e.g. collection setup) run once per open, before the client is handed out.
+    """
+
+    def __init__(self):
+        self._store = None
+        self._lock = threading.Lock()
+        self._open_hooks: List = []
+
+    def on_open(self, hook):
+        """Register hook(store), run whenever a client is opened (now, if one already is)"""
+        with self._lock:
+            self._open_hooks.append(hook)
+            if self._store is not None:
+                hook(self._store)
+        return hook
+
+    def open(self):
+        with self._lock:
+            if self._store is None:
+                store = _open_configured_store()
+                try:
+                    for hook in self._open_hooks:
+                        hook(store)
+                except Exception:
+                    store.close()
+                    raise
+                self._store = store
+            return self._store
+
+    def get(self):
+        store = self._store
+        return store if store is not None else self.open()
+
+    def close(self):
+        """Close the client; the embedded stores persist and release their locks"""
+        with self._lock:
+            store, self._store = self._store, None
+            if store is not None:
+                store.close()
+                log.info(f"Closed {_backend_name()} vector store")
+
+    def health(self, collection_name: Optional[str] = None) -> dict:
+        """Backend, reachability, round-trip time and (optionally) a collection's point count"""
+        status = {"backend": _backend_name(), "open": self._store is not None}
+        started = time.perf_counter()
+        try:
+            store = self.get()
+            status["collections"] = [c.name for c in store.get_collections().collections]
+            if collection_name is not None:
+                status["points"] = store.get_collection(collection_name).points_count
+            status["status"] = "ok"
+        except Exception as e:
+            status.update(status="error", error=str(e))
+        status["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return status
+
+store_manager = VectorStoreManager()
+
+def get_vector_store():
+    """The shared vector store client (opened on first use if the app has not opened it)"""
+    return store_manager.get()
+
+class StoreProxy:
+    """Stand-in for a client that always forwards to the manager's current store, so module
+    globals keep working across close() and reopen"""
+
+    def __init__(self, manager: VectorStoreManager = store_manager):
+        self._manager = manager
+
+    def __getattr__(self, name):
+        return getattr(self._manager.get(), name)
+
+def copy_collection(source, target, collection_name: str, batch_size: int = 256, target_name: Optional[str] = None) -> int:
+    """Copy every point (vectors and payloads) of a collection between stores, or to `target_name`
+    within one. Returns points copied."""
+    target_name = target_name or collection_name
+    if not target.collection_exists(target_name):
+        info = source.get_collection(collection_name)
+        target.create_collection(target_name, vectors_config=info.config.params.vectors,
+                                 sparse_vectors_config=getattr(info.config.params, "sparse_vectors", None))
+        for field_name, index in (info.payload_schema or {}).items():
+            target.create_payload_index(target_name, field_name, field_schema=index.data_type)
+    copied, offset = 0, None
+    while True:
+        records, offset = source.scroll(collection_name=collection_name, limit=batch_size, offset=offset,
+                                        with_payload=True, with_vectors=True)
+        if records:
+            target.upsert(collection_name=target_name,
+                          points=[qmodels.PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records])
+            copied += len(records)
+        if offset is None:
+            return copied
+
+def _open_backend(name: str):
+    if name == "embedded":
+        return _open_qdrant_local()
+    if name == "server":
+        if not QDRANT_URL:
+            raise SystemExit("QDRANT_URL is not set")
+        return _open_qdrant_server()
+    return LocalANNStore(ANN_PATH)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+    parser = argparse.ArgumentParser(description="Maintain and migrate vector stores")
+    parser.add_argument("--collection", default="documents")
+    parser.add_argument("--copy", nargs=2, metavar=("SOURCE", "TARGET"), choices=["embedded", "server", "ann"],
+                        help="Copy the collection between stores: embedded (qdrant_store/), server (QDRANT_URL) or ann")
+    parser.add_argument("--compact", action="store_true", help="Drop dead rows and retrain the ANN index")
+    args = parser.parse_args()
+
+    if args.copy:
+        source, target = (_open_backend(name) for name in args.copy)
+        copied = copy_collection(source, target, args.collection)
+        if isinstance(target, LocalANNStore):
+            target.build_index(args.collection)
+        log.info(f"Copied {copied} points from {args.copy[0]} to {args.copy[1]}")
+        source.close()
+        target.close()
+    if args.compact:
+        store = LocalANNStore(ANN_PATH)
+        store.compact(args.collection)
+        store.close()